@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the process-pool conversion stage.
+
+Converts the same Substack-style posts (HTML -> markdown, as fetch_posts
+does) serially and through ConversionPool, checks that the results are
+identical and in the same order, and times both.
+
+Usage:
+    python benchmarks/bench_conversion_pool.py
+    python benchmarks/bench_conversion_pool.py --posts 500 --workers 4
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRAPER_DIR))
+
+from scraper import ConversionPool, conversion_worker_count, convert_items, convert_post_content  # noqa: E402
+from compare_feed_parsing import post_html  # noqa: E402
+
+
+def run(pool, posts):
+    start = time.perf_counter()
+    results = [(item, result) for item, result, error in
+               convert_items(convert_post_content, enumerate(posts), pool)]
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=200, help='number of posts to convert')
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: available cores)')
+    args = parser.parse_args()
+
+    # Long posts, so conversion dominates the pool's pickling overhead
+    posts = [post_html(i) * 5 for i in range(args.posts)]
+    workers = args.workers or max(2, conversion_worker_count())
+
+    serial, serial_time = run(None, posts)
+
+    pool = ConversionPool(workers)
+    run(pool, posts[:workers])  # start the workers outside the timing
+    pooled, pooled_time = run(pool, posts)
+    pool.close()
+
+    identical = serial == pooled
+    print(f"{args.posts} posts: results {'identical' if identical else 'DIFFER'}")
+    print(f"  serial            {serial_time:7.2f}s")
+    print(f"  pool ({workers} workers) {pooled_time:7.2f}s   ({serial_time / pooled_time:.1f}x)")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
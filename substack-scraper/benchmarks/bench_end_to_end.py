@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+End-to-end scraper benchmark against a local Substack stand-in.
+
+For each size, starts a substack_standin.StandInServer with that many posts
+and that many notes, then runs `python scraper.py` against it (through
+SUBSTACK_BASE_URL and SUBSTACK_FEED_URL) in an empty directory twice:
+
+- cold: everything is new, so every post and note is converted, written
+  and has its images downloaded
+- warm: an immediate re-run, where nothing changed
+
+and reports wall time, throughput, bytes written, peak RSS of the scraper
+process and requests served. A run more than --tolerance slower, larger in
+peak RSS or in bytes written than the reference is reported as a
+regression (exit 1). The reference is either:
+
+- --against REV: the scraper at a git revision, benchmarked in the same
+  run on the same machine, so the comparison holds anywhere (CI included)
+- a baseline JSON recorded with --save-baseline. Absolute numbers are
+  machine-specific, so baselines are local files and are not committed.
+
+Usage:
+    python benchmarks/bench_end_to_end.py                     # 10, 1000 and 10000 items
+    python benchmarks/bench_end_to_end.py --sizes 10 1000 --against origin/main
+    python benchmarks/bench_end_to_end.py --sizes 10 1000 --latency-ms 20
+    python benchmarks/bench_end_to_end.py --env CONVERSION_WORKERS=auto
+    python benchmarks/bench_end_to_end.py --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SCRAPER_DIR = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from substack_standin import StandInServer  # noqa: E402
+
+DEFAULT_BASELINE = BENCHMARKS_DIR / 'baseline.json'
+
+# Differences below these are noise, whatever the tolerance
+MIN_WALL_TIME_DELTA = 0.5  # seconds
+MIN_RSS_DELTA = 5.0  # MB
+
+
+def bytes_written(directory):
+    """Bytes on disk under a directory, counting hardlinked files once."""
+    seen = set()
+    total = 0
+    for path in Path(directory).rglob('*'):
+        if path.is_file():
+            stat = path.stat()
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def checkout_revision(revision, dest_dir):
+    """Extract the scraper directory at a git revision into dest_dir (without the archive); returns dest_dir."""
+    toplevel, prefix = subprocess.run(['git', 'rev-parse', '--show-toplevel', '--show-prefix'], cwd=SCRAPER_DIR,
+                                      check=True, capture_output=True, text=True).stdout.splitlines()
+    # Run at the top level: in a subdirectory, git archive only looks under that path.
+    # The tar is streamed, not held in memory: a forked scraper starts with this
+    # process's peak RSS, which would inflate its measured peak
+    process = subprocess.Popen(['git', 'archive', '--format=tar', f"{revision}:{prefix.rstrip('/')}"],
+                               cwd=toplevel, stdout=subprocess.PIPE)
+    with tarfile.open(fileobj=process.stdout, mode='r|') as tar:
+        for member in tar:
+            if member.name.split('/', 1)[0] not in ('posts', 'notes', 'image-store'):
+                tar.extract(member, dest_dir)
+    if process.wait():
+        raise RuntimeError(f"git archive {revision} failed")
+    return dest_dir
+
+
+def run_scraper(scraper_dir, workdir, env, log_path):
+    """Run scraper.py from scraper_dir in workdir; returns (wall seconds, peak RSS in MB, exit status)."""
+    with open(log_path, 'a', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, str(Path(scraper_dir) / 'scraper.py')], cwd=workdir,
+                                   env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return wall, peak_rss_mb, os.waitstatus_to_exitcode(status)
+
+
+def saved_counts(log_path):
+    """(posts, notes) from the last 'Total: Saved ...' line of a scraper log."""
+    totals = [line for line in Path(log_path).read_text(encoding='utf-8').splitlines()
+              if line.startswith('Total: Saved ')]
+    if not totals:
+        return None
+    words = totals[-1].split()
+    return int(words[2]), int(words[5])
+
+
+def bench_size(size, args, extra_env, scraper_dir=SCRAPER_DIR):
+    """Cold and warm results for one size, running the scraper in scraper_dir."""
+    server = StandInServer(latency=args.latency_ms / 1000, posts=size, notes=size,
+                           images_per_item=args.images, image_size=args.image_size,
+                           notes_page_size=args.page_size).start()
+    pages = len(server.publication.notes_pages)
+
+    env = dict(os.environ)
+    for name in ('POSTS_DIR', 'NOTES_DIR', 'IMAGE_STORE_DIR', 'VALIDATOR_CACHE'):
+        env.pop(name, None)
+    env.update({
+        'SUBSTACK_BASE_URL': server.base_url,
+        'SUBSTACK_FEED_URL': f"{server.base_url}/feed",
+        'NOTES_MAX_PAGES': str(pages + 1),
+        'PYTHONUNBUFFERED': '1',
+    })
+    env.update(extra_env)
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix=f'bench-{size}-')
+    log_path = os.path.join(workdir, 'scraper.log')
+    try:
+        for phase in ('cold', 'warm'):
+            requests_before, sent_before = server.requests, server.bytes_sent
+            wall, peak_rss_mb, status = run_scraper(scraper_dir, workdir, env, log_path)
+            counts = saved_counts(log_path)
+            written = bytes_written(workdir) - os.path.getsize(log_path)
+            results[phase] = {
+                'wall_time': round(wall, 3),
+                'items_per_second': round(2 * size / wall, 1),
+                'bytes_written': written,
+                'peak_rss_mb': round(peak_rss_mb, 1),
+                'requests': server.requests - requests_before,
+                'bytes_served': server.bytes_sent - sent_before,
+                'saved': list(counts) if counts else None,
+                'exit_status': status,
+            }
+            expected = [size, size] if phase == 'cold' else [0, 0]
+            if status != 0 or results[phase]['saved'] != expected:
+                print(f"  WARNING: {phase} run at {size} items exited {status}, saved "
+                      f"{results[phase]['saved']} (expected {expected}); log: {log_path}")
+                args.keep = True
+    finally:
+        server.shutdown()
+        server.server_close()
+        if not args.keep:
+            shutil.rmtree(workdir)
+        else:
+            print(f"  kept {workdir}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print the comparison against reference results; returns the number of regressions."""
+    regressions = 0
+    for size, phases in results.items():
+        for phase, current in phases.items():
+            previous = baseline.get(size, {}).get(phase)
+            if not previous:
+                continue
+            checks = (
+                ('wall_time', 's', MIN_WALL_TIME_DELTA),
+                ('peak_rss_mb', ' MB', MIN_RSS_DELTA),
+                ('bytes_written', ' B', 0),
+            )
+            for metric, unit, min_delta in checks:
+                old, new = previous[metric], current[metric]
+                delta = new - old
+                if old and delta > old * tolerance and delta > min_delta:
+                    regressions += 1
+                    print(f"  REGRESSION {size:>6} {phase}: {metric} {old}{unit} -> {new}{unit} "
+                          f"({delta / old:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000],
+                        help='posts (and notes) per run')
+    parser.add_argument('--images', type=int, default=1, help='images per post and per note')
+    parser.add_argument('--image-size', type=int, default=16 * 1024, help='bytes per image')
+    parser.add_argument('--page-size', type=int, default=20, help='notes per API page')
+    parser.add_argument('--latency-ms', type=float, default=0, help='server delay before every response')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the scraper (repeatable)')
+    parser.add_argument('--against', metavar='REV',
+                        help='also benchmark the scraper at this git revision and compare against it')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true', help='write these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown/growth')
+    parser.add_argument('--keep', action='store_true', help='keep the output directories')
+    args = parser.parse_args()
+
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    config = {
+        'images_per_item': args.images,
+        'image_size': args.image_size,
+        'notes_page_size': args.page_size,
+        'latency_ms': args.latency_ms,
+        'env': extra_env,
+    }
+
+    reference_dir = checkout_revision(args.against, tempfile.mkdtemp(prefix='bench-ref-')) if args.against else None
+    scrapers = [('current', SCRAPER_DIR)] + ([(args.against, reference_dir)] if reference_dir else [])
+
+    print(f"{'items':>6} {'run':<5} {'wall':>9} {'items/s':>9} {'written':>10} {'peak RSS':>9} {'requests':>9}"
+          + ("  scraper" if reference_dir else ''))
+    results = {}
+    reference = {}
+    try:
+        for size in args.sizes:
+            for label, scraper_dir in scrapers:
+                size_results = bench_size(size, args, extra_env, scraper_dir)
+                (results if scraper_dir == SCRAPER_DIR else reference)[str(size)] = size_results
+                for phase, result in size_results.items():
+                    print(f"{size:>6} {phase:<5} {result['wall_time']:>8.2f}s {result['items_per_second']:>9.1f} "
+                          f"{result['bytes_written'] / 1e6:>8.1f}MB {result['peak_rss_mb']:>7.1f}MB "
+                          f"{result['requests']:>9}" + (f"  {label}" if reference_dir else ''))
+    finally:
+        if reference_dir:
+            shutil.rmtree(reference_dir)
+
+    regressions = 0
+    baseline_path = Path(args.baseline)
+    if reference_dir:
+        print(f"\nComparing against {args.against}")
+        regressions = compare(results, reference, args.tolerance)
+        print(f"  {regressions} regression(s)" if regressions else "  no regressions")
+    elif baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nComparing against {baseline_path}")
+        if baseline.get('config') != config:
+            print(f"  note: baseline was recorded with {baseline.get('config')}")
+        regressions = compare(results, baseline.get('results', {}), args.tolerance)
+        print(f"  {regressions} regression(s)" if regressions else "  no regressions")
+
+    if args.save_baseline:
+        baseline = {
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'config': config,
+            'results': results,
+        }
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        print(f"\nSaved baseline to {baseline_path}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
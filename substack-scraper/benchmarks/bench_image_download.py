@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark and failure checks for streamed image downloads.
+
+Serves large images from a substack_standin.StandInServer and compares
+download_image, which streams each image to a temp file in chunks, with
+reading the whole body and writing it in one go, as it did before:
+
+- peak memory (tracemalloc) per download, for growing image sizes
+- the downloaded file and store blob match the served bytes
+- a connection dropped mid-image is resumed with a Range request
+- an image over the size cap, or cut off before it can be resumed, leaves
+  no file, blob or temp file behind
+
+Usage:
+    python benchmarks/bench_image_download.py
+    python benchmarks/bench_image_download.py --sizes-mb 1 8 32
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+
+import scraper  # noqa: E402
+from substack_standin import StandInServer  # noqa: E402
+
+
+def download_whole(url, filepath, pool):
+    """The old download_image: the whole body in memory, then one write."""
+    _, _, body = pool.get(url, headers={'User-Agent': scraper.USER_AGENT})
+    with open(filepath, 'wb') as f:
+        f.write(body)
+    return filepath
+
+
+def measure(func, *args):
+    """(result, seconds, peak traced bytes) of func(*args)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def leftovers(*dirs):
+    """Every file under dirs."""
+    return sorted(str(path) for d in dirs for path in Path(d).rglob('*') if path.is_file())
+
+
+def check(failures, condition, message):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 8, 32], help='image sizes')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-images-')
+    failures = []
+    try:
+        print(f"{'image':>8} {'whole peak':>11} {'streamed peak':>14} {'whole':>8} {'streamed':>9}")
+        for size_mb in args.sizes_mb:
+            image_size = int(size_mb * 1024 * 1024)
+            server = StandInServer(posts=0, notes=0, image_size=image_size).start()
+            pool = scraper.HTTPConnectionPool()
+            try:
+                url = f"{server.base_url}/images/big.png"
+                expected = server.publication.image_bytes('big.png')
+                whole_path = os.path.join(workdir, 'whole.png')
+                stream_path = os.path.join(workdir, 'streamed.png')
+                _, whole_time, whole_peak = measure(download_whole, url, whole_path, pool)
+                _, stream_time, stream_peak = measure(scraper.download_image, url, stream_path, pool)
+                with open(stream_path, 'rb') as f:
+                    identical = f.read() == expected
+                print(f"{size_mb:>6g}MB {whole_peak / 1e6:>9.2f}MB {stream_peak / 1e6:>12.2f}MB "
+                      f"{whole_time:>7.3f}s {stream_time:>8.3f}s{'' if identical else '  DIFFERENT'}")
+                if not identical:
+                    failures.append(f"{size_mb}MB streamed download differs")
+                os.remove(whole_path)
+                os.remove(stream_path)
+            finally:
+                pool.close()
+                server.shutdown()
+                server.server_close()
+
+        print()
+        image_size = 4 * 1024 * 1024
+        server = StandInServer(posts=0, notes=0, image_size=image_size, drop_after=image_size // 2).start()
+        pool = scraper.HTTPConnectionPool()
+        try:
+            store = scraper.ImageStore(os.path.join(workdir, 'store'))
+            folder = os.path.join(workdir, 'folder')
+            os.makedirs(folder)
+
+            print("dropped connection, resumed:")
+            url = f"{server.base_url}/images/resumed.png"
+            requests = server.requests
+            blob_path = scraper.download_image(url, os.path.join(folder, 'image1.png'), pool, store)
+            with open(blob_path, 'rb') as f:
+                check(failures, f.read() == server.publication.image_bytes('resumed.png'),
+                      "blob matches the served image")
+            check(failures, server.requests - requests == 2, "one Range request after the drop")
+            check(failures, os.path.samefile(blob_path, os.path.join(folder, 'image1.png')), "linked into the folder")
+
+            print("dropped connection, too early to resume:")
+            resume_min_bytes = scraper.IMAGE_RESUME_MIN_BYTES
+            scraper.IMAGE_RESUME_MIN_BYTES = image_size
+            try:
+                stored = scraper.download_image(f"{server.base_url}/images/cut.png",
+                                                os.path.join(folder, 'image2.png'), pool, store)
+                unstored = scraper.download_image(f"{server.base_url}/images/cut-folder.png",
+                                                  os.path.join(folder, 'image3.png'), pool)
+            finally:
+                scraper.IMAGE_RESUME_MIN_BYTES = resume_min_bytes
+            check(failures, stored is None, "download fails")
+            check(failures, unstored is None, "download without a store fails")
+
+            print("over IMAGE_MAX_BYTES:")
+            max_bytes = scraper.IMAGE_MAX_BYTES
+            scraper.IMAGE_MAX_BYTES = image_size // 4
+            try:
+                result = scraper.download_image(f"{server.base_url}/images/resumed.png",
+                                                os.path.join(folder, 'image4.png'), pool)
+            finally:
+                scraper.IMAGE_MAX_BYTES = max_bytes
+            check(failures, result is None, "download is refused")
+
+            expected_files = sorted([blob_path, os.path.join(folder, 'image1.png')])
+            check(failures, leftovers(store.root, folder) == expected_files,
+                  "no partial images or temp files left behind")
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+    finally:
+        shutil.rmtree(workdir)
+
+    print()
+    print("all checks passed" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
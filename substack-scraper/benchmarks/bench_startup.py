@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the scraper's subcommands.
+
+Starts a substack_standin.StandInServer, runs every command once so the
+archive and the validator cache are up to date, then times repeated
+unchanged runs (one conditional request per endpoint, nothing to save) of
+`python -m scraper <command>`. At that point a run is almost all
+interpreter startup and imports, which is what the cron-driven notes job
+pays every few minutes. `python -c pass` is included as the floor, and
+`--timings` output of one run per command shows its startup CPU time and
+the modules each command imported lazily.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 50 --commands notes probe
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SCRAPER_DIR = BENCHMARKS_DIR.parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from substack_standin import StandInServer  # noqa: E402
+
+
+def time_runs(command, runs, env, cwd):
+    """Wall times of `runs` runs of command, in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per command')
+    parser.add_argument('--commands', nargs='+', default=['notes', 'posts', 'all', 'probe'])
+    args = parser.parse_args()
+
+    server = StandInServer(posts=10, notes=10).start()
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ)
+    for name in ('POSTS_DIR', 'NOTES_DIR', 'IMAGE_STORE_DIR', 'VALIDATOR_CACHE', 'PUBLICATIONS_FILE', 'WATCH'):
+        env.pop(name, None)
+    env.update({
+        'SUBSTACK_BASE_URL': server.base_url,
+        'SUBSTACK_FEED_URL': f"{server.base_url}/feed",
+        'PYTHONPATH': str(SCRAPER_DIR),
+    })
+
+    try:
+        for command in args.commands:
+            subprocess.run([sys.executable, '-m', 'scraper', command], cwd=workdir, env=env,
+                           stdout=subprocess.DEVNULL, check=True)
+
+        print(f"{'command':<28} {'median':>9} {'min':>9}")
+        commands = [('python -c pass', [sys.executable, '-c', 'pass'])]
+        commands += [(f'python -m scraper {command}', [sys.executable, '-m', 'scraper', command])
+                     for command in args.commands]
+        for label, command in commands:
+            times = time_runs(command, args.runs, env, workdir)
+            print(f"{label:<28} {statistics.median(times) * 1000:>7.1f}ms {min(times) * 1000:>7.1f}ms")
+
+        print()
+        for command in args.commands:
+            result = subprocess.run([sys.executable, '-m', 'scraper', command, '--timings'], cwd=workdir,
+                                    env=env, capture_output=True, text=True, check=True)
+            for line in result.stdout.splitlines():
+                if line.startswith(('Startup:', 'Imported while running:')):
+                    print(f"{command:<6} {line}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Equivalence test and benchmark for clean_markdown_urls.
+
+Compares the single-pass clean_markdown_urls in scraper.py against the
+previous three-regex implementation (kept below as legacy_clean_markdown_urls)
+and times both on:
+
+- the stored posts/ corpus (original_post.md files)
+- the same posts with newlines wrapped into every markdown URL, the way
+  html2text leaves them before cleaning
+- seeded random bracket soup, for equivalence only
+- unclosed-bracket inputs of growing size, where the regexes backtrack
+
+Usage:
+    python benchmarks/compare_clean_urls.py
+    python benchmarks/compare_clean_urls.py --fuzz 100000 --repeat 20
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRAPER_DIR))
+
+from scraper import clean_markdown_urls, clean_url  # noqa: E402
+
+
+def legacy_clean_markdown_urls(markdown_content):
+    """The previous implementation: three DOTALL regex passes."""
+    markdown_content = re.sub(
+        r'\[!\[(.*?)\]\(([^)]+)\)\]\(([^)]+)\)',
+        lambda m: f'[![{m.group(1)}]({clean_url(m.group(2))})]({clean_url(m.group(3))})',
+        markdown_content,
+        flags=re.DOTALL
+    )
+    markdown_content = re.sub(
+        r'!\[(.*?)\]\(([^)]+)\)',
+        lambda m: f'![{m.group(1)}]({clean_url(m.group(2))})',
+        markdown_content,
+        flags=re.DOTALL
+    )
+    markdown_content = re.sub(
+        r'\[(.*?)\]\(([^)]+)\)',
+        lambda m: f'[{m.group(1)}]({clean_url(m.group(2))})',
+        markdown_content,
+        flags=re.DOTALL
+    )
+    return markdown_content
+
+
+def wrap_urls(markdown, width=30):
+    """Insert newlines into every markdown URL, like html2text line wrapping."""
+    def wrap(match):
+        url = match.group(1)
+        return '](' + '\n'.join(url[i:i + width] for i in range(0, len(url), width)) + ')'
+    return re.sub(r'\]\(([^)\s]+)\)', wrap, markdown)
+
+
+def load_corpus(posts_dir):
+    return {path.parent.name: path.read_text(encoding='utf-8')
+            for path in sorted(Path(posts_dir).glob('*/original_post.md'))}
+
+
+def check(name, docs):
+    """Compare both implementations; returns the number of mismatches."""
+    mismatches = 0
+    for key, doc in docs.items():
+        if clean_markdown_urls(doc) != legacy_clean_markdown_urls(doc):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  MISMATCH in {name}: {key!r}")
+    print(f"  {name:<18} {len(docs) - mismatches}/{len(docs)} identical")
+    return mismatches
+
+
+def time_it(func, docs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for doc in docs:
+            func(doc)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts-dir', default=str(SCRAPER_DIR / 'posts'))
+    parser.add_argument('--fuzz', type=int, default=20000, help='random inputs to compare')
+    parser.add_argument('--repeat', type=int, default=10, help='benchmark iterations')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.posts_dir)
+    wrapped = {key: wrap_urls(doc) for key, doc in corpus.items()}
+
+    rng = random.Random(42)
+    fuzz = {i: ''.join(rng.choice('[]()! a\n') for _ in range(rng.randint(1, 60)))
+            for i in range(args.fuzz)}
+
+    print("Equivalence")
+    mismatches = check('posts', corpus) + check('posts (wrapped)', wrapped)
+    fuzz_mismatches = check('random', fuzz)
+    if fuzz_mismatches:
+        # Random input can hit the documented "](" joining case
+        print("  (random mismatches are expected only where URL cleaning joins ']' and '(')")
+
+    print(f"\nBenchmark ({args.repeat} iterations)")
+    for name, docs in (('posts', corpus), ('posts (wrapped)', wrapped)):
+        docs = list(docs.values())
+        new = time_it(clean_markdown_urls, docs, args.repeat)
+        old = time_it(legacy_clean_markdown_urls, docs, args.repeat)
+        print(f"  {name:<18} single-pass {new:7.3f}s   three-regex {old:7.3f}s   ({old / new:.1f}x)")
+
+    print("\nUnclosed brackets ('[a' * n)")
+    for n in (1000, 2000, 4000, 8000):
+        doc = '[a' * n
+        new = time_it(clean_markdown_urls, [doc], 1)
+        old = time_it(legacy_clean_markdown_urls, [doc], 1)
+        print(f"  n={n:<6} single-pass {new:7.4f}s   three-regex {old:7.4f}s")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
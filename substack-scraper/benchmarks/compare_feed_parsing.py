@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Equivalence test and memory benchmark for streaming feed ingestion.
+
+Builds Substack-style RSS feeds of growing size and compares the streaming
+parser in scraper.py (iter_feed_entries) against feedparser, which
+fetch_posts used before:
+
+- every entry's title, link, date and author, and the markdown its content
+  converts to, must be identical, also for a feed that is not well-formed
+  (an undefined HTML entity), where iter_feed_entries falls back to feedparser
+- peak memory (tracemalloc) of parsing and walking every entry, for
+  feedparser on the whole body versus iter_feed_entries on a stream
+
+Requires feedparser for the comparison (pip install feedparser).
+
+Usage:
+    python benchmarks/compare_feed_parsing.py
+    python benchmarks/compare_feed_parsing.py --sizes 20 2000 10000
+"""
+
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRAPER_DIR))
+
+from scraper import convert_html_to_markdown, iter_feed_entries  # noqa: E402
+
+try:
+    import feedparser
+except ImportError:
+    sys.exit("feedparser is required for this comparison: pip install feedparser")
+
+
+def post_html(i):
+    """Content HTML shaped like a Substack post body."""
+    image = (f"https://substackcdn.com/image/fetch/$s_!ab{i:02d}!,w_1456,c_limit,f_auto,q_auto:good/"
+             f"https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2F{i:06d}_1408x736.png")
+    paragraphs = ''.join(
+        f"<p>Paragraph {n} of post {i} &amp; some <strong>bold</strong>, <em>em</em> and "
+        f"<a href=\"https://example.com/{i}/{n}\">a link</a> &#8212; it&#8217;s long enough to wrap "
+        f"across several lines of converted markdown text.</p>"
+        for n in range(8)
+    )
+    return (
+        f"{paragraphs}"
+        f"<div class=\"captioned-image-container\"><figure><a class=\"image-link image2\" target=\"_blank\" "
+        f"href=\"{image.replace('w_1456,c_limit,', '')}\"><div class=\"image2-inset\"><picture>"
+        f"<source type=\"image/webp\" srcset=\"{image} 1456w\" sizes=\"100vw\">"
+        f"<img src=\"{image}\" width=\"1408\" height=\"736\" alt=\"Screenshot {i}\" loading=\"lazy\">"
+        f"</picture></div></a><figcaption class=\"image-caption\">Caption {i}</figcaption></figure></div>"
+        f"<ul><li><p>First point</p></li><li><p>Second <code>point()</code></p></li></ul>"
+        f"<pre><code>def f():\n    return {i}\n</code></pre>"
+        f"<div id=\"youtube2-abc{i}\" class=\"youtube-wrap\"><div class=\"youtube-inner\">"
+        f"<iframe src=\"https://www.youtube-nocookie.com/embed/abc{i}\" frameborder=\"0\"></iframe></div></div>"
+        f"<p class=\"button-wrapper\"><a class=\"button primary\" href=\"https://www.cengizhan.com/subscribe\">"
+        f"<span>Subscribe now</span></a></p>"
+    )
+
+
+def build_feed(entries, undefined_entity_at=None):
+    """
+    A Substack-style RSS 2.0 feed with `entries` items. With
+    undefined_entity_at, that item's title has an HTML entity XML does not
+    define, so the feed is not well-formed.
+    """
+    items = []
+    for i in range(entries):
+        title = (f"<title>Post {i}: Caf&eacute; Agents</title>" if i == undefined_entity_at
+                 else f"<title><![CDATA[Post {i}: Specs &amp; Agents]]></title>")
+        items.append(
+            f"<item>{title}"
+            f"<description><![CDATA[Summary of post {i}]]></description>"
+            f"<link>https://www.cengizhan.com/p/post-{i}</link>"
+            f"<guid isPermaLink=\"false\">{100000 + i}</guid>"
+            f"<dc:creator><![CDATA[Cengiz Han]]></dc:creator>"
+            f"<pubDate>Sun, 09 Nov 2025 14:{i % 60:02d}:49 GMT</pubDate>"
+            f"<enclosure url=\"https://substackcdn.com/image/{i}.png\" length=\"0\" type=\"image/jpeg\"/>"
+            f"<content:encoded>{escape(post_html(i))}</content:encoded></item>"
+        )
+    return (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+        "<rss xmlns:dc=\"http://purl.org/dc/elements/1.1/\" "
+        "xmlns:content=\"http://purl.org/rss/1.0/modules/content/\" "
+        "xmlns:atom=\"http://www.w3.org/2005/Atom\" version=\"2.0\"><channel>"
+        "<title><![CDATA[Cengiz Han]]></title><link>https://www.cengizhan.com</link>"
+        "<atom:link href=\"https://www.cengizhan.com/feed\" rel=\"self\" type=\"application/rss+xml\"/>"
+        + ''.join(items) +
+        "</channel></rss>"
+    ).encode('utf-8')
+
+
+def feedparser_entries(body):
+    """Entries the way fetch_posts read them from feedparser."""
+    for entry in feedparser.parse(body).entries:
+        content_html = entry.get('content', [{}])[0].get('value', '') if 'content' in entry else ''
+        yield {
+            'title': entry.get('title', 'Untitled'),
+            'link': entry.get('link', ''),
+            'published': entry.get('published', ''),
+            'author': entry.get('author', 'Unknown'),
+            'content': content_html or entry.get('summary', ''),
+        }
+
+
+def streaming_entries(body):
+    for entry in iter_feed_entries(io.BytesIO(body)):
+        yield {
+            'title': entry['title'] or 'Untitled',
+            'link': entry['link'],
+            'published': entry['published'],
+            'author': entry['author'] or 'Unknown',
+            'content': entry['content'] or entry['summary'],
+        }
+
+
+def check(body):
+    """Compare entry fields and converted markdown; returns the number of mismatches."""
+    old_entries = list(feedparser_entries(body))
+    new_entries = list(streaming_entries(body))
+    if len(old_entries) != len(new_entries):
+        print(f"  entry count differs: feedparser {len(old_entries)}, streaming {len(new_entries)}")
+        return 1
+
+    mismatches = 0
+    for old, new in zip(old_entries, new_entries):
+        fields = [key for key in ('title', 'link', 'published', 'author') if old[key] != new[key]]
+        if convert_html_to_markdown(old['content']) != convert_html_to_markdown(new['content']):
+            fields.append('markdown')
+        if fields:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  MISMATCH in {old['link']}: {', '.join(fields)}")
+    print(f"  {len(old_entries) - mismatches}/{len(old_entries)} entries identical")
+    return mismatches
+
+
+def peak_memory(walk, body):
+    """(peak bytes, seconds) to walk every entry; the feed body itself is not counted."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for entry in walk(body):
+        pass
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000], help='feed sizes in entries')
+    args = parser.parse_args()
+
+    print("Equivalence")
+    mismatches = check(build_feed(50))
+    print("Equivalence, undefined entity in entry 25 of 50")
+    mismatches += check(build_feed(50, undefined_entity_at=25))
+
+    print("\nPeak memory walking every entry")
+    for size in args.sizes:
+        body = build_feed(size)
+        old_peak, old_time = peak_memory(feedparser_entries, body)
+        new_peak, new_time = peak_memory(streaming_entries, body)
+        print(f"  {size:>6} entries ({len(body) / 1e6:6.1f} MB)   "
+              f"feedparser {old_peak / 1e6:8.1f} MB {old_time:6.2f}s   "
+              f"streaming {new_peak / 1e6:6.2f} MB {new_time:6.2f}s")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
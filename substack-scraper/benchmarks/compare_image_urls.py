@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Equivalence test and benchmark for replace_image_urls_with_local.
+
+Compares the single-pass replace_image_urls_with_local in scraper.py against
+the previous implementation (two str.replace calls per URL plus an unwrap
+regex, kept below as legacy_replace_image_urls_with_local) and times both on:
+
+- the stored posts/ corpus (original_post.md files), with the URL map that
+  fetch_posts would build for them
+- the same posts with newlines wrapped into every markdown URL
+- synthetic image-heavy posts with a growing number of clickable images
+
+Differences are printed as diffs. The old unwrap regex used a lazy DOTALL
+alt group, so on a linked image that is not a CDN wrapper (e.g. an image
+linking to a tweet) it could match from that image's "[![" through the next
+CDN wrapper further down, dropping the wrong bracket; such differences are
+expected.
+
+Usage:
+    python benchmarks/compare_image_urls.py
+    python benchmarks/compare_image_urls.py --repeat 50
+"""
+
+import argparse
+import difflib
+import re
+import sys
+import time
+from pathlib import Path
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRAPER_DIR))
+
+from scraper import (  # noqa: E402
+    clean_url, extract_images_from_markdown, image_extension, replace_image_urls_with_local,
+)
+from compare_clean_urls import wrap_urls  # noqa: E402
+
+
+def legacy_replace_image_urls_with_local(markdown_content, url_to_filename_map):
+    """The previous implementation: str.replace per URL, then an unwrap regex."""
+    result = markdown_content
+    for url, filename in url_to_filename_map.items():
+        result = result.replace(f']({url})', f']({filename})')
+        result = result.replace(url, filename)
+
+    result = re.sub(
+        r'\[!\[(.*?)\]\((image\d+\.[^)]+)\)\]\(https?://substackcdn\.com/[^)]+\)',
+        r'![\1](\2)',
+        result,
+        flags=re.DOTALL
+    )
+    return result
+
+
+def url_map_for(markdown):
+    """The URL -> filename map fetch_posts builds: every variant of each image."""
+    url_variants = {}
+    for url in extract_images_from_markdown(markdown):
+        url_variants.setdefault(clean_url(url), [])
+        if url not in url_variants[clean_url(url)]:
+            url_variants[clean_url(url)].append(url)
+
+    url_map = {}
+    for counter, (clean, variants) in enumerate(url_variants.items(), 1):
+        for variant in variants:
+            url_map[variant] = f"image{counter}{image_extension(clean)}"
+    return url_map
+
+
+def synthetic_post(images):
+    """A post with `images` clickable CDN images between paragraphs."""
+    paragraph = "Some words about the next screenshot, with a [link](https://example.com/page). " * 4
+    blocks = []
+    for i in range(images):
+        source = f"https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2F{i:04d}-shot.png"
+        blocks.append(paragraph)
+        blocks.append(f"[![](https://substackcdn.com/image/fetch/w_1456,c_limit,f_auto/{source})]"
+                      f"(https://substackcdn.com/image/fetch/f_auto,q_auto:good/{source})")
+    return '\n\n'.join(blocks) + '\n'
+
+
+def load_corpus(posts_dir):
+    return {path.parent.name: path.read_text(encoding='utf-8')
+            for path in sorted(Path(posts_dir).glob('*/original_post.md'))}
+
+
+def check(name, docs):
+    """Compare both implementations; returns the number of mismatches."""
+    mismatches = 0
+    for key, doc in docs.items():
+        url_map = url_map_for(doc)
+        new = replace_image_urls_with_local(doc, url_map)
+        old = legacy_replace_image_urls_with_local(doc, url_map)
+        if new != old:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  DIFFERENCE in {name}: {key!r}")
+                diff = difflib.unified_diff(old.splitlines(), new.splitlines(), 'legacy', 'single-pass',
+                                            n=0, lineterm='')
+                for line in diff:
+                    print(f"    {line}")
+    print(f"  {name:<18} {len(docs) - mismatches}/{len(docs)} identical")
+    return mismatches
+
+
+def time_it(func, docs, repeat):
+    """Total seconds to rewrite every (doc, url_map) pair `repeat` times."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for doc, url_map in docs:
+            func(doc, url_map)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts-dir', default=str(SCRAPER_DIR / 'posts'))
+    parser.add_argument('--repeat', type=int, default=10, help='benchmark iterations')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.posts_dir)
+    wrapped = {key: wrap_urls(doc) for key, doc in corpus.items()}
+    synthetic = {n: synthetic_post(n) for n in (10, 50, 200, 500)}
+
+    print("Equivalence")
+    check('posts', corpus)
+    check('posts (wrapped)', wrapped)
+    mismatches = check('synthetic', synthetic)
+
+    print(f"\nBenchmark ({args.repeat} iterations)")
+    for name, docs in (('posts', corpus), ('posts (wrapped)', wrapped)):
+        pairs = [(doc, url_map_for(doc)) for doc in docs.values()]
+        new = time_it(replace_image_urls_with_local, pairs, args.repeat)
+        old = time_it(legacy_replace_image_urls_with_local, pairs, args.repeat)
+        print(f"  {name:<18} single-pass {new:7.3f}s   per-URL replace {old:7.3f}s   ({old / new:.1f}x)")
+
+    for n, doc in synthetic.items():
+        pairs = [(doc, url_map_for(doc))]
+        new = time_it(replace_image_urls_with_local, pairs, args.repeat)
+        old = time_it(legacy_replace_image_urls_with_local, pairs, args.repeat)
+        label = f"{n} images"
+        print(f"  {label:<18} single-pass {new:7.3f}s   per-URL replace {old:7.3f}s   ({old / new:.1f}x)")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
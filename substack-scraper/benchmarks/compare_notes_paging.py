@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Equivalence test and memory benchmark for streaming notes API pages.
+
+Builds notes API pages (substack_standin's note items, with longer bodies)
+of growing size and compares the streaming page reader in scraper.py
+(StreamingJSONArray) against json.loads on the whole body, which
+fetch_notes used before:
+
+- every item and the other top-level members (nextCursor) must be
+  identical, for plain and gzip-compressed bodies read in chunks of
+  several sizes
+- peak memory (tracemalloc) of reading a page and handling its items one
+  at a time, each dropped once handled: the whole body and parsed page
+  versus one chunk and one item
+
+Usage:
+    python benchmarks/compare_notes_paging.py
+    python benchmarks/compare_notes_paging.py --sizes 20 500 5000
+"""
+
+import argparse
+import gzip
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR.parent))
+
+from scraper import DecodingReader, StreamingJSONArray  # noqa: E402
+from substack_standin import StandInPublication  # noqa: E402
+
+
+class ChunkedReader:
+    """File-like reader returning at most chunk_size bytes per read()."""
+
+    def __init__(self, data, chunk_size):
+        self._stream = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._stream.read()
+        return self._stream.read(min(size, self.chunk_size))
+
+
+def build_page(items):
+    """A notes API page body with `items` notes and a nextCursor after them."""
+    publication = StandInPublication('https://example.substack.com', posts=0, notes=0)
+    notes = []
+    for note_id in range(items, 0, -1):
+        item = publication.note_item(note_id)
+        paragraph = {"type": "paragraph", "content": [
+            {"type": "text", "text": f"More thoughts on note {note_id} — café ☃ " * 20}]}
+        item['comment']['body_json']['content'].extend([paragraph] * 5)
+        notes.append(item)
+    return json.dumps({"items": notes, "originalCursorTimestamp": "2025-11-01T00:00:00Z",
+                       "nextCursor": "2025-10-01T00:00:00Z"}).encode('utf-8')
+
+
+def handle(item):
+    """Stand-in for save_note: touch the item, keep nothing."""
+    return len(item['comment']['body_json']['content'])
+
+
+def read_whole(body):
+    page = json.loads(body.decode('utf-8'))
+    for item in page.get('items', []):
+        handle(item)
+    return page.get('nextCursor')
+
+
+def read_streaming(body):
+    page_items = StreamingJSONArray(io.BytesIO(body), 'items')
+    for item in page_items:
+        handle(item)
+    return page_items.members.get('nextCursor')
+
+
+def check_equivalence(body):
+    """Compare streaming against json.loads; returns a list of differences."""
+    expected = json.loads(body.decode('utf-8'))
+    expected_members = {key: value for key, value in expected.items() if key != 'items'}
+    differences = []
+    for encoding, data in (('identity', body), ('gzip', gzip.compress(body))):
+        for chunk_size in (1, 7, 1000, 64 * 1024):
+            if chunk_size == 1 and len(body) > 200_000:
+                continue
+            page_items = StreamingJSONArray(DecodingReader(ChunkedReader(data, chunk_size), encoding), 'items')
+            page_items.CHUNK_SIZE = chunk_size
+            items = list(page_items)
+            if items != expected['items']:
+                differences.append(f"{encoding}/{chunk_size}: items differ")
+            if page_items.members != expected_members:
+                differences.append(f"{encoding}/{chunk_size}: members {page_items.members} != {expected_members}")
+    return differences
+
+
+def measure(func, body):
+    """(seconds, peak traced bytes) of func(body); the body itself is not counted."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func(body)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000], help='items per page')
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'items':>6} {'body':>9} {'json.loads peak':>16} {'streaming peak':>15} "
+          f"{'json.loads':>11} {'streaming':>10}")
+    for size in args.sizes:
+        body = build_page(size)
+        differences = check_equivalence(body)
+        if differences:
+            failures += 1
+            print(f"{size:>6} DIFFERENT: {'; '.join(differences[:3])}")
+            continue
+        whole_time, whole_peak = measure(read_whole, body)
+        stream_time, stream_peak = measure(read_streaming, body)
+        print(f"{size:>6} {len(body) / 1e6:>7.2f}MB {whole_peak / 1e6:>14.2f}MB {stream_peak / 1e6:>13.2f}MB "
+              f"{whole_time:>10.3f}s {stream_time:>9.3f}s")
+
+    print("all pages identical" if not failures else f"{failures} page size(s) differ")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Equivalence test and benchmark for single-pass post conversion.
+
+Compares convert_post_content in scraper.py, which gets the markdown and the
+image URLs from one html2text parse, against the previous pipeline (kept
+below as legacy_convert): html2text, a second HTMLParser pass for <img>
+tags, a regex scan of the markdown for images and a clean-URL -> variants
+mapping for the replacement. For every post the markdown, the image URLs
+and the formatted markdown (image URLs replaced by local filenames) must
+be identical. Both are timed.
+
+Posts are Substack-shaped bodies plus cases that stress URL wrapping: long
+hyphenated image and link URLs, clickable images, repeated images and
+whitespace in src attributes.
+
+Usage:
+    python benchmarks/compare_post_conversion.py
+    python benchmarks/compare_post_conversion.py --posts 500 --repeat 5
+"""
+
+import argparse
+import re
+import sys
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+
+from html2text import html2text
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRAPER_DIR))
+
+from scraper import (  # noqa: E402
+    clean_markdown_urls, clean_url, convert_post_content, image_extension, replace_image_urls_with_local,
+)
+from compare_feed_parsing import post_html  # noqa: E402
+
+
+class LegacyImageExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.images = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            attrs_dict = dict(attrs)
+            if 'src' in attrs_dict:
+                self.images.append(attrs_dict['src'])
+
+
+def legacy_convert(content_html):
+    """The previous pipeline; returns (markdown, image_urls, url -> filename for the replacement)."""
+    content_md = clean_markdown_urls(html2text(content_html)).strip()
+
+    parser = LegacyImageExtractor()
+    parser.feed(content_html)
+    markdown_urls = re.findall(r'!\[.*?\]\((https?://[^\)]+)\)', content_md, re.DOTALL)
+
+    url_variants = {}
+    for url in parser.images + markdown_urls:
+        url_variants.setdefault(clean_url(url), [])
+        if url not in url_variants[clean_url(url)]:
+            url_variants[clean_url(url)].append(url)
+
+    image_urls = list(url_variants)
+    url_to_filename = {}
+    for n, url in enumerate(image_urls, 1):
+        for variant in url_variants[url]:
+            url_to_filename[variant] = f"image{n}{image_extension(url)}"
+    return content_md, image_urls, url_to_filename
+
+
+def new_convert(content_html):
+    content_md, image_urls = convert_post_content(content_html)
+    url_to_filename = {url: f"image{n}{image_extension(url)}" for n, url in enumerate(image_urls, 1)}
+    return content_md, image_urls, url_to_filename
+
+
+def wrapping_post(i):
+    """A post whose long hyphenated URLs get wrapped by html2text."""
+    image = (f"https://substackcdn.com/image/fetch/$s_!w{i}!,w_1456,c_limit,f_auto/https%3A%2F%2F"
+             f"substack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2Fa-very-long-file-name-with-"
+             f"many-hyphens-{i}_2048x1024.png")
+    link = f"https://example.com/a-long-article-slug-that-keeps-going-and-going-{i}?utm-source=some-feed"
+    return (
+        f"<p>Intro text that is long enough to make the next link start near the end of a line "
+        f"<a href=\"{link}\">with a hyphenated-link-text-{i}</a> and then continues after it.</p>"
+        f"<p><a href=\"{image}\"><img src=\"{image}\" alt=\"A long alt text for image {i}\"></a></p>"
+        f"<p>Same image again <img src=\"{image}\"> and one with whitespace in its src "
+        f"<img src=\" https://substackcdn.com/image/fetch/f_auto/other-{i}.jpg\n\"></p>"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=200, help='posts of each kind')
+    parser.add_argument('--repeat', type=int, default=3, help='benchmark iterations')
+    args = parser.parse_args()
+
+    posts = [post_html(i) for i in range(args.posts)] + [wrapping_post(i) for i in range(args.posts)]
+
+    mismatches = 0
+    for n, content_html in enumerate(posts):
+        old_md, old_images, old_map = legacy_convert(content_html)
+        new_md, new_images, new_map = new_convert(content_html)
+        old_formatted = replace_image_urls_with_local(old_md, old_map)
+        new_formatted = replace_image_urls_with_local(new_md, new_map)
+        if (old_md, old_images, old_formatted) != (new_md, new_images, new_formatted):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"  MISMATCH in post {n}: markdown {old_md == new_md}, images {old_images == new_images}, "
+                      f"formatted {old_formatted == new_formatted}")
+    print(f"{len(posts) - mismatches}/{len(posts)} posts identical")
+
+    for name, convert in (('legacy', legacy_convert), ('single-pass', new_convert)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for content_html in posts:
+                convert(content_html)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<12} {elapsed:7.3f}s  ({elapsed / (args.repeat * len(posts)) * 1000:.3f} ms/post)")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Differential test and benchmark for the ProseMirror renderers.
+
+Runs the pure-Python renderer (prosemirror_markdown.py) and the Node.js
+converter (prosemirror-to-markdown.js) over the same note bodies, reports any
+output differences, and times both.
+
+Note bodies (body_json) are read from a directory of saved JSON files or
+fetched from the notes API. Rendered notes that already exist in the stored
+notes/ corpus are also checked against their original_note.md, which was
+produced by the Node converter.
+
+Usage:
+    python benchmarks/compare_prosemirror.py                      # fetch from the notes API
+    python benchmarks/compare_prosemirror.py --save bodies/       # ... and keep the bodies
+    python benchmarks/compare_prosemirror.py --docs bodies/ --repeat 20
+"""
+
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from urllib.parse import urljoin
+
+SCRAPER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SCRAPER_DIR))
+
+import prosemirror_markdown  # noqa: E402
+from scraper import ProseMirrorConverter  # noqa: E402
+
+
+def load_docs(docs_dir):
+    """Load {note_id: body_json} from <note_id>.json files."""
+    docs = {}
+    for path in sorted(Path(docs_dir).glob('*.json')):
+        with open(path, 'r', encoding='utf-8') as f:
+            docs[path.stem] = json.load(f)
+    return docs
+
+
+def fetch_docs(base_url):
+    """Fetch {note_id: body_json} from the notes API."""
+    notes_url = urljoin(base_url, '/api/v1/notes')
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
+        'Accept': 'application/json',
+    }
+    req = urllib.request.Request(notes_url, headers=headers)
+    with urllib.request.urlopen(req, timeout=30) as response:
+        data = json.loads(response.read().decode('utf-8'))
+
+    docs = {}
+    for item in data.get('items', []):
+        comment = item.get('comment') or {}
+        body_json = comment.get('body_json')
+        if comment.get('id') and isinstance(body_json, dict) and body_json.get('content'):
+            docs[str(comment['id'])] = body_json
+    return docs
+
+
+def find_stored_note(notes_dir, note_id):
+    """Return the stored original_note.md text for a note, if archived."""
+    for path in Path(notes_dir).glob(f'*/*/*_note-{note_id}/original_note.md'):
+        return path.read_text(encoding='utf-8')
+    return None
+
+
+def render_node(converter, body_json):
+    """Render with the Node.js worker; returns (markdown, error)."""
+    try:
+        return converter.convert(body_json).strip(), None
+    except Exception as e:
+        return None, str(e)
+
+
+def time_renderer(render, docs, repeat):
+    """Total seconds to render every doc `repeat` times."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body_json in docs.values():
+            render(body_json)
+    return time.perf_counter() - start
+
+
+def time_node_per_process(script_path, docs):
+    """Seconds to render every doc once with one Node.js process per doc."""
+    start = time.perf_counter()
+    for body_json in docs.values():
+        subprocess.run(['node', script_path], input=json.dumps(body_json),
+                       capture_output=True, text=True, timeout=5)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', help='directory of <note_id>.json body_json files')
+    parser.add_argument('--base-url', default=os.environ.get('SUBSTACK_BASE_URL', 'https://www.cengizhan.com'))
+    parser.add_argument('--save', help='write fetched body_json files to this directory')
+    parser.add_argument('--notes-dir', default=str(SCRAPER_DIR / 'notes'))
+    parser.add_argument('--repeat', type=int, default=10, help='benchmark iterations')
+    parser.add_argument('--no-node', action='store_true', help='skip the Node.js renderer')
+    args = parser.parse_args()
+
+    docs = load_docs(args.docs) if args.docs else fetch_docs(args.base_url)
+    if args.save:
+        Path(args.save).mkdir(parents=True, exist_ok=True)
+        for note_id, body_json in docs.items():
+            with open(os.path.join(args.save, f'{note_id}.json'), 'w', encoding='utf-8') as f:
+                json.dump(body_json, f, ensure_ascii=False, indent=2)
+
+    if not docs:
+        print("No note bodies to compare")
+        return 1
+
+    print(f"Comparing renderers over {len(docs)} note bodies\n")
+
+    converter = None if args.no_node else ProseMirrorConverter()
+    mismatches = node_errors = corpus_checked = corpus_mismatches = 0
+
+    for note_id, body_json in docs.items():
+        python_md = prosemirror_markdown.serialize(body_json).strip()
+
+        if converter:
+            node_md, error = render_node(converter, body_json)
+            if error:
+                node_errors += 1
+                print(f"  node error  {note_id}: {error}")
+            elif node_md != python_md:
+                mismatches += 1
+                print(f"  MISMATCH    {note_id}")
+                diff = difflib.unified_diff(node_md.splitlines(), python_md.splitlines(),
+                                            'node', 'python', lineterm='')
+                for line in diff:
+                    print(f"    {line}")
+
+        stored = find_stored_note(args.notes_dir, note_id)
+        if stored is not None:
+            corpus_checked += 1
+            if python_md not in stored:
+                corpus_mismatches += 1
+                print(f"  CORPUS DIFF {note_id}: rendering not found in stored original_note.md")
+
+    print()
+    if converter:
+        print(f"Node vs Python: {len(docs) - mismatches - node_errors} identical, "
+              f"{mismatches} mismatches, {node_errors} node errors")
+    print(f"Stored corpus:  {corpus_checked - corpus_mismatches}/{corpus_checked} archived notes reproduced")
+
+    print(f"\nBenchmark ({args.repeat} x {len(docs)} docs)")
+    python_time = time_renderer(prosemirror_markdown.serialize, docs, args.repeat)
+    print(f"  python renderer:      {python_time:8.3f}s  ({python_time / (args.repeat * len(docs)) * 1000:.3f} ms/doc)")
+    if converter and node_errors < len(docs):
+        node_time = time_renderer(lambda doc: render_node(converter, doc), docs, args.repeat)
+        print(f"  node worker:          {node_time:8.3f}s  ({node_time / (args.repeat * len(docs)) * 1000:.3f} ms/doc)")
+        cold_time = time_node_per_process(converter.script_path, docs)
+        print(f"  node per-process (1x):{cold_time:8.3f}s  ({cold_time / len(docs) * 1000:.3f} ms/doc)")
+    if converter:
+        converter.close()
+
+    return 1 if mismatches or corpus_mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Substack publication, for benchmarks.
+
+Serves a synthetic publication over HTTP on 127.0.0.1:
+
+- /feed            RSS 2.0 feed with every post (content:encoded HTML)
+- /api/v1/notes    notes API, newest first, paginated with nextCursor
+- /images/<n>.png  image bytes referenced by the posts and notes
+
+Item counts, images per item, image size, notes page size and a per-request
+latency are configurable. Feed and notes responses carry an ETag and honour
+If-None-Match, and are gzip-compressed when the client accepts it, like the
+real endpoints. Images carry an ETag and honour Range/If-Range; with
+drop_after set, the first full response for each image is cut off after
+that many bytes, as a dropped connection.
+
+Run standalone to point the scraper at it by hand:
+    python benchmarks/substack_standin.py --posts 100 --notes 100 --port 8000
+    SUBSTACK_BASE_URL=http://127.0.0.1:8000 SUBSTACK_FEED_URL=http://127.0.0.1:8000/feed python scraper.py
+"""
+
+import argparse
+import gzip
+import hashlib
+import http.server
+import json
+import re
+import socketserver
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+class StandInPublication:
+    """The synthetic content: feed, notes pages and images, rendered once."""
+
+    def __init__(self, base_url, posts=10, notes=10, images_per_item=1, image_size=16 * 1024,
+                 notes_page_size=20):
+        self.base_url = base_url
+        self.posts = posts
+        self.notes = notes
+        self.images_per_item = images_per_item
+        self.image_size = image_size
+        self.notes_page_size = notes_page_size
+        self._images = {}
+
+        self.feed = self._render_feed()
+        self.notes_pages = self._render_notes_pages()
+
+    def image_url(self, kind, item, n):
+        return f"{self.base_url}/images/{kind}-{item}-{n}.png"
+
+    def image_bytes(self, name):
+        """Deterministic, distinct bytes per image name (rendered once)."""
+        if name not in self._images:
+            seed = hashlib.sha256(name.encode('utf-8')).digest()
+            body = seed * (self.image_size // len(seed) + 1)
+            self._images[name] = PNG_SIGNATURE + body[:max(0, self.image_size - len(PNG_SIGNATURE))]
+        return self._images[name]
+
+    def post_html(self, i):
+        paragraphs = ''.join(
+            f"<p>Paragraph {n} of post {i} with <strong>bold</strong>, <em>emphasis</em> and "
+            f"<a href=\"https://example.com/{i}/{n}\">a link</a> &#8212; long enough to wrap "
+            f"across several lines of converted markdown.</p>"
+            for n in range(6)
+        )
+        images = ''.join(
+            f"<div class=\"captioned-image-container\"><figure><a class=\"image-link image2\" "
+            f"href=\"{self.image_url('post', i, n)}\"><img src=\"{self.image_url('post', i, n)}\" "
+            f"width=\"1456\" height=\"816\" alt=\"\"></a><figcaption>Figure {n}</figcaption></figure></div>"
+            for n in range(self.images_per_item)
+        )
+        return (f"{paragraphs}{images}<ul><li><p>First point</p></li><li><p>Second "
+                f"<code>point()</code></p></li></ul><pre><code>def f():\n    return {i}\n</code></pre>")
+
+    def _render_feed(self):
+        items = []
+        for i in range(self.posts, 0, -1):
+            day = 1 + i % 28
+            items.append(
+                f"<item><title><![CDATA[Post {i}]]></title>"
+                f"<description><![CDATA[Summary of post {i}]]></description>"
+                f"<link>{self.base_url}/p/post-{i}</link>"
+                f"<guid isPermaLink=\"false\">{i}</guid>"
+                f"<dc:creator><![CDATA[Stand-in Author]]></dc:creator>"
+                f"<pubDate>Sun, {day:02d} Nov 2025 10:00:00 GMT</pubDate>"
+                f"<content:encoded>{escape(self.post_html(i))}</content:encoded></item>"
+            )
+        return (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            "<rss xmlns:dc=\"http://purl.org/dc/elements/1.1/\" "
+            "xmlns:content=\"http://purl.org/rss/1.0/modules/content/\" version=\"2.0\"><channel>"
+            f"<title>Stand-in</title><link>{self.base_url}</link>"
+            + ''.join(items) +
+            "</channel></rss>"
+        ).encode('utf-8')
+
+    def note_item(self, note_id):
+        text = [{"type": "text", "text": f"Note {note_id}: some thoughts with "},
+                {"type": "text", "marks": [{"type": "strong"}], "text": "bold"},
+                {"type": "text", "text": " and "},
+                {"type": "text", "marks": [{"type": "link", "attrs": {"href": "https://example.com"}}],
+                 "text": "a link"},
+                {"type": "text", "text": "."}]
+        return {
+            "entity_key": f"c-{note_id}",
+            "type": "comment",
+            "context": {"type": "note"},
+            "comment": {
+                "id": note_id,
+                "name": "Stand-in Author",
+                "handle": "standin",
+                "date": f"2025-10-{1 + note_id % 28:02d}T12:00:00.000Z",
+                "body": f"Note {note_id}",
+                "body_json": {"type": "doc", "attrs": {"schemaVersion": "v1"}, "content": [
+                    {"type": "paragraph", "content": text},
+                    {"type": "bulletList", "content": [
+                        {"type": "listItem", "content": [{"type": "paragraph", "content": [
+                            {"type": "text", "text": "a point"}]}]}]},
+                ]},
+                "attachments": [{"type": "image", "imageUrl": self.image_url('note', note_id, n)}
+                                for n in range(self.images_per_item)],
+                "reaction_count": note_id % 7,
+                "restacks": note_id % 3,
+                "children_count": note_id % 5,
+            },
+        }
+
+    def _render_notes_pages(self):
+        """{cursor: page JSON bytes}; the first page has cursor ''."""
+        note_ids = list(range(self.notes, 0, -1))
+        pages = {}
+        for start in range(0, max(len(note_ids), 1), self.notes_page_size):
+            page = {"items": [self.note_item(note_id) for note_id in note_ids[start:start + self.notes_page_size]]}
+            if start + self.notes_page_size < len(note_ids):
+                page["nextCursor"] = str(start + self.notes_page_size)
+            pages['' if start == 0 else str(start)] = json.dumps(page).encode('utf-8')
+        return pages
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; without TCP_NODELAY every
+    # keep-alive response stalls ~40ms on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+
+        publication = server.publication
+        parsed = urlparse(self.path)
+        if parsed.path == '/feed':
+            self.send_document(publication.feed, 'application/rss+xml')
+        elif parsed.path == '/api/v1/notes':
+            cursor = parse_qs(parsed.query).get('cursor', [''])[0]
+            page = publication.notes_pages.get(cursor)
+            if page is None:
+                self.send_body(404, b'unknown cursor', 'text/plain')
+            else:
+                self.send_document(page, 'application/json')
+        elif parsed.path.startswith('/images/'):
+            name = parsed.path.rsplit('/', 1)[1]
+            self.send_image(name, publication.image_bytes(name))
+        else:
+            self.send_body(404, b'not found', 'text/plain')
+
+    def send_document(self, body, content_type):
+        """Send a feed/API document with an ETag, 304 and gzip support."""
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        headers = {'ETag': etag}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = self.server.compressed(body)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_body(200, body, content_type, headers)
+
+    def send_image(self, name, body):
+        """Send image bytes, or the requested range of them."""
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+        requested = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if requested and self.headers.get('If-Range') == etag:
+            start = int(requested.group(1))
+            if start >= len(body):
+                self.send_body(416, b'', 'image/png', {'Content-Range': f'bytes */{len(body)}'})
+                return
+            headers['Content-Range'] = f'bytes {start}-{len(body) - 1}/{len(body)}'
+            self.send_body(206, body[start:], 'image/png', headers)
+            return
+
+        server = self.server
+        with server.lock:
+            drop = server.drop_after and name not in server.dropped
+            server.dropped.add(name)
+        if drop:
+            # Promise the whole image, send part of it and hang up
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            for header, value in headers.items():
+                self.send_header(header, value)
+            self.end_headers()
+            self.wfile.write(body[:server.drop_after])
+            self.close_connection = True
+            return
+        self.send_body(200, body, 'image/png', headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+
+class StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Threaded HTTP server for a StandInPublication; port 0 picks a free port."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, drop_after=0, **publication_options):
+        super().__init__(('127.0.0.1', port), StandInHandler)
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.publication = StandInPublication(self.base_url, **publication_options)
+        self.latency = latency
+        self.drop_after = drop_after
+        self.dropped = set()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self._compressed = {}
+
+    def handle_error(self, request, client_address):
+        # A client hanging up mid-response (refusing an oversized image) is expected
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def compressed(self, body):
+        key = id(body)
+        if key not in self._compressed:
+            self._compressed[key] = gzip.compress(body, compresslevel=6)
+        return self._compressed[key]
+
+    def start(self):
+        """Serve in a background thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--posts', type=int, default=10)
+    parser.add_argument('--notes', type=int, default=10)
+    parser.add_argument('--images', type=int, default=1, help='images per post and per note')
+    parser.add_argument('--image-size', type=int, default=16 * 1024, help='bytes per image')
+    parser.add_argument('--page-size', type=int, default=20, help='notes per API page')
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay before every response')
+    parser.add_argument('--drop-after', type=int, default=0,
+                        help='cut off the first response for each image after this many bytes')
+    args = parser.parse_args()
+
+    server = StandInServer(port=args.port, latency=args.latency_ms / 1000, drop_after=args.drop_after,
+                           posts=args.posts,
+                           notes=args.notes, images_per_item=args.images, image_size=args.image_size,
+                           notes_page_size=args.page_size)
+    print(f"Serving {args.posts} posts and {args.notes} notes at {server.base_url}")
+    print(f"  SUBSTACK_BASE_URL={server.base_url} SUBSTACK_FEED_URL={server.base_url}/feed")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
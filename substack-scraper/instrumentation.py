@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing, counters and trace export for the scraper.
+
+The scraper wraps its stages (feed fetch, notes pages, conversion, image
+downloads, hashing, file writes) in `stage()` and counts bytes and cache
+hits with `count()`. Nothing is recorded unless one of these is set:
+
+- RUN_SUMMARY=<path>   machine-readable JSON run summary: per-stage count,
+                       total, mean, p50/p95/max and slowest items, plus counters
+- TRACE_FILE=<path>    Chrome trace JSON (chrome://tracing, ui.perfetto.dev),
+                       one event per stage per item, per thread
+- PROFILE_FILE=<path>  cProfile stats (pstats format) of the run
+- TRACEMALLOC=<n>      trace allocations; the summary gets the peak and the
+                       top n allocation sites
+
+Recording starts on first use and the files are written when the process
+exits (or on an explicit finish()). A long-running process starts a new
+recording per run with restart(run); a {run} placeholder in the paths is
+replaced with the run number.
+"""
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# cProfile, pstats and tracemalloc are imported only when their output is
+# configured; they add noticeably to the scraper's startup time
+
+SLOWEST_ITEMS = 5
+
+
+class Recorder:
+    """Collects stage durations, counters and trace events for one run."""
+
+    def __init__(self, summary_path=None, trace_path=None, profile_path=None, tracemalloc_top=0, run=None):
+        self.run = run
+        self.summary_path = summary_path
+        self.trace_path = trace_path
+        self.profile_path = profile_path
+        self.tracemalloc_top = tracemalloc_top
+
+        self._lock = threading.Lock()
+        self._durations = {}  # stage -> [seconds]
+        self._slowest = {}  # stage -> [(seconds, item)]
+        self._counters = {}
+        self._events = []
+        self._thread_names = {}
+        self._profiles = []
+        self._main_profile = None
+        self._finished = False
+
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        if tracemalloc_top:
+            import tracemalloc
+            tracemalloc.start()
+        if profile_path:
+            import cProfile
+            self._main_profile = cProfile.Profile()
+            self._main_profile.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name, item=None, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), item, **args)
+
+    def record(self, name, start, end, item=None, **args):
+        """Record one completed stage that ran from start to end (perf_counter times)."""
+        duration = end - start
+        thread = threading.current_thread()
+        event = {
+            'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': os.getpid(), 'tid': thread.ident,
+            'ts': round((start - self._start) * 1e6, 1), 'dur': round(duration * 1e6, 1),
+        }
+        if item is not None:
+            args['item'] = str(item)
+        if args:
+            event['args'] = args
+
+        with self._lock:
+            self._durations.setdefault(name, []).append(duration)
+            if item is not None:
+                slowest = self._slowest.setdefault(name, [])
+                slowest.append((duration, str(item)))
+                if len(slowest) > SLOWEST_ITEMS * 4:
+                    slowest.sort(reverse=True)
+                    del slowest[SLOWEST_ITEMS:]
+            if self.trace_path:
+                self._events.append(event)
+                self._thread_names.setdefault(thread.ident, thread.name)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def profiled(self, func):
+        """Wrap func so it is profiled when it runs on another thread."""
+        if not self.profile_path:
+            return func
+
+        import cProfile
+
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+            return profile.runcall(func, *args, **kwargs)
+        return wrapper
+
+    def summary(self):
+        """The run summary as a dict."""
+        stages = {}
+        with self._lock:
+            for name, durations in sorted(self._durations.items()):
+                ordered = sorted(durations)
+                stages[name] = {
+                    'count': len(ordered),
+                    'total': round(sum(ordered), 6),
+                    'mean': round(sum(ordered) / len(ordered), 6),
+                    'p50': round(ordered[len(ordered) // 2], 6),
+                    'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+                    'max': round(ordered[-1], 6),
+                }
+                if name in self._slowest:
+                    stages[name]['slowest'] = [
+                        {'item': item, 'seconds': round(seconds, 6)}
+                        for seconds, item in sorted(self._slowest[name], reverse=True)[:SLOWEST_ITEMS]
+                    ]
+            counters = dict(sorted(self._counters.items()))
+
+        summary = {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_time': round(time.perf_counter() - self._start, 6),
+            'pid': os.getpid(),
+            'run': self.run,
+            'stages': stages,
+            'counters': counters,
+        }
+        if self.tracemalloc_top:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                top = tracemalloc.take_snapshot().statistics('lineno')[:self.tracemalloc_top]
+                summary['tracemalloc'] = {
+                    'current_bytes': current,
+                    'peak_bytes': peak,
+                    'top': [{'where': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                             'bytes': stat.size, 'blocks': stat.count} for stat in top],
+                }
+        if self.profile_path:
+            summary['profile'] = self.profile_path
+        if self.trace_path:
+            summary['trace'] = self.trace_path
+        return summary
+
+    def finish(self):
+        """Write the configured outputs (once)."""
+        if self._finished:
+            return
+        self._finished = True
+
+        summary = self.summary()
+        if self.tracemalloc_top:
+            import tracemalloc
+            tracemalloc.stop()
+
+        if self.profile_path:
+            import pstats
+            self._main_profile.disable()
+            stats = pstats.Stats(self._main_profile)
+            for profile in self._profiles:
+                stats.add(profile)
+            stats.dump_stats(self.profile_path)
+
+        if self.trace_path:
+            with self._lock:
+                events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                          for tid, name in self._thread_names.items()]
+                events.extend(self._events)
+            write_json(self.trace_path, {'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+        if self.summary_path:
+            write_json(self.summary_path, summary, indent=2)
+
+
+def write_json(path, data, indent=None):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+_run = None
+_finish_registered = False
+
+
+def get_recorder():
+    """
+    Return the run's Recorder, configured from the environment on first
+    use, or None when no output is configured.
+    """
+    global _recorder, _finish_registered
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                options = {
+                    'summary_path': run_path(os.environ.get('RUN_SUMMARY')),
+                    'trace_path': run_path(os.environ.get('TRACE_FILE')),
+                    'profile_path': run_path(os.environ.get('PROFILE_FILE')),
+                    'tracemalloc_top': int(os.environ.get('TRACEMALLOC') or 0),
+                }
+                if not any(options.values()):
+                    _recorder = False
+                else:
+                    _recorder = Recorder(run=_run, **options)
+                    if not _finish_registered:
+                        atexit.register(finish)
+                        _finish_registered = True
+    return _recorder or None
+
+
+def run_path(path):
+    """An output path from the environment with {run} filled in (None if unset)."""
+    if not path:
+        return None
+    return path.replace('{run}', str(_run if _run is not None else 0))
+
+
+def restart(run):
+    """Finish the current recording and record the next run (e.g. a watch-mode cycle) afresh."""
+    global _recorder, _run
+    finish()
+    with _recorder_lock:
+        _recorder = None
+        _run = run
+
+
+_no_stage = contextlib.nullcontext()
+
+
+def stage(name, item=None, **args):
+    """Context manager timing one stage (optionally for one item)."""
+    recorder = get_recorder()
+    if recorder is None:
+        return _no_stage
+    return recorder.stage(name, item, **args)
+
+
+def timed(name):
+    """Decorator recording each call of a function as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Add n to a counter."""
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.count(name, n)
+
+
+def profiled(func):
+    """Wrap func so its thread is included in PROFILE_FILE."""
+    recorder = get_recorder()
+    return recorder.profiled(func) if recorder is not None else func
+
+
+def finish():
+    """Write the configured outputs now instead of at exit."""
+    # Without starting a recording that was never used
+    if _recorder:
+        _recorder.finish()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Engagement metrics of notes, kept apart from their content.
+
+Reactions, restacks and replies keep changing long after a note is
+written. Saved in original_note.md, every change made the note "updated":
+both markdown files were rewritten and the change was committed. They are
+recorded here instead, as a time series per note, so a note's content hash
+only changes when the note is edited. Each observed change is one JSON line
+in notes/metrics/YYYY-MM.jsonl, sharded by the note's month like the packed
+archive:
+
+    {"folder": "2025/11/04_note-173453109", "note_id": "173453109",
+     "at": "2025-11-05T10:00:00", "reactions": 12, "restacks": 2, "replies": 3}
+
+A line is only appended when a note's counts differ from its last line, and
+the last line for a note is its current engagement.
+
+    python note_metrics.py notes/ 2025/11/04_note-173453109   # a note's series
+"""
+
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+from notes_archive import read_jsonl, shard_name
+
+METRICS_DIR = 'metrics'
+METRICS = ('reactions', 'restacks', 'replies')
+
+
+class NoteMetrics:
+    """
+    The engagement time series of the notes in a notes directory.
+
+    Shards are loaded on first use, so looking up recent notes only reads
+    the recent months. Recording is safe across threads.
+    """
+
+    def __init__(self, notes_dir):
+        self.dir = os.path.join(notes_dir, METRICS_DIR)
+        self._lock = threading.Lock()
+        self._latest = {}  # shard -> {folder: last record}
+
+    def _shard(self, name):
+        """{folder: last record} of a shard (lock held)."""
+        if name not in self._latest:
+            latest = {}
+            for record in read_jsonl(os.path.join(self.dir, name)):
+                latest[record['folder']] = record
+            self._latest[name] = latest
+        return self._latest[name]
+
+    def latest(self, folder):
+        """The note's current engagement record, or None if none was recorded."""
+        with self._lock:
+            return self._shard(shard_name(folder)).get(folder)
+
+    def series(self, folder):
+        """Every engagement record of a note, oldest first."""
+        return [record for record in read_jsonl(os.path.join(self.dir, shard_name(folder)))
+                if record['folder'] == folder]
+
+    def record(self, folder, note_id, reactions, restacks, replies):
+        """Append the note's counts if they changed; returns True if they did."""
+        counts = {'reactions': reactions, 'restacks': restacks, 'replies': replies}
+        name = shard_name(folder)
+        with self._lock:
+            latest = self._shard(name)
+            previous = latest.get(folder)
+            if previous and all(previous.get(key) == counts[key] for key in METRICS):
+                return False
+
+            record = {'folder': folder, 'note_id': str(note_id),
+                      'at': datetime.now().isoformat(timespec='seconds'), **counts}
+            os.makedirs(self.dir, exist_ok=True)
+            with open(os.path.join(self.dir, name), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            latest[folder] = record
+            return True
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python note_metrics.py <notes_dir> <YYYY/MM/DD_note-ID>")
+    for record in NoteMetrics(sys.argv[1]).series(sys.argv[2]):
+        print(f"{record['at']}  " + '  '.join(f"{key}: {record[key]}" for key in METRICS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Packed storage for notes: monthly JSONL shards plus the shared image store.
+
+In the folder layout every note is notes/YYYY/MM/DD_note-ID/ with
+original_note.md, formatted_note.md, images and a .published marker, which
+adds up to thousands of small files. In packed mode (NOTES_STORAGE=packed,
+see scraper.py) each note is one JSON line in notes/packed/YYYY-MM.jsonl:
+
+    {"folder": "2025/11/04_note-173453109", "id": "173453109",
+     "content_hash": "...", "original": "...", "formatted": "...",
+     "images": {"image1.webp": {"url": "https://...", "blob": "ab/ab12...webp"}},
+     "updated_at": "..."}
+
+Image bytes are blobs in a content-addressed image store of the archive's
+own, notes/packed/images/, which is committed with it (the scraper's
+shared image-store/ is only a local download cache). Its location,
+relative to the notes directory, is kept in notes/packed/store.json. The
+last line for a folder wins, and a shard is compacted when superseded lines
+pile up. Twitter publication records go to notes/packed/published.jsonl
+instead of .published files.
+
+update_readme.py and the Twitter publisher read the packed archive whenever
+it exists. The folder layout can be materialized from it on demand:
+
+    python notes_archive.py export notes/ exported-notes/
+    python notes_archive.py pack notes/ [--remove-folders]   # folders -> packed
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+PACKED_DIR = 'packed'
+STORE_FILE = 'store.json'
+PUBLISHED_FILE = 'published.jsonl'
+IMAGES_DIR = 'images'
+FORMAT_VERSION = 1
+
+
+def is_packed(notes_dir):
+    """True if notes_dir holds a packed archive."""
+    return os.path.exists(os.path.join(notes_dir, PACKED_DIR, STORE_FILE))
+
+
+def packed_images_dir(notes_dir):
+    """The image store of a new packed archive in notes_dir."""
+    return os.path.join(notes_dir, PACKED_DIR, IMAGES_DIR)
+
+
+def shard_name(folder):
+    """Shard file for a folder key YYYY/MM/DD_note-ID: YYYY-MM.jsonl."""
+    year, month = folder.split('/')[:2]
+    return f"{year}-{month}.jsonl"
+
+
+def read_jsonl(path):
+    """Records of a JSONL file, skipping blank and torn lines."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from an interrupted write
+                continue
+
+
+def link_or_copy(source, target):
+    """Place source at target as a hardlink, falling back to a copy."""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class PackedNotes:
+    """
+    A packed notes archive.
+
+    Keeps an in-memory index of each note's metadata (shard, content hash,
+    images), not its markdown; records() streams the full records shard by
+    shard. Writes are safe across threads.
+    """
+
+    def __init__(self, notes_dir, image_store_dir=None):
+        self.notes_dir = notes_dir
+        self.dir = os.path.join(notes_dir, PACKED_DIR)
+        self._lock = threading.Lock()
+        self._index = None
+        self._lines = {}  # shard -> lines in the file
+        self._live = {}  # shard -> notes in it
+
+        store_path = os.path.join(self.dir, STORE_FILE)
+        if os.path.exists(store_path):
+            with open(store_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            self.image_store_dir = os.path.normpath(os.path.join(notes_dir, config['image_store']))
+        elif image_store_dir:
+            os.makedirs(self.dir, exist_ok=True)
+            self.image_store_dir = image_store_dir
+            with open(store_path, 'w', encoding='utf-8') as f:
+                json.dump({'format': FORMAT_VERSION,
+                           'image_store': os.path.relpath(image_store_dir, notes_dir)}, f, indent=2)
+                f.write('\n')
+        else:
+            raise FileNotFoundError(f"no packed notes archive in {notes_dir}")
+
+    def _shards(self):
+        return sorted(p for p in Path(self.dir).glob('*.jsonl') if p.name != PUBLISHED_FILE)
+
+    def _load_index(self):
+        """{folder: metadata} for every note (lock held)."""
+        if self._index is None:
+            self._index = {}
+            for shard in self._shards():
+                lines = 0
+                for record in read_jsonl(shard):
+                    lines += 1
+                    self._index[record['folder']] = {
+                        key: value for key, value in record.items() if key not in ('original', 'formatted')
+                    }
+                self._lines[shard.name] = lines
+            for folder in self._index:
+                name = shard_name(folder)
+                self._live[name] = self._live.get(name, 0) + 1
+        return self._index
+
+    def get(self, folder):
+        """Metadata (everything but the markdown) of a note, or None."""
+        with self._lock:
+            return self._load_index().get(folder)
+
+    def folders(self):
+        """All note folder keys, sorted."""
+        with self._lock:
+            return sorted(self._load_index())
+
+    def change(self, folder, content_hash):
+        """(should_update, reason) for new content, like scraper.should_update_folder."""
+        meta = self.get(folder)
+        if meta is None:
+            return True, "new"
+        if meta['content_hash'] != content_hash:
+            return True, "updated"
+        return False, "unchanged"
+
+    def records(self):
+        """Yield the current full record of every note, in folder order."""
+        for shard in self._shards():
+            latest = {}
+            for record in read_jsonl(shard):
+                latest[record['folder']] = record
+            for folder in sorted(latest):
+                yield latest[folder]
+
+    def image_path(self, blob):
+        """Path of an image blob in the image store."""
+        return os.path.join(self.image_store_dir, blob)
+
+    def write(self, record):
+        """Append a note's record to its monthly shard."""
+        record = dict(record, updated_at=datetime.now().isoformat())
+        name = shard_name(record['folder'])
+        path = os.path.join(self.dir, name)
+        with self._lock:
+            index = self._load_index()
+            os.makedirs(self.dir, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if record['folder'] not in index:
+                self._live[name] = self._live.get(name, 0) + 1
+            index[record['folder']] = {
+                key: value for key, value in record.items() if key not in ('original', 'formatted')
+            }
+            self._lines[name] = self._lines.get(name, 0) + 1
+
+            if self._lines[name] > 2 * self._live[name] + 50:
+                self._compact(path)
+
+    def _compact(self, path):
+        """Rewrite a shard with one line per note (lock held)."""
+        latest = {}
+        for record in read_jsonl(path):
+            latest[record['folder']] = record
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for folder in sorted(latest):
+                f.write(json.dumps(latest[folder], ensure_ascii=False) + '\n')
+        os.replace(tmp_path, path)
+        self._lines[os.path.basename(path)] = len(latest)
+
+    def published(self):
+        """{folder: publication info} for notes published to Twitter."""
+        return {record['folder']: record for record in read_jsonl(os.path.join(self.dir, PUBLISHED_FILE))}
+
+    def mark_published(self, folder, **info):
+        """Record a note as published (the packed .published marker)."""
+        with self._lock:
+            with open(os.path.join(self.dir, PUBLISHED_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(folder=folder, **info), ensure_ascii=False) + '\n')
+
+    def export(self, dest_dir):
+        """Materialize the folder layout under dest_dir; returns the number of notes."""
+        published = self.published()
+        count = 0
+        for record in self.records():
+            folder_path = os.path.join(dest_dir, *record['folder'].split('/'))
+            os.makedirs(folder_path, exist_ok=True)
+            for name in ('original', 'formatted'):
+                with open(os.path.join(folder_path, f'{name}_note.md'), 'w', encoding='utf-8') as f:
+                    f.write(record[name])
+
+            url_to_file = {}
+            for filename, image in record.get('images', {}).items():
+                blob_path = self.image_path(image['blob'])
+                if os.path.exists(blob_path):
+                    link_or_copy(blob_path, os.path.join(folder_path, filename))
+                    url_to_file[image['url']] = filename
+            if url_to_file:
+                with open(os.path.join(folder_path, '.images.json'), 'w', encoding='utf-8') as f:
+                    json.dump(url_to_file, f, indent=2)
+                    f.write('\n')
+
+            info = published.get(record['folder'])
+            if info:
+                with open(os.path.join(folder_path, '.published'), 'w', encoding='utf-8') as f:
+                    for key in ('published_at', 'tweet_id', 'tweet_url'):
+                        if key in info:
+                            f.write(f"{key}: {info[key]}\n")
+            count += 1
+        return count
+
+
+def read_published_marker(path):
+    """The key: value lines of a .published marker as a dict."""
+    info = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if ': ' in line:
+                key, value = line.rstrip('\n').split(': ', 1)
+                info[key] = value
+    return info
+
+
+def has_note_folders(notes_dir):
+    """True if notes_dir holds notes in the folder layout."""
+    return any(Path(notes_dir).glob('*/*/*_note-*/original_note.md'))
+
+
+def pack_folders(notes_dir, get_image_store, hash_content, infer_image_sidecar, remove_folders=False):
+    """
+    Move a folder-layout notes archive into packed shards; returns the
+    number of notes packed. Images are added to the archive's image store,
+    get_image_store(directory). The scraper's helpers are passed in (see
+    scraper.pack_note_folders) rather than imported, so that packing uses
+    the running scraper's image store and its locking.
+
+    If packing a new archive fails part way, its store.json is removed
+    again, so the folders stay the archive and packing can be retried.
+    """
+    created = not is_packed(notes_dir)
+    archive = PackedNotes(notes_dir, image_store_dir=packed_images_dir(notes_dir))
+    store = get_image_store(archive.image_store_dir)
+    try:
+        count = _pack_folders(archive, store, hash_content, infer_image_sidecar, remove_folders)
+    except BaseException:
+        if created:
+            os.remove(os.path.join(archive.dir, STORE_FILE))
+        raise
+    store.save()
+    return count
+
+
+def _pack_folders(archive, store, hash_content, infer_image_sidecar, remove_folders):
+    notes_dir = archive.notes_dir
+    count = 0
+    for original_path in sorted(Path(notes_dir).glob('*/*/*_note-*/original_note.md')):
+        folder_path = original_path.parent
+        folder = folder_path.relative_to(notes_dir).as_posix()
+        formatted_path = folder_path / 'formatted_note.md'
+        original = original_path.read_text(encoding='utf-8')
+
+        sidecar_path = folder_path / '.images.json'
+        if sidecar_path.exists():
+            with open(sidecar_path, 'r', encoding='utf-8') as f:
+                url_to_file = json.load(f)
+        else:
+            url_to_file = infer_image_sidecar(str(folder_path))
+        file_to_url = {filename: url for url, filename in url_to_file.items()}
+
+        images = {}
+        for image_path in sorted(folder_path.glob('image*')):
+            url = file_to_url.get(image_path.name, '')
+            blob_path = store.add(url or f"file:{folder}/{image_path.name}", image_path.read_bytes(),
+                                  image_path.suffix)
+            images[image_path.name] = {'url': url, 'blob': os.path.relpath(blob_path, store.root)}
+
+        archive.write({
+            'folder': folder,
+            'id': folder_path.name.split('_note-', 1)[-1],
+            'content_hash': hash_content(original),
+            'original': original,
+            'formatted': formatted_path.read_text(encoding='utf-8') if formatted_path.exists() else original,
+            'images': images,
+        })
+
+        marker_path = folder_path / '.published'
+        if marker_path.exists():
+            archive.mark_published(folder, **read_published_marker(marker_path))
+        if remove_folders:
+            shutil.rmtree(folder_path)
+        count += 1
+
+    if remove_folders:
+        # Drop the year/month directories left empty
+        for path in [*Path(notes_dir).glob('[0-9]*/[0-9]*'), *Path(notes_dir).glob('[0-9]*')]:
+            if path.is_dir() and not any(path.iterdir()):
+                path.rmdir()
+    return count
+
+
+def main():
+    # Only the command line needs argparse, not the scraper importing this module
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help='materialize the folder layout from a packed archive')
+    export_parser.add_argument('notes_dir')
+    export_parser.add_argument('dest_dir')
+    pack_parser = subparsers.add_parser('pack', help='convert a folder-layout archive to packed shards')
+    pack_parser.add_argument('notes_dir')
+    pack_parser.add_argument('--remove-folders', action='store_true', help='delete the note folders once packed')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        if not is_packed(args.notes_dir):
+            sys.exit(f"No packed notes archive in {args.notes_dir}")
+        count = PackedNotes(args.notes_dir).export(args.dest_dir)
+        print(f"Exported {count} notes to {args.dest_dir}")
+    else:
+        # Packing needs the scraper's image store and helpers
+        from scraper import pack_note_folders
+        count = pack_note_folders(args.notes_dir, args.remove_folders)
+        print(f"Packed {count} notes into {os.path.join(args.notes_dir, PACKED_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,16 @@
  *
  * Reads ProseMirror JSON from stdin and outputs Markdown to stdout.
  * Uses the official prosemirror-markdown library.
+ *
+ * With --server, stays alive and handles newline-delimited JSON requests:
+ * each input line is a ProseMirror document, each output line is
+ * {"markdown": "..."} or {"error": "..."}.
  */
 
 const { schema } = require('prosemirror-markdown');
 const { Node } = require('prosemirror-model');
 const { MarkdownSerializer, defaultMarkdownSerializer } = require('prosemirror-markdown');
 
-// Read JSON from stdin
-let inputData = '';
-
-process.stdin.on('data', (chunk) => {
-  inputData += chunk;
-});
-
 /**
  * Convert Substack's ProseMirror format to standard ProseMirror format
  * Substack uses: bold, italic, orderedList, bulletList
@@ -67,25 +64,60 @@ function normalizeSubstackFormat(node) {
   return normalized;
 }
 
-process.stdin.on('end', () => {
-  try {
-    // Parse the ProseMirror JSON
-    const prosemirrorDoc = JSON.parse(inputData);
+/**
+ * Convert a serialized ProseMirror document to Markdown
+ */
+function convert(inputData) {
+  // Parse the ProseMirror JSON
+  const prosemirrorDoc = JSON.parse(inputData);
+
+  // Normalize Substack format to standard ProseMirror format
+  const normalizedDoc = normalizeSubstackFormat(prosemirrorDoc);
 
-    // Normalize Substack format to standard ProseMirror format
-    const normalizedDoc = normalizeSubstackFormat(prosemirrorDoc);
+  // Create a ProseMirror node from the JSON
+  const doc = Node.fromJSON(schema, normalizedDoc);
 
-    // Create a ProseMirror node from the JSON
-    const doc = Node.fromJSON(schema, normalizedDoc);
+  // Serialize to Markdown
+  return defaultMarkdownSerializer.serialize(doc);
+}
 
-    // Serialize to Markdown
-    const markdown = defaultMarkdownSerializer.serialize(doc);
+if (process.argv.includes('--server')) {
+  // Worker mode: one JSON document per line in, one JSON response per line out
+  const readline = require('readline');
+  const rl = readline.createInterface({ input: process.stdin, terminal: false });
 
-    // Output the markdown
-    process.stdout.write(markdown);
+  rl.on('line', (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    let response;
+    try {
+      response = { markdown: convert(line) };
+    } catch (error) {
+      response = { error: error.message };
+    }
+    process.stdout.write(JSON.stringify(response) + '\n');
+  });
+
+  rl.on('close', () => {
     process.exit(0);
-  } catch (error) {
-    process.stderr.write(`Error: ${error.message}\n`);
-    process.exit(1);
-  }
-});
+  });
+} else {
+  // Read JSON from stdin
+  let inputData = '';
+
+  process.stdin.on('data', (chunk) => {
+    inputData += chunk;
+  });
+
+  process.stdin.on('end', () => {
+    try {
+      // Output the markdown
+      process.stdout.write(convert(inputData));
+      process.exit(0);
+    } catch (error) {
+      process.stderr.write(`Error: ${error.message}\n`);
+      process.exit(1);
+    }
+  });
+}
@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Pure-Python ProseMirror to Markdown renderer.
+
+Port of prosemirror-markdown's defaultMarkdownSerializer (the library used by
+prosemirror-to-markdown.js) for the node and mark types Substack emits, so
+notes can be converted in-process without Node.js. Output is meant to match
+the Node converter byte for byte; benchmarks/compare_prosemirror.py checks that.
+
+Unlike the Node converter, unknown node types are rendered by their content
+and unknown marks are ignored instead of failing the whole document.
+"""
+
+import re
+
+
+# Substack type names -> prosemirror-markdown schema names
+NODE_TYPE_MAP = {
+    'orderedList': 'ordered_list',
+    'bulletList': 'bullet_list',
+    'listItem': 'list_item',
+    'hardBreak': 'hard_break',
+    'codeBlock': 'code_block',
+    'horizontalRule': 'horizontal_rule',
+}
+
+MARK_TYPE_MAP = {
+    'bold': 'strong',
+    'italic': 'em',
+}
+
+# Attributes and defaults per node/mark type in the prosemirror-markdown schema
+NODE_ATTRS = {
+    'heading': {'level': 1},
+    'code_block': {'params': ''},
+    'ordered_list': {'order': 1, 'tight': False},
+    'bullet_list': {'tight': False},
+    'image': {'src': '', 'alt': None, 'title': None},
+}
+
+MARK_ATTRS = {
+    'link': {'href': '', 'title': None},
+}
+
+# Schema order of marks; marks on a text node are sorted by this rank
+MARK_RANK = {'em': 0, 'strong': 1, 'link': 2, 'code': 3}
+
+INLINE_TYPES = {'text', 'hard_break', 'image'}
+
+ASCII_WORD_RE = re.compile(r'\w', re.ASCII)
+ESCAPE_RE = re.compile(r'[`*\\~\[\]_]')
+
+
+class Mark:
+    """A mark (strong, em, link, code) applied to an inline node."""
+
+    def __init__(self, type_name, attrs):
+        self.type = type_name
+        self.attrs = attrs
+
+    def eq(self, other):
+        return self is other or (self.type == other.type and self.attrs == other.attrs)
+
+    def is_in_set(self, marks):
+        return any(self.eq(mark) for mark in marks)
+
+
+class PMNode:
+    """A ProseMirror node normalized to prosemirror-markdown's schema."""
+
+    def __init__(self, type_name, attrs=None, content=None, marks=None, text=None):
+        self.type = type_name
+        self.attrs = attrs or {}
+        self.content = content or []
+        self.marks = marks or []
+        self.text = text
+
+    @property
+    def is_text(self):
+        return self.type == 'text'
+
+    @property
+    def child_count(self):
+        return len(self.content)
+
+    def child(self, index):
+        return self.content[index]
+
+    def with_text(self, text):
+        return PMNode('text', self.attrs, marks=self.marks, text=text)
+
+    @property
+    def text_content(self):
+        if self.is_text:
+            return self.text
+        return ''.join(child.text_content for child in self.content)
+
+
+def _build_attrs(defaults, attrs):
+    """Keep only schema attributes, filling in defaults like Node.fromJSON."""
+    attrs = attrs or {}
+    return {name: attrs.get(name, default) for name, default in defaults.items()}
+
+
+def node_from_json(json_node):
+    """Build a PMNode tree from Substack's body_json, normalizing type names."""
+    node_type = json_node.get('type', '')
+    node_type = NODE_TYPE_MAP.get(node_type, node_type)
+
+    marks = []
+    for json_mark in json_node.get('marks') or []:
+        mark_type = json_mark.get('type', '')
+        mark_type = MARK_TYPE_MAP.get(mark_type, mark_type)
+        if mark_type not in MARK_RANK:
+            continue
+        marks.append(Mark(mark_type, _build_attrs(MARK_ATTRS.get(mark_type, {}), json_mark.get('attrs'))))
+    marks.sort(key=lambda m: MARK_RANK[m.type])
+
+    if node_type == 'text':
+        return PMNode('text', marks=marks, text=json_node.get('text', ''))
+
+    content = []
+    for child in json_node.get('content') or []:
+        # Empty text nodes are invalid in ProseMirror; drop them
+        if child.get('type') == 'text' and not child.get('text'):
+            continue
+        content.append(node_from_json(child))
+
+    attrs = _build_attrs(NODE_ATTRS.get(node_type, {}), json_node.get('attrs'))
+    return PMNode(node_type, attrs, content, marks)
+
+
+def _backticks_for(node, side):
+    """Backtick fence for a code mark, long enough to wrap backticks in the text."""
+    length = 0
+    if node.is_text:
+        for match in re.finditer(r'`+', node.text):
+            length = max(length, len(match.group(0)))
+    result = ' `' if length > 0 and side > 0 else '`'
+    result += '`' * length
+    if length > 0 and side < 0:
+        result += ' '
+    return result
+
+
+def _is_plain_url(link, parent, index):
+    """Whether a link can be written as an autolink (<url>)."""
+    href = link.attrs.get('href') or ''
+    if link.attrs.get('title') or not re.match(r'\w+:', href, re.ASCII):
+        return False
+    content = parent.child(index)
+    if not content.is_text or content.text != href or not content.marks or content.marks[-1] is not link:
+        return False
+    return index == parent.child_count - 1 or not link.is_in_set(parent.child(index + 1).marks)
+
+
+class MarkdownSerializerState:
+    """Output state while serializing, mirroring prosemirror-markdown's state object."""
+
+    def __init__(self):
+        self.delim = ''
+        self.out = ''
+        self.closed = None
+        self.in_autolink = None
+        self.at_block_start = False
+        self.in_tight_list = False
+
+    # -- output primitives --
+
+    def flush_close(self, size=2):
+        if self.closed is not None:
+            if not self.at_blank():
+                self.out += '\n'
+            if size > 1:
+                delim_min = self.delim.rstrip()
+                for _ in range(1, size):
+                    self.out += delim_min + '\n'
+            self.closed = None
+
+    def wrap_block(self, delim, first_delim, node, render):
+        old = self.delim
+        self.write(first_delim if first_delim is not None else delim)
+        self.delim += delim
+        render()
+        self.delim = old
+        self.close_block(node)
+
+    def at_blank(self):
+        return self.out == '' or self.out.endswith('\n')
+
+    def write(self, content=None):
+        self.flush_close()
+        if self.delim and self.at_blank():
+            self.out += self.delim
+        if content:
+            self.out += content
+
+    def close_block(self, node):
+        self.closed = node
+
+    def text(self, text, escape=True):
+        lines = text.split('\n')
+        for i, line in enumerate(lines):
+            self.write()
+            # Escape exclamation marks in front of links
+            if not escape and line[:1] == '[' and re.search(r'(^|[^\\])!$', self.out):
+                self.out = self.out[:-1] + '\\!'
+            self.out += self.esc(line, self.at_block_start) if escape else line
+            if i != len(lines) - 1:
+                self.out += '\n'
+
+    def esc(self, text, start_of_line=False):
+        def escape_char(match):
+            char = match.group(0)
+            i = match.start()
+            if (char == '_' and 0 < i < len(text) - 1
+                    and ASCII_WORD_RE.match(text[i - 1]) and ASCII_WORD_RE.match(text[i + 1])):
+                return char
+            return '\\' + char
+
+        text = ESCAPE_RE.sub(escape_char, text)
+        if start_of_line:
+            text = re.sub(r'^(\+ |[\-*>])', r'\\\g<0>', text, count=1)
+            text = re.sub(r'^(\s*)(#{1,6})(\s|$)', r'\1\\\2\3', text, count=1)
+            text = re.sub(r'^(\s*\d+)\.\s', r'\1\\. ', text, count=1)
+        return text
+
+    # -- node rendering --
+
+    def render(self, node, parent, index):
+        renderer = NODE_RENDERERS.get(node.type)
+        if renderer:
+            renderer(self, node, parent, index)
+        elif node.content:
+            # Unknown node: render its content the way a non-strict serializer would
+            if all(child.type in INLINE_TYPES for child in node.content):
+                self.render_inline(node)
+            else:
+                self.render_content(node)
+            if node.type not in INLINE_TYPES:
+                self.close_block(node)
+
+    def render_content(self, parent):
+        for index, node in enumerate(parent.content):
+            self.render(node, parent, index)
+
+    def render_inline(self, parent, from_block_start=True):
+        self.at_block_start = from_block_start
+        active = []
+        trailing = ''
+
+        def progress(node, index):
+            nonlocal active, trailing
+            marks = node.marks if node is not None else []
+
+            # Remove marks from hard breaks that are the last node inside
+            # that mark, to prevent newlines just before closing marks
+            if node is not None and node.type == 'hard_break':
+                kept = []
+                for mark in marks:
+                    if index + 1 == parent.child_count:
+                        continue
+                    following = parent.child(index + 1)
+                    if mark.is_in_set(following.marks) and (not following.is_text or re.search(r'\S', following.text)):
+                        kept.append(mark)
+                marks = kept
+
+            leading = trailing
+            trailing = ''
+
+            # Expel enclosing whitespace from em/strong marks
+            if node is not None and node.is_text and any(
+                    MARK_SPECS[mark.type].get('expel_whitespace') and not mark.is_in_set(active)
+                    for mark in marks):
+                match = re.match(r'(\s*)(.*)$', node.text, re.M)
+                lead, rest = match.group(1), match.group(2)
+                if lead:
+                    leading += lead
+                    node = node.with_text(rest) if rest else None
+                    if node is None:
+                        marks = active
+            if node is not None and node.is_text and any(
+                    MARK_SPECS[mark.type].get('expel_whitespace') and (
+                        index == parent.child_count - 1 or not mark.is_in_set(parent.child(index + 1).marks))
+                    for mark in marks):
+                match = re.match(r'(.*?)(\s*)$', node.text, re.M)
+                rest, trail = match.group(1), match.group(2)
+                if trail:
+                    trailing = trail
+                    node = node.with_text(rest) if rest else None
+                    if node is None:
+                        marks = active
+
+            inner = marks[-1] if marks else None
+            no_esc = inner is not None and MARK_SPECS[inner.type].get('escape') is False
+            length = len(marks) - (1 if no_esc else 0)
+
+            # Reorder mixable marks (em, strong) so their order matches the
+            # currently open marks
+            for i in range(length):
+                mark = marks[i]
+                if not MARK_SPECS[mark.type].get('mixable'):
+                    break
+                for j, other in enumerate(active):
+                    if not MARK_SPECS[other.type].get('mixable'):
+                        break
+                    if mark.eq(other):
+                        if i > j:
+                            marks = marks[:j] + [mark] + marks[j:i] + marks[i + 1:length]
+                        elif j > i:
+                            marks = marks[:i] + marks[i + 1:j] + [mark] + marks[j:length]
+                        break
+
+            # Find the prefix of the mark set that didn't change
+            keep = 0
+            while keep < min(len(active), length) and marks[keep].eq(active[keep]):
+                keep += 1
+
+            # Close the marks that need to be closed
+            while keep < len(active):
+                self.text(self.mark_string(active.pop(), False, parent, index), False)
+
+            # Output any previously expelled trailing whitespace outside the marks
+            if leading:
+                self.text(leading)
+
+            # Open the marks that need to be opened
+            if node is not None:
+                while len(active) < length:
+                    add = marks[len(active)]
+                    active.append(add)
+                    self.text(self.mark_string(add, True, parent, index), False)
+                    self.at_block_start = False
+
+                # Code marks are rendered around the raw text without escaping
+                if no_esc and node.is_text:
+                    self.text(self.mark_string(inner, True, parent, index) + node.text +
+                              self.mark_string(inner, False, parent, index + 1), False)
+                else:
+                    self.render(node, parent, index)
+                self.at_block_start = False
+
+            if node is not None and node.is_text and node.text:
+                self.at_block_start = False
+
+        for index, child in enumerate(parent.content):
+            progress(child, index)
+        progress(None, parent.child_count)
+        self.at_block_start = False
+
+    def render_list(self, node, delim, first_delim):
+        if self.closed is not None and self.closed.type == node.type:
+            self.flush_close(3)
+        elif self.in_tight_list:
+            self.flush_close(1)
+
+        is_tight = node.attrs.get('tight', False)
+        prev_tight = self.in_tight_list
+        self.in_tight_list = is_tight
+        for index, child in enumerate(node.content):
+            if index and is_tight:
+                self.flush_close(1)
+            self.wrap_block(delim, first_delim(index), node,
+                            lambda child=child, index=index: self.render(child, node, index))
+        self.in_tight_list = prev_tight
+
+    def mark_string(self, mark, is_open, parent, index):
+        value = MARK_SPECS[mark.type]['open' if is_open else 'close']
+        return value if isinstance(value, str) else value(self, mark, parent, index)
+
+
+# -- node serializers --
+
+def _render_blockquote(state, node, parent, index):
+    state.wrap_block('> ', None, node, lambda: state.render_content(node))
+
+
+def _render_code_block(state, node, parent, index):
+    # Make the fence longer than any backtick run inside the code
+    text = node.text_content
+    backticks = re.findall(r'`{3,}', text)
+    fence = sorted(backticks)[-1] + '`' if backticks else '```'
+
+    state.write(fence + (node.attrs.get('params') or '') + '\n')
+    state.text(text, False)
+    state.write('\n')
+    state.write(fence)
+    state.close_block(node)
+
+
+def _render_heading(state, node, parent, index):
+    state.write('#' * (node.attrs.get('level') or 1) + ' ')
+    state.render_inline(node, False)
+    state.close_block(node)
+
+
+def _render_horizontal_rule(state, node, parent, index):
+    state.write('---')
+    state.close_block(node)
+
+
+def _render_bullet_list(state, node, parent, index):
+    state.render_list(node, '  ', lambda i: '* ')
+
+
+def _render_ordered_list(state, node, parent, index):
+    start = node.attrs.get('order') or 1
+    max_width = len(str(start + node.child_count - 1))
+    space = ' ' * (max_width + 2)
+
+    def first_delim(i):
+        number = str(start + i)
+        return ' ' * (max_width - len(number)) + number + '. '
+
+    state.render_list(node, space, first_delim)
+
+
+def _render_list_item(state, node, parent, index):
+    state.render_content(node)
+
+
+def _render_paragraph(state, node, parent, index):
+    state.render_inline(node)
+    state.close_block(node)
+
+
+def _render_image(state, node, parent, index):
+    src = re.sub(r'[()]', r'\\\g<0>', node.attrs.get('src') or '')
+    title = node.attrs.get('title')
+    title_part = ' "' + title.replace('"', '\\"') + '"' if title else ''
+    state.write('![' + state.esc(node.attrs.get('alt') or '') + '](' + src + title_part + ')')
+
+
+def _render_hard_break(state, node, parent, index):
+    for i in range(index + 1, parent.child_count):
+        if parent.child(i).type != node.type:
+            state.write('\\\n')
+            return
+
+
+def _render_text(state, node, parent, index):
+    state.text(node.text, not state.in_autolink)
+
+
+NODE_RENDERERS = {
+    'blockquote': _render_blockquote,
+    'code_block': _render_code_block,
+    'heading': _render_heading,
+    'horizontal_rule': _render_horizontal_rule,
+    'bullet_list': _render_bullet_list,
+    'ordered_list': _render_ordered_list,
+    'list_item': _render_list_item,
+    'paragraph': _render_paragraph,
+    'image': _render_image,
+    'hard_break': _render_hard_break,
+    'text': _render_text,
+}
+
+
+# -- mark serializers --
+
+def _link_open(state, mark, parent, index):
+    state.in_autolink = _is_plain_url(mark, parent, index)
+    return '<' if state.in_autolink else '['
+
+
+def _link_close(state, mark, parent, index):
+    in_autolink = state.in_autolink
+    state.in_autolink = None
+    if in_autolink:
+        return '>'
+    href = re.sub(r'[()"]', r'\\\g<0>', mark.attrs.get('href') or '')
+    title = mark.attrs.get('title')
+    title_part = ' "' + title.replace('"', '\\"') + '"' if title else ''
+    return '](' + href + title_part + ')'
+
+
+MARK_SPECS = {
+    'em': {'open': '*', 'close': '*', 'mixable': True, 'expel_whitespace': True},
+    'strong': {'open': '**', 'close': '**', 'mixable': True, 'expel_whitespace': True},
+    'link': {'open': _link_open, 'close': _link_close},
+    'code': {
+        'open': lambda state, mark, parent, index: _backticks_for(parent.child(index), -1),
+        'close': lambda state, mark, parent, index: _backticks_for(parent.child(index - 1), 1),
+        'escape': False,
+    },
+}
+
+
+def serialize(body_json):
+    """Convert Substack's ProseMirror body_json to markdown."""
+    if not body_json or not isinstance(body_json, dict):
+        return ""
+
+    doc = node_from_json(body_json)
+    state = MarkdownSerializerState()
+    state.render_content(doc)
+    return state.out
@@ -3,32 +3,75 @@
 Substack Content Scraper
 Fetches both posts (from RSS feed) and notes (from notes page) from Substack.
 Creates folders with original and formatted markdown files, plus downloaded images.
+
+Usage: python -m scraper [all|posts|notes|probe] (see main()). Modules only
+one pipeline needs (html2text and the XML parser for posts, multiprocessing
+for the conversion pool) are imported where they are used, so a notes-only
+run does not pay for them at startup.
 """
 
-import feedparser
 import os
 import re
 import json
+import atexit
+import codecs
+import collections
+import contextlib
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import http.client
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from html2text import html2text
 from pathlib import Path
 import hashlib
-import urllib.request
-from urllib.parse import urljoin, urlparse
-from html.parser import HTMLParser
+import zlib
+import urllib.error
+from urllib.parse import quote, unquote, urlencode, urljoin, urlparse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+import instrumentation
+
+_markdown_converter_class = None
 
 
-class ImageExtractor(HTMLParser):
-    """Extract image URLs from HTML."""
-    def __init__(self):
-        super().__init__()
-        self.images = []
+def markdown_converter():
+    """
+    Return a new html2text converter that also collects image URLs.
+
+    A single parse of the HTML yields the markdown, with the whitespace that
+    line wrapping leaves inside URLs removed (see clean_markdown_urls), and
+    the src of every <img> in document order (in .images). html2text is
+    imported on first use.
+    """
+    global _markdown_converter_class
+    if _markdown_converter_class is None:
+        from html2text import HTML2Text
+
+        class MarkdownConverter(HTML2Text):
+            def __init__(self):
+                super().__init__()
+                self.images = []
 
-    def handle_starttag(self, tag, attrs):
-        if tag == 'img':
-            attrs_dict = dict(attrs)
-            if 'src' in attrs_dict:
-                self.images.append(attrs_dict['src'])
+            def handle_tag(self, tag, attrs, start):
+                if tag == 'img' and start and attrs.get('src'):
+                    self.images.append(clean_url(attrs['src']))
+                super().handle_tag(tag, attrs, start)
+
+            def handle(self, data):
+                return clean_markdown_urls(super().handle(data))
+
+        _markdown_converter_class = MarkdownConverter
+    return _markdown_converter_class()
 
 
 def sanitize_filename(title):
@@ -39,206 +82,445 @@ def sanitize_filename(title):
     return filename[:100].lower()
 
 
-def clean_markdown_urls(markdown_content):
-    """Remove newlines and extra whitespace from URLs in markdown syntax."""
-    # First, handle clickable images: [![](url1)](url2)
-    # This pattern has two URLs that both need cleaning
-    markdown_content = re.sub(
-        r'\[!\[(.*?)\]\(([^)]+)\)\]\(([^)]+)\)',
-        lambda m: f'[![{m.group(1)}]({clean_url(m.group(2))})]({clean_url(m.group(3))})',
-        markdown_content,
-        flags=re.DOTALL
-    )
+MARKDOWN_URL_TOKEN_RE = re.compile(r'\[|\]\(')
+NON_SPACE_RE = re.compile(r'\S')
+SPACE_RE = re.compile(r'\s')
 
-    # Then handle standalone images: ![alt](url)
-    markdown_content = re.sub(
-        r'!\[(.*?)\]\(([^)]+)\)',
-        lambda m: f'![{m.group(1)}]({clean_url(m.group(2))})',
-        markdown_content,
-        flags=re.DOTALL
-    )
-
-    # Finally handle regular links: [text](url)
-    markdown_content = re.sub(
-        r'\[(.*?)\]\(([^)]+)\)',
-        lambda m: f'[{m.group(1)}]({clean_url(m.group(2))})',
-        markdown_content,
-        flags=re.DOTALL
-    )
 
-    return markdown_content
+def clean_markdown_urls(markdown_content):
+    r"""
+    Remove newlines and extra whitespace from URLs in markdown syntax.
+
+    Cleans the URLs of clickable images [![alt](url1)](url2), images
+    ![alt](url) and links [text](url) in one left-to-right scan over the
+    brackets, in linear time. Each of the three forms is tracked by its own
+    matcher with the same leftmost, shortest-text semantics as the regexes
+    `\[!\[(.*?)\]\(([^)]+)\)\]\(([^)]+)\)`, `!\[(.*?)\]\(([^)]+)\)` and
+    `\[(.*?)\]\(([^)]+)\)`, without their backtracking on unclosed brackets.
+    (The one case not reproduced is a URL whose whitespace removal joins a
+    `]` and `(` into a new `](`.)
+    """
+    text = markdown_content
+    if '](' not in text:
+        return text
 
+    spans = []
+    emptied = set()
+
+    # Per form: earliest unmatched opening position (-1 if none) and the
+    # position scanning may resume at after its last match
+    clickable_open, clickable_resume = -1, 0
+    image_open, image_resume = -1, 0
+    link_open, link_resume = -1, 0
+
+    # First ')' at or after a position, cached so repeated lookups stay linear
+    close_from = len(text) + 1
+    close_at = -1
+
+    for token in MARKDOWN_URL_TOKEN_RE.finditer(text):
+        pos = token.start()
+
+        if text[pos] == '[':
+            if link_open < 0 and pos >= link_resume:
+                link_open = pos
+            if pos >= 1 and text[pos - 1] == '!':
+                if image_open < 0 and pos - 1 >= image_resume:
+                    image_open = pos - 1
+                if clickable_open < 0 and pos >= 2 and text[pos - 2] == '[' and pos - 2 >= clickable_resume:
+                    clickable_open = pos - 2
+            continue
 
-def convert_html_to_markdown(html_content):
-    """Convert HTML content to markdown."""
-    markdown = html2text(html_content)
-    # Clean up URLs by removing newlines from within parentheses
-    markdown = clean_markdown_urls(markdown)
-    return markdown.strip()
+        if link_open < 0 and image_open < 0 and clickable_open < 0:
+            continue
 
+        # "](": the URL runs to the next ')' and must not be empty
+        url_start = pos + 2
+        if not (close_from <= url_start and (close_at == -1 or url_start <= close_at)):
+            close_from = url_start
+            close_at = text.find(')', url_start)
+        url_end = close_at
+        if url_end <= url_start:
+            continue
 
-def apply_marks(text, marks):
-    """Apply ProseMirror marks (bold, italic, links, code) to text."""
-    if not marks:
+        # Match in the order the forms were historically applied. A URL that is
+        # only whitespace becomes empty once matched, so later forms skip it.
+        if clickable_open >= 0 and text.startswith('](', url_end + 1):
+            outer_start = url_end + 3
+            outer_end = text.find(')', outer_start)
+            if outer_end > outer_start:
+                for span in ((url_start, url_end), (outer_start, outer_end)):
+                    spans.append(span)
+                    if not NON_SPACE_RE.search(text, span[0], span[1]):
+                        emptied.add(span[0])
+                clickable_open, clickable_resume = -1, outer_end + 1
+
+        if image_open >= 0 and url_start not in emptied:
+            spans.append((url_start, url_end))
+            if not NON_SPACE_RE.search(text, url_start, url_end):
+                emptied.add(url_start)
+            image_open, image_resume = -1, url_end + 1
+
+        if link_open >= 0 and url_start not in emptied:
+            spans.append((url_start, url_end))
+            link_open, link_resume = -1, url_end + 1
+
+    # Strip whitespace inside the union of URL spans
+    spans = [span for span in spans if SPACE_RE.search(text, span[0], span[1])]
+    if not spans:
         return text
 
-    # Sort marks by type to ensure consistent nesting
-    # Links should be applied last to wrap other formatting
-    mark_order = {'code': 0, 'bold': 1, 'italic': 2, 'link': 3}
-    sorted_marks = sorted(marks, key=lambda m: mark_order.get(m.get('type', ''), 99))
-
-    result = text
-    for mark in sorted_marks:
-        mark_type = mark.get('type')
-        if mark_type == 'bold':
-            result = f"**{result}**"
-        elif mark_type == 'italic':
-            result = f"*{result}*"
-        elif mark_type == 'link':
-            href = mark.get('attrs', {}).get('href', '')
-            result = f"[{result}]({href})"
-        elif mark_type == 'code':
-            result = f"`{result}`"
-
-    return result
-
-
-def parse_paragraph_node(node):
-    """Parse a paragraph node from ProseMirror JSON."""
-    content = node.get('content', [])
+    spans.sort()
     parts = []
-
-    for item in content:
-        if item.get('type') == 'text':
-            text = item.get('text', '')
-            marks = item.get('marks', [])
-            parts.append(apply_marks(text, marks))
-
+    last = 0
+    span_start, span_end = spans[0]
+    for next_start, next_end in spans[1:] + [(len(text) + 1, len(text) + 1)]:
+        if next_start <= span_end:
+            span_end = max(span_end, next_end)
+            continue
+        parts.append(text[last:span_start])
+        parts.append(clean_url(text[span_start:span_end]))
+        last = span_end
+        span_start, span_end = next_start, next_end
+    parts.append(text[last:])
     return ''.join(parts)
 
 
-def parse_list_item_node(node):
-    """Parse a list item node from ProseMirror JSON."""
-    content = node.get('content', [])
-    parts = []
-
-    for item in content:
-        if item.get('type') == 'paragraph':
-            parts.append(parse_paragraph_node(item))
-        elif item.get('type') == 'orderedList':
-            # Nested ordered list
-            parts.append('\n' + parse_ordered_list_node(item, indent_level=1))
-        elif item.get('type') == 'bulletList':
-            # Nested bullet list
-            parts.append('\n' + parse_bullet_list_node(item, indent_level=1))
+def convert_html_to_markdown(html_content):
+    """Convert HTML content to markdown."""
+    return markdown_converter().handle(html_content).strip()
 
-    return ' '.join(parts)
 
+def parse_body_json_to_markdown_custom(body_json):
+    """Parse Substack's ProseMirror-style body_json to markdown in-process (no Node.js)."""
+    import prosemirror_markdown  # notes only
+    return prosemirror_markdown.serialize(body_json).strip()
 
-def parse_ordered_list_node(node, indent_level=0):
-    """Parse an ordered list node from ProseMirror JSON."""
-    content = node.get('content', [])
-    lines = []
-    indent = '  ' * indent_level
 
-    for idx, item in enumerate(content, 1):
-        if item.get('type') == 'listItem':
-            item_text = parse_list_item_node(item)
-            lines.append(f"{indent}{idx}. {item_text}")
+class ProseMirrorConverter:
+    """
+    Long-lived Node.js worker for ProseMirror JSON to markdown conversion.
 
-    return '\n'.join(lines)
+    Starts `prosemirror-to-markdown.js --server` once and sends it one JSON
+    document per line, so Node startup and the prosemirror-markdown require
+    are paid once per scraper run instead of once per note. The worker is
+    restarted on the next request if it crashes or times out.
+    """
 
+    def __init__(self, script_path=None, timeout=5):
+        if script_path is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            script_path = os.path.join(script_dir, 'prosemirror-to-markdown.js')
+        self.script_path = script_path
+        self.timeout = timeout
+        self.available = True
+        self._process = None
+        self._responses = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Spawn the Node.js worker and a thread that collects its output lines."""
+        self._process = subprocess.Popen(
+            ['node', self.script_path, '--server'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='utf-8',
+            bufsize=1
+        )
+        self._responses = queue.Queue()
+        reader = threading.Thread(
+            target=self._read_responses,
+            args=(self._process.stdout, self._responses),
+            daemon=True
+        )
+        reader.start()
 
-def parse_bullet_list_node(node, indent_level=0):
-    """Parse a bullet list node from ProseMirror JSON."""
-    content = node.get('content', [])
-    lines = []
-    indent = '  ' * indent_level
+    @staticmethod
+    def _read_responses(stream, responses):
+        """Forward worker output lines to the response queue; None marks EOF."""
+        for line in stream:
+            responses.put(line)
+        responses.put(None)
 
-    for item in content:
-        if item.get('type') == 'listItem':
-            item_text = parse_list_item_node(item)
-            lines.append(f"{indent}- {item_text}")
+    def convert(self, body_json):
+        """
+        Convert body_json to markdown using the worker.
 
-    return '\n'.join(lines)
+        Raises RuntimeError if the worker fails, exits or times out.
+        """
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
 
+            try:
+                self._process.stdin.write(json.dumps(body_json) + '\n')
+                self._process.stdin.flush()
+                line = self._responses.get(timeout=self.timeout)
+            except queue.Empty:
+                self._stop()
+                raise RuntimeError(f"converter timed out after {self.timeout}s")
+            except OSError as e:
+                self._stop()
+                raise RuntimeError(f"converter exited: {e}")
+
+            if line is None:
+                self._stop()
+                raise RuntimeError("converter exited unexpectedly")
+
+            response = json.loads(line)
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+            return response.get('markdown', '')
+
+    def _stop(self):
+        """Terminate the worker process if it is running."""
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+        self._responses = None
 
-def parse_body_json_to_markdown_custom(body_json):
-    """Parse Substack's ProseMirror-style body_json to markdown using custom parser."""
-    if not body_json or not isinstance(body_json, dict):
-        return ""
+    def close(self):
+        """Shut down the worker."""
+        with self._lock:
+            self._stop()
 
-    content = body_json.get('content', [])
-    if not content:
-        return ""
 
-    paragraphs = []
-    for node in content:
-        node_type = node.get('type')
+_prosemirror_converter = None
 
-        if node_type == 'paragraph':
-            para_text = parse_paragraph_node(node)
-            if para_text:  # Only add non-empty paragraphs
-                paragraphs.append(para_text)
-        elif node_type == 'orderedList':
-            list_text = parse_ordered_list_node(node)
-            if list_text:
-                paragraphs.append(list_text)
-        elif node_type == 'bulletList':
-            list_text = parse_bullet_list_node(node)
-            if list_text:
-                paragraphs.append(list_text)
 
-    return '\n\n'.join(paragraphs)
+def get_prosemirror_converter():
+    """Return the shared converter worker, creating it on first use."""
+    global _prosemirror_converter
+    if _prosemirror_converter is None:
+        _prosemirror_converter = ProseMirrorConverter()
+        atexit.register(_prosemirror_converter.close)
+    return _prosemirror_converter
 
 
 def parse_body_json_to_markdown(body_json):
     """
     Parse Substack's ProseMirror-style body_json to markdown.
 
-    Uses the official prosemirror-markdown Node.js library via subprocess.
-    Falls back to custom parser if Node.js is not available.
+    Uses the pure-Python port of prosemirror-markdown by default. Set
+    PROSEMIRROR_RENDERER=node to use the official Node.js library via a
+    persistent worker process instead; it falls back to the Python renderer
+    if Node.js is not available or the worker fails for this request.
     """
     if not body_json or not isinstance(body_json, dict):
         return ""
 
-    try:
-        import subprocess
-
-        # Get the script directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        converter_script = os.path.join(script_dir, 'prosemirror-to-markdown.js')
-
-        # Call Node.js script with JSON input
-        result = subprocess.run(
-            ['node', converter_script],
-            input=json.dumps(body_json),
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+    if os.environ.get('PROSEMIRROR_RENDERER', 'python') != 'node':
+        return parse_body_json_to_markdown_custom(body_json)
 
-        if result.returncode == 0:
-            return result.stdout.strip()
-        else:
-            print(f"Warning: Node.js converter failed: {result.stderr}")
-            print(f"  Falling back to custom parser...")
-            return parse_body_json_to_markdown_custom(body_json)
+    converter = get_prosemirror_converter()
+    if not converter.available:
+        return parse_body_json_to_markdown_custom(body_json)
 
+    try:
+        return converter.convert(body_json).strip()
     except FileNotFoundError:
         print(f"Warning: Node.js not found, falling back to custom parser...")
+        converter.available = False
         return parse_body_json_to_markdown_custom(body_json)
     except Exception as e:
-        print(f"Warning: Failed to parse body_json with Node.js: {e}")
+        print(f"Warning: Node.js converter failed: {e}")
         print(f"  Falling back to custom parser...")
         return parse_body_json_to_markdown_custom(body_json)
 
 
-def extract_images_from_html(html_content):
-    """Extract all image URLs from HTML content."""
-    parser = ImageExtractor()
-    parser.feed(html_content)
-    return parser.images
+# Conversion stage: CONVERSION_WORKERS processes ('auto' = available cores,
+# 1 = convert serially in this process) and a per-item timeout in seconds
+CONVERSION_WORKERS = os.environ.get('CONVERSION_WORKERS', '1')
+CONVERSION_TIMEOUT = float(os.environ.get('CONVERSION_TIMEOUT', '120'))
+
+
+def conversion_worker_count():
+    """Number of conversion processes from CONVERSION_WORKERS."""
+    if CONVERSION_WORKERS.strip().lower() == 'auto':
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+    return max(1, int(CONVERSION_WORKERS))
+
+
+class ConversionPool:
+    """
+    Runs CPU-heavy conversions (html2text, ProseMirror rendering) in worker
+    processes.
+
+    imap() keeps a bounded window of items in flight and yields results in
+    submission order, so callers save items in the same order as a serial
+    run. An item that does not finish within `timeout` seconds is reported
+    as failed; the pool is then restarted (a stuck worker cannot be
+    cancelled otherwise) and every other in-flight item is resubmitted.
+    Safe to share between the posts and notes pipelines.
+    """
+
+    def __init__(self, workers, timeout=CONVERSION_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_flight = {}  # id -> [func, arg, AsyncResult], across all imap() callers
+
+    def _start(self):
+        import multiprocessing
+        # spawn: workers must not inherit the parent's threads and sockets
+        self._pool = multiprocessing.get_context('spawn').Pool(self.workers)
+
+    def _submit(self, func, arg):
+        with self._lock:
+            if self._pool is None:
+                self._start()
+            entry = [func, arg, self._pool.apply_async(func, (arg,))]
+            self._in_flight[id(entry)] = entry
+        return entry
+
+    def imap(self, func, pairs):
+        """
+        Apply func to each arg of (item, arg) pairs in the worker processes.
+
+        Yields (item, result, error) in order; error is the exception raised
+        by func (or a TimeoutError) and result is None when it is set. Items
+        whose arg is None are not submitted and yield (item, None, None).
+        """
+        pending = collections.deque()
+        try:
+            for item, arg in pairs:
+                pending.append((item, self._submit(func, arg) if arg is not None else None))
+                if len(pending) >= self.workers * 2:
+                    yield self._collect(pending)
+        except Exception:
+            # The item source failed (e.g. a feed parse error): finish what
+            # was already submitted before propagating
+            while pending:
+                yield self._collect(pending)
+            raise
+        while pending:
+            yield self._collect(pending)
+
+    def _collect(self, pending):
+        item, entry = pending.popleft()
+        if entry is None:
+            return item, None, None
+        try:
+            return item, self._wait(entry), None
+        except Exception as e:
+            return item, None, e
+        finally:
+            with self._lock:
+                self._in_flight.pop(id(entry), None)
+
+    def _wait(self, entry):
+        """Result of an in-flight entry; restarts the pool if it times out."""
+        import multiprocessing
+
+        result = entry[2]
+        deadline = time.monotonic() + self.timeout
+        while True:
+            # Wake up at least every second to notice a restart by another caller
+            try:
+                return result.get(max(0, min(1.0, deadline - time.monotonic())))
+            except multiprocessing.TimeoutError:
+                pass
+            with self._lock:
+                if entry[2] is not result:
+                    # Resubmitted after the pool was restarted for another item
+                    result = entry[2]
+                    deadline = time.monotonic() + self.timeout
+                    continue
+                if time.monotonic() >= deadline:
+                    del self._in_flight[id(entry)]
+                    self._restart()
+                    raise TimeoutError(f"conversion timed out after {self.timeout:g}s")
+
+    def _restart(self):
+        """Replace the worker processes and resubmit unfinished items (lock held)."""
+        self._pool.terminate()
+        self._start()
+        for entry in self._in_flight.values():
+            if not entry[2].ready():
+                entry[2] = self._pool.apply_async(entry[0], (entry[1],))
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+_conversion_pool = None
+
+
+def get_conversion_pool():
+    """
+    Return the shared conversion pool, or None when CONVERSION_WORKERS is 1
+    and items are converted serially in this process.
+    """
+    global _conversion_pool
+    if _conversion_pool is None:
+        workers = conversion_worker_count()
+        if workers <= 1:
+            return None
+        _conversion_pool = ConversionPool(workers)
+        atexit.register(_conversion_pool.close)
+    return _conversion_pool
+
+
+def item_label(item):
+    """Short identifier of a feed entry or notes API item, for traces."""
+    if not isinstance(item, dict):
+        return item
+    if 'comment' in item:
+        return f"note-{(item.get('comment') or {}).get('id')}"
+    return item.get('link') or item.get('title')
+
+
+def convert_items(func, pairs, pool=None, stage_name='convert'):
+    """
+    Apply func to each arg of (item, arg) pairs, in `pool` when given.
+
+    Yields (item, result, error) in order, like ConversionPool.imap; items
+    whose arg is None are passed through unconverted (result None). Without
+    a pool each item is converted here as it is reached. Each item's
+    conversion (or, with a pool, the wait for its result) is recorded as
+    the stage_name stage.
+    """
+    if pool is not None:
+        results = pool.imap(func, pairs)
+        while True:
+            start = time.perf_counter()
+            result = next(results, None)
+            if result is None:
+                return
+            recorder = instrumentation.get_recorder()
+            if recorder:
+                recorder.record(f"{stage_name}.wait", start, time.perf_counter(), item_label(result[0]))
+            yield result
+
+    for item, arg in pairs:
+        if arg is None:
+            yield item, None, None
+            continue
+        try:
+            with instrumentation.stage(stage_name, item=item_label(item)):
+                result = func(arg)
+        except Exception as e:
+            yield item, None, e
+            continue
+        yield item, result, None
 
 
 def extract_images_from_markdown(markdown_content):
@@ -249,20 +531,846 @@ def extract_images_from_markdown(markdown_content):
     return re.findall(pattern, markdown_content, re.DOTALL)
 
 
-def download_image(url, filepath):
-    """Download an image from URL to filepath."""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+
+# Image downloads: total worker threads and concurrent requests per host
+IMAGE_DOWNLOAD_WORKERS = int(os.environ.get('IMAGE_DOWNLOAD_WORKERS', '8'))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('MAX_CONNECTIONS_PER_HOST', '4'))
+
+
+class HTTPConnectionPool:
+    """
+    Keep-alive HTTP(S) connections shared across threads, pooled per host.
+
+    Each host gets at most `max_per_host` concurrent requests; idle
+    connections are kept and reused so repeated downloads from
+    substackcdn.com skip the TCP and TLS handshakes. Proxies are taken from
+    the environment like urllib does (HTTP_PROXY, HTTPS_PROXY, NO_PROXY):
+    http requests are sent to the proxy, https ones through a CONNECT tunnel.
+    """
+
+    def __init__(self, max_per_host=MAX_CONNECTIONS_PER_HOST, timeout=30):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._slots = {}
+        self._proxies = {}  # host key -> (proxy host, Proxy-Authorization or None), or None
+        self._lock = threading.Lock()
+
+    def _host_slot(self, key):
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[key]
+
+    def _checkout(self, key):
+        """Return (connection, reused) for a host key."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _proxy(self, key):
+        """(proxy host, Proxy-Authorization value or None) for a host key, or None to connect directly."""
+        with self._lock:
+            if key not in self._proxies:
+                self._proxies[key] = find_proxy(*key)
+            return self._proxies[key]
+
+    def _connect(self, key):
+        scheme, host = key
+        proxy = self._proxy(key)
+        if proxy:
+            proxy_host, authorization = proxy
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(proxy_host, timeout=self.timeout)
+                conn.set_tunnel(host, headers={'Proxy-Authorization': authorization} if authorization else None)
+                return conn
+            return http.client.HTTPConnection(proxy_host, timeout=self.timeout)
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, timeout=self.timeout)
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def get(self, url, headers=None, max_redirects=5):
+        """
+        GET a URL and return (status, response_headers, body).
+
+        Follows redirects. Raises urllib.error.HTTPError for 4xx/5xx responses.
+        """
+        with self.open(url, headers, max_redirects) as response:
+            return response.status, response.headers, response.read()
+
+    def open(self, url, headers=None, max_redirects=5, hold_slot=True):
+        """
+        GET a URL and return a PooledResponse whose body is read incrementally.
+
+        Follows redirects. Raises urllib.error.HTTPError for 4xx/5xx responses.
+        The caller must close the response (it is a context manager); the
+        host slot is held until then. With hold_slot=False the slot is freed
+        as soon as the response headers are in: for a long-lived stream whose
+        reader makes other requests to the same host (a feed whose entries'
+        images are downloaded while it is read), which would otherwise wait
+        for a slot the stream never gives back.
+        """
+        for _ in range(max_redirects + 1):
+            parsed = urlparse(url)
+            key = (parsed.scheme, parsed.netloc)
+            path = parsed.path or '/'
+            if parsed.query:
+                path += '?' + parsed.query
+
+            slot = self._host_slot(key)
+            slot.acquire()
+            try:
+                conn, response = self._request(key, path, headers or {})
+            except Exception:
+                slot.release()
+                raise
+            pooled = PooledResponse(self, key, conn, response, slot)
+
+            if pooled.status in (301, 302, 303, 307, 308) and pooled.headers.get('Location'):
+                pooled.read()
+                pooled.close()
+                url = urljoin(url, pooled.headers['Location'])
+                continue
+            if pooled.status >= 400:
+                pooled.read()
+                pooled.close()
+                raise urllib.error.HTTPError(url, pooled.status, http.client.responses.get(pooled.status, ''),
+                                             pooled.headers, None)
+            if not hold_slot:
+                pooled.release_slot()
+            return pooled
+
+        raise urllib.error.URLError(f"too many redirects for {url}")
+
+    def _request(self, key, path, headers):
+        """Send a GET on a pooled connection; returns (connection, response)."""
+        proxy = self._proxy(key)
+        if proxy and key[0] == 'http':
+            # A plain HTTP proxy takes the absolute URL
+            path = f"http://{key[1]}{path}"
+            if proxy[1]:
+                headers = {**headers, 'Proxy-Authorization': proxy[1]}
+        conn, reused = self._checkout(key)
+        instrumentation.count('http.requests')
+        instrumentation.count('http.connections_reused' if reused else 'http.connections_opened')
+        try:
+            conn.request('GET', path, headers=headers)
+            return conn, conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        # The server closed an idle keep-alive connection; retry on a fresh one
+        instrumentation.count('http.connections_opened')
+        conn = self._connect(key)
+        try:
+            conn.request('GET', path, headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            for connections in self._idle.values():
+                for conn in connections:
+                    conn.close()
+            self._idle.clear()
+
+
+def find_proxy(scheme, host):
+    """
+    The proxy for a scheme and host from the environment (see
+    urllib.request.getproxies), as (proxy host, Proxy-Authorization value
+    or None), or None if the host is reached directly.
+    """
+    if sys.platform not in ('darwin', 'win32') and not any(name.lower().endswith('_proxy') for name in os.environ):
+        return None  # getproxies() only reads these variables here; don't import urllib.request for nothing
+    import urllib.request  # slow to import; only needed once per host
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(host):
+        return None
+
+    parsed = urlparse(proxy if '://' in proxy else f'http://{proxy}')
+    authorization = None
+    if parsed.username:
+        import base64
+        credentials = f"{unquote(parsed.username)}:{unquote(parsed.password or '')}"
+        authorization = 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+    return parsed.netloc.rpartition('@')[2], authorization
+
+
+_http_pool = None
+
+
+def get_http_pool():
+    """Return the shared HTTP connection pool, creating it on first use."""
+    global _http_pool
+    if _http_pool is None:
+        _http_pool = HTTPConnectionPool()
+        atexit.register(_http_pool.close)
+    return _http_pool
+
+
+class PooledResponse:
+    """
+    An HTTP response from HTTPConnectionPool.open, read incrementally.
+
+    Closing it returns the connection to the pool when the body was read to
+    the end (otherwise the connection is closed) and frees the host slot.
+    """
+
+    def __init__(self, pool, key, conn, response, slot):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.response = response
+        self.slot = slot
+        self.status = response.status
+        self.headers = response.headers
+        self.closed = False
+
+    def read(self, size=-1):
+        data = self.response.read(size) if size is not None and size >= 0 else self.response.read()
+        instrumentation.count('http.bytes_received', len(data))
+        return data
+
+    def release_slot(self):
+        """Free the host slot before the response is closed (see HTTPConnectionPool.open)."""
+        if self.slot is not None:
+            self.slot.release()
+            self.slot = None
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.response.isclosed() and not self.response.will_close:
+                self.pool._checkin(self.key, self.conn)
+            else:
+                self.conn.close()
+        finally:
+            self.release_slot()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ValidatorCache:
+    """
+    Persisted HTTP validators (ETag / Last-Modified) keyed by URL.
+
+    Lets the feed and notes fetches send conditional requests, so an
+    unchanged source costs a single 304 round trip.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._validators = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._validators = json.load(f)
+            except Exception as e:
+                print(f"Warning: Could not read validator cache: {e}")
+
+    def headers_for(self, url):
+        """Conditional request headers for a URL."""
+        with self._lock:
+            validators = self._validators.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def update(self, url, response_headers):
+        """Remember the validators from a 200 response."""
+        validators = {
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
         }
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=30) as response:
-            with open(filepath, 'wb') as f:
-                f.write(response.read())
+        with self._lock:
+            if validators['etag'] or validators['last_modified']:
+                self._validators[url] = validators
+            else:
+                self._validators.pop(url, None)
+
+    def save(self):
+        """Write the cache to disk."""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._validators, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+_validator_cache = None
+
+
+def get_validator_cache():
+    """Return the shared validator cache (VALIDATOR_CACHE), loading it on first use."""
+    global _validator_cache
+    if _validator_cache is None:
+        _validator_cache = ValidatorCache(os.environ.get('VALIDATOR_CACHE', './.http-validators.json'))
+    return _validator_cache
+
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+
+
+class DecodingReader:
+    """
+    File-like reader that decodes a gzip/deflate/brotli response body as it
+    is read, so large responses can be parsed without buffering them whole.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, raw, content_encoding):
+        content_encoding = (content_encoding or '').strip().lower()
+        if content_encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif content_encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        elif content_encoding == 'br' and brotli:
+            self._decompressor = brotli.Decompressor()
+        elif content_encoding in ('', 'identity'):
+            self._decompressor = None
+        else:
+            raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+        self.raw = raw
+        self.content_encoding = content_encoding
+        self._buffer = b''
+        self._started = False
+        self._eof = False
+
+    def _decompress(self, chunk):
+        if self.content_encoding == 'br':
+            return self._decompressor.process(chunk)
+        if self.content_encoding == 'deflate' and not self._started:
+            self._started = True
+            try:
+                return self._decompressor.decompress(chunk)
+            except zlib.error:
+                # Some servers send raw deflate without the zlib header
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        data = self._decompressor.decompress(chunk)
+        if self.content_encoding in ('gzip', 'x-gzip'):
+            # Concatenated gzip members
+            while self._decompressor.eof and self._decompressor.unused_data:
+                rest = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                data += self._decompressor.decompress(rest)
+        return data
+
+    def _next_chunk(self):
+        """Decoded bytes from the next raw chunk (empty at end of body)."""
+        chunk = self.raw.read(self.CHUNK_SIZE)
+        if self._decompressor is None:
+            self._eof = not chunk
+            return chunk
+        if not chunk:
+            self._eof = True
+            return b'' if self.content_encoding == 'br' else self._decompressor.flush()
+        return self._decompress(chunk)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._buffer]
+            while not self._eof:
+                chunks.append(self._next_chunk())
+            self._buffer = b''
+            return b''.join(chunks)
+
+        while len(self._buffer) < size and not self._eof:
+            self._buffer += self._next_chunk()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+@contextlib.contextmanager
+def conditional_open(url, headers=None, cache=None, hold_slot=True):
+    """
+    GET a URL with validators from the cache and compression enabled.
+
+    Yields (status, response_headers, stream) where stream is a file-like
+    reader of the decoded body, read incrementally from the connection.
+    Status 304 means the resource is unchanged since the cached response and
+    the stream is empty. The caller records the new validators once it has
+    processed the body. Pass hold_slot=False when the body is processed
+    (and other requests made) while it is read; see HTTPConnectionPool.open.
+    """
+    request_headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING}
+    request_headers.update(headers or {})
+    if cache:
+        request_headers.update(cache.headers_for(url))
+
+    with instrumentation.stage('http.request', item=url):
+        response = get_http_pool().open(url, headers=request_headers, hold_slot=hold_slot)
+    with response:
+        if response.status == 304:
+            instrumentation.count('http.not_modified')
+        encoding = None if response.status == 304 else response.headers.get('Content-Encoding')
+        yield response.status, response.headers, DecodingReader(response, encoding)
+
+
+def conditional_get(url, headers=None, cache=None):
+    """
+    Like conditional_open, but returns (status, response_headers, body) with
+    the whole decoded body (empty for 304).
+    """
+    with conditional_open(url, headers, cache) as (status, response_headers, stream):
+        return status, response_headers, stream.read()
+
+
+class StreamingJSONArray:
+    """
+    Iterate the elements of one array member of a top-level JSON object read
+    from a stream, without holding the whole document.
+
+    Elements are parsed one at a time with JSONDecoder.raw_decode from a
+    text buffer that only holds the unparsed rest of the current chunk (and
+    the element being read, when it spans chunks), so memory depends on the
+    size of one element rather than of the document. Other top-level members
+    are parsed whole into .members, which is complete once iteration has
+    finished (e.g. a nextCursor after the items). Raises ValueError on
+    malformed JSON, after yielding the elements before the error.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream, key):
+        self.stream = stream
+        self.key = key
+        self.members = {}
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Append the next chunk to the unparsed text; False at the end of the stream."""
+        if self._eof:
+            return False
+        chunk = self.stream.read(self.CHUNK_SIZE)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk, final=self._eof)
+        self._pos = 0
         return True
+
+    def _peek(self):
+        """Next non-whitespace character, without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("unexpected end of JSON document")
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} but found {found!r} in JSON document")
+        self._pos += 1
+
+    def _value(self):
+        """Parse the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A complete value is followed by a delimiter; a number cut off
+                # by the end of the chunk ("-0." or "1e") may continue in the next
+                if self._eof or (end < len(self._buffer) and self._buffer[end] in ' \t\r\n,:]}'):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == self.key and self._peek() == '[':
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._peek() != ',':
+                            break
+                        self._pos += 1
+                    self._expect(']')
+            else:
+                self.members[key] = self._value()
+            if self._peek() != ',':
+                break
+            self._pos += 1
+        self._expect('}')
+        # Read to the end so the connection can be reused
+        while self._fill():
+            pass
+
+
+# mkstemp creates owner-only files; read once, as os.umask can only be
+# read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def part_file(folder, prefix='.'):
+    """
+    (fd, path) of a new temp file in folder for a file that is renamed into
+    place once complete. Dot-prefixed and .part, so nothing (including git)
+    mistakes it for the real file, and with the permissions open() would
+    give, which the renamed file (and its hardlinks) keep.
+    """
+    fd, path = tempfile.mkstemp(dir=folder, prefix=prefix, suffix='.part')
+    if hasattr(os, 'fchmod'):
+        os.fchmod(fd, 0o666 & ~_UMASK)
+    return fd, path
+
+
+class ImageStore:
+    """
+    Content-addressed image blobs shared by all posts and notes.
+
+    Blobs live at <root>/<sha256[:2]>/<sha256><ext>, keyed by a hash of the
+    image bytes, so an image used by several posts or notes is stored once.
+    index.json maps each source URL to its blob, which lets repeat URLs skip
+    the download. Post and note folders get hardlinks to the blobs (or copies
+    where hardlinks are not supported).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index_path = os.path.join(root, 'index.json')
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except Exception as e:
+                print(f"Warning: Could not read image store index: {e}")
+
+    def lookup(self, url):
+        """Return the blob path already stored for a source URL, or None."""
+        with self._lock:
+            blob_name = self._index.get(url)
+        if blob_name:
+            blob_path = os.path.join(self.root, blob_name)
+            if os.path.exists(blob_path):
+                return blob_path
+        return None
+
+    def add(self, url, data, ext):
+        """Store image bytes (if new) and record the source URL; returns the blob path."""
+        fd, tmp_path = self.temp_file()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return self.add_file(url, tmp_path, hashlib.sha256(data).hexdigest(), ext)
+
+    def temp_file(self):
+        """(fd, path) of a new temp file in the store, for a blob being written."""
+        os.makedirs(self.root, exist_ok=True)
+        return part_file(self.root)
+
+    def add_file(self, url, tmp_path, digest, ext):
+        """
+        Move a complete temp file (from temp_file()) with the given sha256
+        hex digest into the store and record the source URL; returns the
+        blob path. The rename is atomic, so a blob is never partially written.
+        """
+        blob_name = f"{digest[:2]}/{digest}{ext}"
+        blob_path = os.path.join(self.root, blob_name)
+
+        if os.path.exists(blob_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(tmp_path, blob_path)
+
+        with self._lock:
+            if self._index.get(url) != blob_name:
+                self._index[url] = blob_name
+                self._dirty = True
+        return blob_path
+
+    @staticmethod
+    def link(blob_path, filepath):
+        """Place a blob at filepath as a hardlink, falling back to a copy."""
+        if os.path.exists(filepath):
+            if os.path.samefile(blob_path, filepath):
+                return
+            os.remove(filepath)
+        try:
+            os.link(blob_path, filepath)
+        except OSError:
+            shutil.copyfile(blob_path, filepath)
+
+    def save(self):
+        """Write the URL index if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+
+_image_stores = {}
+_image_stores_lock = threading.Lock()
+
+
+def get_image_store(root=None):
+    """
+    Return the image store at root, creating it on first use. The default
+    is the shared store (IMAGE_STORE_DIR), a local download cache for post
+    and note folders; a packed notes archive has its own.
+    """
+    root = root or os.environ.get('IMAGE_STORE_DIR', './image-store')
+    key = os.path.abspath(root)
+    with _image_stores_lock:
+        if key not in _image_stores:
+            _image_stores[key] = ImageStore(root)
+            atexit.register(_image_stores[key].save)
+        return _image_stores[key]
+
+
+# Substack CDN renditions: images are requested at most IMAGE_MAX_WIDTH wide
+# and in IMAGE_FORMAT rather than as embedded (usually w_1456) or as the
+# full-resolution S3 original
+IMAGE_MAX_WIDTH = int(os.environ.get('IMAGE_MAX_WIDTH', '1200'))
+IMAGE_FORMAT = os.environ.get('IMAGE_FORMAT', 'webp')
+
+SUBSTACK_FETCH_PREFIX = 'https://substackcdn.com/image/fetch/'
+SUBSTACK_S3_HOST_RE = re.compile(r'(substack-post-media|bucketeer-[0-9a-f-]+)\.s3\.amazonaws\.com')
+# What substackcdn.com applies to post images, used for raw S3 originals
+DEFAULT_CDN_TRANSFORMS = ['c_limit', 'f_auto', 'q_auto:good', 'fl_progressive:steep']
+
+
+def image_rendition(url):
+    """
+    Return (download_url, extension) for an image URL under the rendition policy.
+
+    substackcdn.com fetch URLs get their width capped at IMAGE_MAX_WIDTH (never
+    upscaled) and their format set to IMAGE_FORMAT; raw S3 originals are
+    fetched through the CDN with the same transforms. Other hosts, GIFs and
+    SVGs are downloaded as they are. IMAGE_MAX_WIDTH=0 and IMAGE_FORMAT=source
+    turn each part off.
+    """
+    ext = image_extension(url)
+    if ext in ('.gif', '.svg') or (not IMAGE_MAX_WIDTH and IMAGE_FORMAT == 'source'):
+        return url, ext
+
+    if url.startswith(SUBSTACK_FETCH_PREFIX):
+        transforms, sep, source = url[len(SUBSTACK_FETCH_PREFIX):].partition('/')
+        if not sep:
+            return url, ext
+        transforms = transforms.split(',')
+    elif SUBSTACK_S3_HOST_RE.fullmatch(urlparse(url).netloc):
+        transforms, source = list(DEFAULT_CDN_TRANSFORMS), quote(url, safe='')
+    else:
+        return url, ext
+
+    if IMAGE_MAX_WIDTH:
+        widths = [i for i, t in enumerate(transforms) if t.startswith('w_') and t[2:].isdigit()]
+        if widths:
+            width = int(transforms[widths[0]][2:])
+            if width > IMAGE_MAX_WIDTH:
+                transforms[widths[0]] = f'w_{IMAGE_MAX_WIDTH}'
+                # Keep the aspect ratio of cropped renditions
+                for i, t in enumerate(transforms):
+                    if t.startswith('h_') and t[2:].isdigit():
+                        transforms[i] = f'h_{max(1, int(t[2:]) * IMAGE_MAX_WIDTH // width)}'
+        else:
+            # After the $s_ signature, which Substack puts first
+            at = 1 if transforms and transforms[0].startswith('$s_') else 0
+            transforms.insert(at, f'w_{IMAGE_MAX_WIDTH}')
+            if not any(t.startswith('c_') for t in transforms):
+                transforms.insert(at + 1, 'c_limit')
+
+    if IMAGE_FORMAT != 'source':
+        formats = [i for i, t in enumerate(transforms) if t.startswith('f_')]
+        if formats:
+            transforms[formats[0]] = f'f_{IMAGE_FORMAT}'
+        else:
+            transforms.append(f'f_{IMAGE_FORMAT}')
+        ext = f'.{IMAGE_FORMAT}'
+
+    return SUBSTACK_FETCH_PREFIX + ','.join(transforms) + '/' + source, ext
+
+
+# Image downloads are streamed to a temp file in chunks and renamed into
+# place once complete; anything larger than IMAGE_MAX_BYTES is abandoned
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(50 * 1024 * 1024)))
+IMAGE_RESUME_MIN_BYTES = int(os.environ.get('IMAGE_RESUME_MIN_BYTES', str(1024 * 1024)))
+IMAGE_RESUME_ATTEMPTS = int(os.environ.get('IMAGE_RESUME_ATTEMPTS', '3'))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class DownloadError(Exception):
+    """An image that is too large, truncated, or could not be resumed."""
+
+
+def stream_to_file(url, f, pool, max_bytes=None):
+    """
+    Download url into the open binary file f, one chunk in memory at a time.
+
+    The body must match its Content-Length and may not exceed max_bytes
+    (IMAGE_MAX_BYTES by default, 0 for no limit). If the connection drops
+    after at least IMAGE_RESUME_MIN_BYTES and the server accepts ranges, the
+    rest is requested with Range, and If-Range makes the server send the
+    whole image again if it changed in between.
+
+    Returns:
+        tuple: (size in bytes, sha256 hex digest)
+    """
+    if max_bytes is None:
+        max_bytes = IMAGE_MAX_BYTES
+    digest = hashlib.sha256()
+    size = 0
+    total = None
+    validator = None
+    attempts = 0
+
+    while True:
+        headers = {'User-Agent': USER_AGENT}
+        if size:
+            headers['Range'] = f'bytes={size}-'
+            headers['If-Range'] = validator
+        try:
+            with pool.open(url, headers=headers) as response:
+                content_range = CONTENT_RANGE_RE.fullmatch(response.headers.get('Content-Range') or '')
+                if size and response.status == 206 and content_range:
+                    if int(content_range.group(1)) != size:
+                        raise DownloadError(f"server resumed at byte {content_range.group(1)}, not {size}")
+                    total = int(content_range.group(3)) if content_range.group(3) != '*' else None
+                    instrumentation.count('image.resumed')
+                else:
+                    if size:
+                        # The server sent the whole image (again)
+                        f.seek(0)
+                        f.truncate()
+                        digest = hashlib.sha256()
+                        size = 0
+                    length = response.headers.get('Content-Length')
+                    total = int(length) if length and length.isdigit() else None
+                    # If-Range needs a strong validator
+                    etag = response.headers.get('ETag')
+                    validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+                    if response.headers.get('Accept-Ranges') != 'bytes':
+                        validator = None
+
+                if max_bytes and total and total > max_bytes:
+                    raise DownloadError(f"{total} bytes is over IMAGE_MAX_BYTES ({max_bytes})")
+                while True:
+                    chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise DownloadError(f"more than IMAGE_MAX_BYTES ({max_bytes}) bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+                # http.client ends a body cut short by the server without an error
+                if total is not None and size < total:
+                    raise ConnectionError(f"connection closed after {size} of {total} bytes")
+        except urllib.error.HTTPError:
+            raise
+        except (http.client.HTTPException, OSError) as e:
+            if not validator or size < IMAGE_RESUME_MIN_BYTES or attempts >= IMAGE_RESUME_ATTEMPTS:
+                raise
+            attempts += 1
+            print(f"    Resuming {url} at byte {size} ({e!r})")
+            continue
+        return size, digest.hexdigest()
+
+
+def download_image(url, filepath, pool=None, store=None, ext=None):
+    """
+    Download an image from URL to filepath.
+
+    With a store, a URL that was downloaded before is linked from the store
+    without any network request, and new downloads are added to it. With a
+    store, filepath may be None to only store the image (ext then names the
+    blob's extension). Returns the blob path (or filepath without a store),
+    or None if the download failed.
+
+    The image is streamed to a temp file and renamed into place when
+    complete, so a failed download never leaves a partial file behind.
+    """
+    tmp_path = None
+    try:
+        if store:
+            blob_path = store.lookup(url)
+            if blob_path:
+                instrumentation.count('image_store.hits')
+                if filepath:
+                    store.link(blob_path, filepath)
+                return blob_path
+            instrumentation.count('image_store.misses')
+            fd, tmp_path = store.temp_file()
+        else:
+            folder, filename = os.path.split(filepath)
+            fd, tmp_path = part_file(folder or '.', prefix=f'.{filename}.')
+
+        pool = pool or get_http_pool()
+        with instrumentation.stage('image.download', item=url), os.fdopen(fd, 'wb') as f:
+            size, digest = stream_to_file(url, f, pool)
+        instrumentation.count('image.bytes_downloaded', size)
+
+        with instrumentation.stage('image.store', item=url):
+            if store:
+                blob_path = store.add_file(url, tmp_path, digest, ext or os.path.splitext(filepath)[1])
+                tmp_path = None
+                if filepath:
+                    store.link(blob_path, filepath)
+                return blob_path
+            os.replace(tmp_path, filepath)
+            tmp_path = None
+        return filepath
     except Exception as e:
         print(f"    Failed to download {url}: {e}")
-        return False
+        return None
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 def clean_url(url):
@@ -270,38 +1378,324 @@ def clean_url(url):
     return re.sub(r'\s+', '', url)
 
 
+class URLMatcher:
+    """
+    Finds a fixed set of URLs in text in one left-to-right scan.
+
+    Candidates are located with str.find on the prefix all URLs share (in
+    practice at least "http"), then resolved with a dict lookup on the next
+    few characters and a startswith check, longest URL first. The cost grows
+    with the document and the number of occurrences, not with document size
+    times URL count.
+    """
+
+    def __init__(self, urls):
+        urls = sorted(set(urls), key=len, reverse=True)
+        self.prefix = os.path.commonprefix(urls)
+        self.key_start = len(self.prefix)
+        self.key_end = self.key_start + min(16, len(urls[-1]) - self.key_start)
+        self.buckets = {}
+        for url in urls:
+            self.buckets.setdefault(url[self.key_start:self.key_end], []).append(url)
+
+    def match(self, text, pos):
+        """The longest URL starting at pos, or None."""
+        if not text.startswith(self.prefix, pos):
+            return None
+        for url in self.buckets.get(text[pos + self.key_start:pos + self.key_end], ()):
+            if text.startswith(url, pos):
+                return url
+        return None
+
+    def finditer(self, text):
+        """Yield (start, url) for non-overlapping matches, left to right."""
+        pos = text.find(self.prefix)
+        while pos >= 0:
+            url = self.match(text, pos)
+            if url:
+                yield pos, url
+                pos += len(url)
+            else:
+                pos += 1
+            pos = text.find(self.prefix, pos)
+
+
+# Downloaded image filenames, as named by download_images_to_folder
+LOCAL_IMAGE_RE = re.compile(r'image\d+\.[^)]+')
+SUBSTACK_CDN_URL_RE = re.compile(r'https?://substackcdn\.com/')
+
+
 def replace_image_urls_with_local(markdown_content, url_to_filename_map):
-    """Replace remote image URLs with local file paths in markdown."""
-    result = markdown_content
-    for url, filename in url_to_filename_map.items():
-        # Replace in markdown image syntax and bare URLs
-        # URL may contain newlines from text wrapping
-        result = result.replace(f']({url})', f']({filename})')
-        result = result.replace(url, filename)
-
-    # Remove clickable image wrappers that link to Substack CDN
-    # Convert [![](local_image)](https://substackcdn...) to just ![](local_image)
-    result = re.sub(
-        r'\[!\[(.*?)\]\((image\d+\.[^)]+)\)\]\(https?://substackcdn\.com/[^)]+\)',
-        r'![\1](\2)',
-        result,
-        flags=re.DOTALL
-    )
+    """
+    Replace remote image URLs with local file paths in markdown.
+
+    All URLs (which may contain newlines from text wrapping) are found in one
+    scan instead of two str.replace calls per image over the whole document.
+    Clickable images that link to the Substack CDN are unwrapped in the same
+    scan: [![alt](url)](https://substackcdn...) becomes ![alt](local_image).
+    """
+    if not url_to_filename_map:
+        return markdown_content
+
+    text = markdown_content
+    matcher = URLMatcher(url_to_filename_map)
+
+    edits = []  # (start, end, replacement), non-overlapping
+    skip_until = 0
+    for start, url in matcher.finditer(text):
+        if start < skip_until:
+            continue
+        end = start + len(url)
+        filename = url_to_filename_map[url]
+        edits.append((start, end, filename))
 
-    return result
+        # Clickable image wrapper: [![alt](url)](https://substackcdn...)
+        if not (text.startswith('](', start - 2) and text.startswith(')](', end)):
+            continue
+        alt_start = text.rfind(']', 0, start - 2) + 1
+        opening = text.find('[![', alt_start, start - 2)
+        outer_end = text.find(')', end + 3)
+        if (opening < 0 or outer_end < 0 or not LOCAL_IMAGE_RE.fullmatch(filename)
+                or not SUBSTACK_CDN_URL_RE.match(text, end + 3, outer_end)
+                or matcher.match(text, end + 3)):
+            continue
+        edits.append((opening, opening + 1, ''))
+        edits.append((end + 1, outer_end + 1, ''))
+        skip_until = outer_end + 1
+
+    edits.sort()
+    parts = []
+    last = 0
+    for start, end, replacement in edits:
+        parts.append(text[last:start])
+        parts.append(replacement)
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts)
 
 
 def hash_content(content):
     """Generate MD5 hash of content."""
-    return hashlib.md5(content.encode('utf-8')).hexdigest()
+    with instrumentation.stage('hash'):
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+# Bump when a conversion change alters the markdown it produces: the items
+# that converter handles are then re-converted, and only those
+POST_CONVERTER_VERSION = 1
+NOTE_CONVERTER_VERSION = 1
 
+# Notes API comment fields that end up in a saved note (engagement counts go
+# to the metrics store instead, see note_metrics.py)
+NOTE_INPUT_FIELDS = ('id', 'name', 'handle', 'date', 'photo_url', 'attachments', 'body', 'body_json')
 
-def should_update_folder(folder_path, new_content_hash):
+
+def input_fingerprint(*parts):
+    """Fingerprint of an item's raw upstream input (JSON-serializable parts)."""
+    with instrumentation.stage('fingerprint'):
+        data = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def post_fingerprint(entry):
+    """Input fingerprint of a feed entry: its content HTML, metadata and converter."""
+    from html2text import __version__ as html2text_version
+
+    converter = f"html2text-{'.'.join(map(str, html2text_version))}/{POST_CONVERTER_VERSION}"
+    return input_fingerprint(
+        converter, entry.get('title'), entry.get('link'), entry.get('published'), entry.get('author'),
+        entry.get('content') or entry.get('summary', ''),
+    )
+
+
+def note_fingerprint(item, base_url):
+    """Input fingerprint of a notes API item: its comment fields, reply context and converter."""
+    comment = item.get('comment') or {}
+    body_json = comment.get('body_json')
+    if body_json and isinstance(body_json, dict) and body_json.get('content'):
+        converter = f"prosemirror-{os.environ.get('PROSEMIRROR_RENDERER', 'python')}/{NOTE_CONVERTER_VERSION}"
+    else:
+        converter = 'plain'
+    post = item.get('post') or {}
+    return input_fingerprint(
+        converter, base_url, {field: comment.get(field) for field in NOTE_INPUT_FIELDS},
+        post.get('title'), post.get('canonical_url'),
+    )
+
+
+MANIFEST_FILE = '.manifest.jsonl'
+
+
+class ArchiveManifest:
+    """
+    Append-only JSONL manifest of the items archived in an output directory.
+
+    One record per line: folder key (path relative to the output directory),
+    item id, content hash, input fingerprint, image files and timestamps. The last record for a
+    key wins; the file is compacted when superseded records pile up. Change
+    detection becomes an in-memory lookup, and other tools can list what is
+    archived without walking the tree.
+
+    When the manifest does not exist yet it is bootstrapped once from the
+    folders already on disk.
+    """
+
+    def __init__(self, output_dir, original_name):
+        self.output_dir = output_dir
+        self.original_name = original_name
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self._entries = {}
+        self._lines = 0
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            self._load()
+        else:
+            self._bootstrap()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted run; the item is redone
+                    continue
+                self._entries[entry['folder']] = entry
+                self._lines += 1
+        if self._lines > 2 * len(self._entries) + 100:
+            self.compact()
+
+    def _bootstrap_packed(self):
+        """Add the notes of a packed archive in the output directory, if there is one."""
+        from notes_archive import PackedNotes, is_packed
+        if not is_packed(self.output_dir):
+            return
+        for record in PackedNotes(self.output_dir).records():
+            self._entries[record['folder']] = {
+                'folder': record['folder'],
+                'id': record['id'],
+                'content_hash': record['content_hash'],
+                'images': sorted(record['images']),
+                'created_at': record['updated_at'],
+                'updated_at': record['updated_at'],
+            }
+
+    def _bootstrap(self):
+        """Build the manifest from folders (or a packed notes archive) already on disk."""
+        if self.original_name == 'original_note.md':  # only notes are packed
+            self._bootstrap_packed()
+        for original_path in sorted(Path(self.output_dir).rglob(self.original_name)):
+            folder_path = original_path.parent
+            key = folder_path.relative_to(self.output_dir).as_posix()
+            try:
+                content_hash = hash_content(original_path.read_text(encoding='utf-8'))
+            except Exception:
+                continue
+            images = sorted(set(load_image_sidecar(str(folder_path)).values())) or \
+                sorted(p.name for p in folder_path.glob('image*'))
+            mtime = datetime.fromtimestamp(original_path.stat().st_mtime).isoformat()
+            self._entries[key] = {
+                'folder': key,
+                'id': folder_path.name.split('_', 1)[-1].replace('note-', '', 1),
+                'content_hash': content_hash,
+                'images': images,
+                'created_at': mtime,
+                'updated_at': mtime,
+            }
+        if self._entries:
+            self.compact()
+
+    def get(self, key):
+        """Manifest entry for a folder key, or None."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def entries(self):
+        """All current entries, sorted by folder key."""
+        with self._lock:
+            return [self._entries[key] for key in sorted(self._entries)]
+
+    def input_unchanged(self, key, input_fingerprint):
+        """True if the item at key was last recorded from this input fingerprint."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry.get('input_fingerprint') == input_fingerprint
+
+    def record(self, key, item_id, content_hash, images, input_fingerprint=None):
+        """Record an item after it has been fully written, as a single appended line."""
+        now = datetime.now().isoformat()
+        with self._lock:
+            previous = self._entries.get(key)
+            entry = {
+                'folder': key,
+                'id': str(item_id),
+                'content_hash': content_hash,
+                'input_fingerprint': input_fingerprint,
+                'images': images,
+                'created_at': previous['created_at'] if previous else now,
+                'updated_at': now,
+            }
+            self._append(key, entry)
+
+    def record_input(self, key, input_fingerprint):
+        """
+        Remember a new input fingerprint for an item whose output did not
+        change (e.g. after a converter version bump), so later runs skip it.
+        """
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is None or previous.get('input_fingerprint') == input_fingerprint:
+                return
+            self._append(key, dict(previous, input_fingerprint=input_fingerprint))
+
+    def _append(self, key, entry):
+        """Store and append an entry (lock held)."""
+        self._entries[key] = entry
+        with instrumentation.stage('write.manifest'):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._lines += 1
+
+    def compact(self):
+        """Rewrite the manifest with one line per item."""
+        with self._lock:
+            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key in sorted(self._entries):
+                    f.write(json.dumps(self._entries[key], ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+
+
+_manifests = {}
+
+
+def get_manifest(output_dir, original_name):
+    """Return the manifest for an output directory, loading it on first use."""
+    key = os.path.abspath(output_dir)
+    if key not in _manifests:
+        _manifests[key] = ArchiveManifest(output_dir, original_name)
+    return _manifests[key]
+
+
+def should_update_folder(folder_path, new_content_hash, manifest=None, key=None):
     """Check if folder content should be updated."""
-    original_file = os.path.join(folder_path, 'original_post.md')
     if not os.path.exists(folder_path):
         return True, "new"
 
+    # Fast path: compare against the manifest instead of re-reading the folder
+    entry = manifest.get(key) if manifest is not None else None
+    if entry:
+        if entry['content_hash'] != new_content_hash:
+            return True, "updated"
+        return False, "unchanged"
+
+    original_file = os.path.join(folder_path, 'original_post.md')
     if not os.path.exists(original_file):
         original_file = os.path.join(folder_path, 'original_note.md')
 
@@ -320,45 +1714,216 @@ def should_update_folder(folder_path, new_content_hash):
         return True, "new"
 
 
-def download_images_to_folder(image_urls, folder_path, url_variants=None):
+IMAGE_SIDECAR = '.images.json'
+
+
+def image_extension(url):
+    """File extension for an image URL, defaulting to .jpg."""
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    if not ext or ext not in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg']:
+        ext = '.jpg'  # default extension
+    return ext
+
+
+def load_image_sidecar(folder_path):
+    """Read the folder's URL -> image filename sidecar (empty if missing)."""
+    sidecar_path = os.path.join(folder_path, IMAGE_SIDECAR)
+    if not os.path.exists(sidecar_path):
+        return {}
+    try:
+        with open(sidecar_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+# The target of every markdown image, remote or local
+MARKDOWN_IMAGE_TARGET_RE = re.compile(r'!\[.*?\]\(([^)]+)\)', re.DOTALL)
+
+
+def infer_image_sidecar(folder_path):
+    """
+    Rebuild the URL -> image filename mapping of a folder saved before it had
+    a sidecar (empty if it cannot be rebuilt).
+
+    formatted_*.md is original_*.md with every downloaded image's URL
+    replaced by its file, so the nth image target in one is the nth in the
+    other. The files' numbers alone cannot be trusted: older versions
+    numbered note images in set order.
+    """
+    for kind in ('post', 'note'):
+        original_path = os.path.join(folder_path, f'original_{kind}.md')
+        formatted_path = os.path.join(folder_path, f'formatted_{kind}.md')
+        if os.path.exists(original_path) and os.path.exists(formatted_path):
+            break
+    else:
+        return {}
+    try:
+        with open(original_path, 'r', encoding='utf-8') as f:
+            urls = MARKDOWN_IMAGE_TARGET_RE.findall(f.read())
+        with open(formatted_path, 'r', encoding='utf-8') as f:
+            targets = MARKDOWN_IMAGE_TARGET_RE.findall(f.read())
+    except OSError:
+        return {}
+    if len(urls) != len(targets):
+        return {}
+
+    url_to_file = {}
+    for url, target in zip(urls, targets):
+        if LOCAL_IMAGE_RE.fullmatch(target) and os.path.exists(os.path.join(folder_path, target)):
+            url_to_file.setdefault(clean_url(url), target)
+    return url_to_file
+
+
+def save_image_sidecar(folder_path, url_to_file):
+    """Write the folder's URL -> image filename sidecar."""
+    sidecar_path = os.path.join(folder_path, IMAGE_SIDECAR)
+    with open(sidecar_path, 'w', encoding='utf-8') as f:
+        json.dump(url_to_file, f, indent=2)
+        f.write('\n')
+
+
+def download_images_to_folder(image_urls, folder_path):
     """
-    Download images to a folder and return URL-to-filename mapping.
+    Reconcile a folder's images with image_urls and return URL-to-filename mapping.
+
+    The folder's .images.json sidecar records which file holds which URL
+    (rebuilt from the markdown files for folders saved without one, so call
+    this before rewriting them). Images already on disk keep their filename
+    and are not downloaded again,
+    new URLs get the next free imageN number, and images whose URL is no
+    longer wanted are deleted. Substack CDN images are downloaded as the
+    image_rendition of their URL; the sidecar and the markdown keep the
+    source URL.
 
     Args:
         image_urls: List of clean image URLs to download
         folder_path: Destination folder path
-        url_variants: Optional dict mapping clean URLs to list of URL variants (for posts)
 
     Returns:
-        dict: Mapping from URL (and variants) to local filename
-    """
-    url_to_filename = {}
-
-    for idx, img_url in enumerate(image_urls, 1):
-        # Determine file extension
-        parsed_url = urlparse(img_url)
-        path = parsed_url.path
-
-        # Try to extract extension from URL
-        ext = os.path.splitext(path)[1].lower()
-        if not ext or ext not in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg']:
-            ext = '.jpg'  # default extension
-
-        # Use sequential numbering
-        img_filename = f"image{idx}{ext}"
-        img_path = os.path.join(folder_path, img_filename)
-
-        # Download image
-        if download_image(img_url, img_path):
-            # If url_variants provided (for posts), map all variants
-            if url_variants:
-                for variant in url_variants.get(img_url, [img_url]):
-                    url_to_filename[variant] = img_filename
-            else:
-                # For notes, just map the clean URL
-                url_to_filename[img_url] = img_filename
+        dict: Mapping from URL to local filename
+    """
+    existing = load_image_sidecar(folder_path)
+    if not existing and not os.path.exists(os.path.join(folder_path, IMAGE_SIDECAR)):
+        existing = infer_image_sidecar(folder_path)
+        if existing:
+            instrumentation.count('images.sidecar_inferred')
+    wanted = set(image_urls)
+
+    # Delete images that are no longer referenced
+    for url, img_filename in existing.items():
+        if url not in wanted:
+            img_path = os.path.join(folder_path, img_filename)
+            if os.path.exists(img_path):
+                instrumentation.count('images.removed')
+                os.remove(img_path)
+
+    used_numbers = [int(m.group(1)) for m in
+                    (re.match(r'image(\d+)\.', name) for name in existing.values()) if m]
+    next_number = max(used_numbers, default=0) + 1
+
+    # Keep filenames of images already on disk; number new ones in image_urls order
+    url_to_file = {}
+    targets = []
+    for img_url in image_urls:
+        img_filename = existing.get(img_url)
+        if img_filename and os.path.exists(os.path.join(folder_path, img_filename)):
+            instrumentation.count('images.kept')
+            url_to_file[img_url] = img_filename
+            continue
+        download_url, ext = image_rendition(img_url)
+        if not img_filename:
+            img_filename = f"image{next_number}{ext}"
+            next_number += 1
+        targets.append((img_url, img_filename, download_url))
+
+    # Download concurrently over pooled keep-alive connections, reusing
+    # images already in the content-addressed store
+    if targets:
+        pool = get_http_pool()
+        store = get_image_store()
+        with instrumentation.stage('images', item=folder_path, count=len(targets)):
+            with ThreadPoolExecutor(max_workers=max(1, min(IMAGE_DOWNLOAD_WORKERS, len(targets)))) as executor:
+                results = list(executor.map(in_thread_output(
+                    lambda target: download_image(target[2], os.path.join(folder_path, target[1]), pool, store)
+                ), targets))
+        with instrumentation.stage('write.image_index'):
+            store.save()
+
+        for (img_url, img_filename, _), downloaded in zip(targets, results):
+            if downloaded:
+                url_to_file[img_url] = img_filename
+
+        # A new imageN replaces any imageN file with another extension that
+        # no sidecar entry accounts for (e.g. image1.jpeg from before
+        # renditions, now image1.webp), instead of leaving it orphaned
+        kept = set(url_to_file.values())
+        replaced = {img_filename.split('.', 1)[0] for img_url, img_filename, _ in targets
+                    if url_to_file.get(img_url) == img_filename}
+        for name in os.listdir(folder_path):
+            if name not in kept and LOCAL_IMAGE_RE.fullmatch(name) and name.split('.', 1)[0] in replaced:
+                instrumentation.count('images.replaced')
+                os.remove(os.path.join(folder_path, name))
+
+    # Record files in image_urls order
+    url_to_file = {url: url_to_file[url] for url in image_urls if url in url_to_file}
+    if url_to_file or existing:
+        with instrumentation.stage('write.sidecar'):
+            save_image_sidecar(folder_path, url_to_file)
+
+    return url_to_file
+
+
+def download_images_to_store(image_urls, previous_images, store):
+    """
+    Download images into an image store only (a packed notes archive's).
 
-    return url_to_filename
+    previous_images is the note's last packed images record ({filename:
+    {'url', 'blob'}}): URLs whose blob is still in the store keep their
+    filename and are not downloaded again, new URLs get the next free imageN
+    number, as in download_images_to_folder.
+
+    Returns:
+        tuple: (URL-to-filename mapping, images record for the packed note)
+    """
+    existing = {image['url']: (filename, image['blob']) for filename, image in previous_images.items()}
+    used_numbers = [int(m.group(1)) for m in
+                    (re.match(r'image(\d+)\.', name) for name in previous_images) if m]
+    next_number = max(used_numbers, default=0) + 1
+
+    images = {}
+    targets = []
+    for img_url in image_urls:
+        img_filename, blob = existing.get(img_url, (None, None))
+        if blob and os.path.exists(os.path.join(store.root, blob)):
+            instrumentation.count('images.kept')
+            images[img_filename] = {'url': img_url, 'blob': blob}
+            continue
+        download_url, ext = image_rendition(img_url)
+        if not img_filename:
+            img_filename = f"image{next_number}{ext}"
+            next_number += 1
+        targets.append((img_url, img_filename, download_url, ext))
+
+    if targets:
+        pool = get_http_pool()
+        with instrumentation.stage('images', count=len(targets)):
+            with ThreadPoolExecutor(max_workers=max(1, min(IMAGE_DOWNLOAD_WORKERS, len(targets)))) as executor:
+                results = list(executor.map(in_thread_output(
+                    lambda target: download_image(target[2], None, pool, store, target[3])
+                ), targets))
+        with instrumentation.stage('write.image_index'):
+            store.save()
+
+        for (img_url, img_filename, _, _), blob_path in zip(targets, results):
+            if blob_path:
+                images[img_filename] = {'url': img_url, 'blob': os.path.relpath(blob_path, store.root)}
+
+    url_to_file = {image['url']: filename for filename, image in images.items()}
+    # Record files in image_urls order
+    url_to_file = {url: url_to_file[url] for url in image_urls if url in url_to_file}
+    images = {filename: images[filename] for filename in url_to_file.values()}
+    return url_to_file, images
 
 
 def build_post_frontmatter(title, pub_date, author, link):
@@ -373,9 +1938,8 @@ type: post
 
 
 def build_note_frontmatter(title, formatted_date, name, handle, note_url, note_id,
-                          photo_url, reaction_count, restacks, replies_count,
-                          reply_to_post=None, reply_to_url=None):
-    """Build YAML frontmatter for a note."""
+                          photo_url, reply_to_post=None, reply_to_url=None):
+    """Build YAML frontmatter for a note (content only; engagement is in the metrics store)."""
     frontmatter = f"""---
 title: {title}
 published: {formatted_date}
@@ -384,10 +1948,7 @@ handle: {handle}
 url: {note_url}
 type: note
 note_id: {note_id}
-photo_url: {photo_url}
-reactions: {reaction_count}
-restacks: {restacks}
-replies: {replies_count}"""
+photo_url: {photo_url}"""
 
     if reply_to_post and reply_to_url:
         frontmatter += f"""
@@ -429,302 +1990,711 @@ def build_note_metadata(title, formatted_date, name, handle, note_url,
     return metadata
 
 
+CONTENT_NS = '{http://purl.org/rss/1.0/modules/content/}'
+DC_NS = '{http://purl.org/dc/elements/1.1/}'
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+
+
+def feed_entry_from_element(elem):
+    """Entry dict (title, link, published, author, content, summary) from an RSS <item> or Atom <entry>."""
+    def text(tag):
+        child = elem.find(tag)
+        return child.text or '' if child is not None else ''
+
+    if elem.tag == 'item':
+        return {
+            'title': text('title').strip(),
+            'link': text('link').strip(),
+            'published': text('pubDate').strip(),
+            'author': (text(DC_NS + 'creator') or text('author')).strip(),
+            'content': text(CONTENT_NS + 'encoded'),
+            'summary': text('description'),
+        }
+
+    link = ''
+    for link_elem in elem.findall(ATOM_NS + 'link'):
+        if link_elem.get('rel', 'alternate') == 'alternate':
+            link = link_elem.get('href', '')
+            break
+    return {
+        'title': text(ATOM_NS + 'title').strip(),
+        'link': link.strip(),
+        'published': text(ATOM_NS + 'published').strip(),
+        'author': text(f'{ATOM_NS}author/{ATOM_NS}name').strip(),
+        'content': text(ATOM_NS + 'content'),
+        'summary': text(ATOM_NS + 'summary'),
+    }
+
+
+def feed_entry_from_feedparser(entry):
+    """Entry dict, as feed_entry_from_element returns it, from a feedparser entry."""
+    return {
+        'title': entry.get('title', '').strip(),
+        'link': entry.get('link', '').strip(),
+        'published': entry.get('published', '').strip(),
+        'author': entry.get('author', '').strip(),
+        'content': entry['content'][0].get('value', '') if entry.get('content') else '',
+        'summary': entry.get('summary', ''),
+    }
+
+
+class RecordingReader:
+    """
+    File-like reader that keeps a copy of what it reads, so a document can
+    be parsed again from the start. The copy goes to a temp file, so keeping
+    it does not grow memory with the feed.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.copy = tempfile.TemporaryFile()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.copy.write(data)
+        return data
+
+    def replay(self):
+        """Everything read so far and the rest of the stream, as bytes."""
+        while self.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+        self.copy.seek(0)
+        return self.copy.read()
+
+    def close(self):
+        self.copy.close()
+
+
+def iter_feed_entries(stream):
+    """
+    Yield feed entries one at a time from an RSS or Atom XML stream.
+
+    Parses incrementally and discards each <item>/<entry> element once it
+    has been yielded, so memory stays flat however many entries the feed
+    has. Feeds that are not well-formed XML (undefined HTML entities, stray
+    bytes) are re-read from the start with feedparser's forgiving parser
+    and the entries after those already yielded come from it. Without
+    feedparser, raises xml.etree.ElementTree.ParseError after yielding the
+    entries before the error.
+    """
+    from xml.etree import ElementTree
+
+    reader = RecordingReader(stream)
+    yielded = 0
+    parents = []
+    try:
+        for event, elem in ElementTree.iterparse(reader, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if elem.tag in ('item', ATOM_NS + 'entry'):
+                yield feed_entry_from_element(elem)
+                yielded += 1
+                if parents:
+                    parents[-1].remove(elem)
+                elem.clear()
+    except ElementTree.ParseError as e:
+        try:
+            import feedparser
+        except ImportError:
+            raise e from None
+        print(f"Warning: Feed parsing had issues: {e}; reading it with feedparser")
+        for entry in feedparser.parse(reader.replay()).entries[yielded:]:
+            yield feed_entry_from_feedparser(entry)
+    finally:
+        reader.close()
+
+
+@instrumentation.timed('posts')
 def fetch_posts(feed_url, output_dir):
     """Fetch blog posts from RSS feed and save as folders with markdown and images."""
+    from xml.etree import ElementTree
 
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
     print(f"Fetching posts from {feed_url}...")
-    feed = feedparser.parse(feed_url)
+    validator_cache = get_validator_cache()
+    manifest = get_manifest(output_dir, 'original_post.md')
+    entry_count = 0
+    saved_count = 0
+    had_errors = False
 
-    if feed.bozo:
-        print(f"Warning: Feed parsing had issues: {feed.bozo_exception}")
+    try:
+        # Entries are saved (and their images downloaded) while the feed is
+        # read, so the feed must not hold one of its host's connection slots
+        with conditional_open(feed_url, cache=validator_cache, hold_slot=False) as (status, response_headers, stream):
+            if status == 304:
+                print("Feed not modified since last run")
+                print(f"Posts: Saved 0 new posts to {output_dir}\n")
+                return 0
+
+            # Entries whose input is unchanged are not converted at all (see save_post)
+            entries = ((entry, None if post_input_unchanged(entry, output_dir, manifest)
+                        else entry.get('content') or entry.get('summary', ''))
+                       for entry in iter_feed_entries(stream))
+            try:
+                for entry, converted, error in convert_items(convert_post_content, entries,
+                                                             get_conversion_pool(), 'convert.post'):
+                    entry_count += 1
+                    try:
+                        if error:
+                            raise error
+                        if save_post(entry, output_dir, manifest, converted):
+                            saved_count += 1
+                    except Exception as e:
+                        print(f"  Error processing post '{entry.get('title') or 'Unknown'}': {e}")
+                        had_errors = True
+            except ElementTree.ParseError as e:
+                print(f"Warning: Feed parsing had issues: {e}")
+                had_errors = True
+    except Exception as e:
+        print(f"Error fetching feed: {e}")
+        return saved_count
 
-    if not feed.entries:
+    if not entry_count:
         print("No posts found in feed")
         return 0
 
-    print(f"Found {len(feed.entries)} posts")
-    saved_count = 0
+    print(f"Found {entry_count} posts")
 
-    for entry in feed.entries:
-        try:
-            # Extract entry data
-            title = entry.get('title', 'Untitled')
-            link = entry.get('link', '')
-            pub_date = entry.get('published', '')
-            author = entry.get('author', 'Unknown')
-
-            # Get content HTML
-            content_html = entry.get('content', [{}])[0].get('value', '') if 'content' in entry else ''
-            if not content_html:
-                content_html = entry.get('summary', '')
-
-            # Convert HTML to markdown first
-            content_md = convert_html_to_markdown(content_html) if content_html else 'No content available'
-
-            # Extract images from both HTML and markdown to catch all image URLs
-            html_image_urls = extract_images_from_html(content_html)
-            markdown_image_urls_raw = extract_images_from_markdown(content_md)
-
-            # Build mapping from clean URLs to original URLs (preserving newlines for replacement)
-            url_variants = {}  # clean_url -> list of original variants
-            for url in html_image_urls + markdown_image_urls_raw:
-                clean = clean_url(url)
-                if clean not in url_variants:
-                    url_variants[clean] = []
-                if url not in url_variants[clean]:
-                    url_variants[clean].append(url)
-
-            # Use clean URLs for downloading
-            image_urls = list(url_variants.keys())
-
-            # Parse date
-            try:
-                if pub_date:
-                    parsed_date = datetime.strptime(pub_date, '%a, %d %b %Y %H:%M:%S %Z')
-                    date_str = parsed_date.strftime('%Y-%m-%d')
-                else:
-                    date_str = datetime.now().strftime('%Y-%m-%d')
-            except:
-                date_str = datetime.now().strftime('%Y-%m-%d')
+    # Only remember the validators once every entry was processed, so failed
+    # entries are retried on the next run instead of hidden behind a 304
+    if not had_errors:
+        validator_cache.update(feed_url, response_headers)
+        validator_cache.save()
+
+    print(f"Posts: Saved {saved_count} new posts to {output_dir}\n")
+    return saved_count
 
-            # Extract slug from URL
-            slug = link.split('/')[-1] if link else sanitize_filename(title)
 
-            # Create folder name
-            folder_name = f"{date_str}_{slug}"
-            folder_path = os.path.join(output_dir, folder_name)
+def convert_post_content(content_html):
+    """(markdown, image_urls) for a post's content HTML, from one parse."""
+    if not content_html:
+        return 'No content available', []
+    converter = markdown_converter()
+    content_md = converter.handle(content_html).strip()
+    return content_md, list(dict.fromkeys(converter.images))
 
-            # Build markdown content
-            frontmatter = build_post_frontmatter(title, pub_date, author, link)
-            metadata = build_post_metadata(title, pub_date, author, link)
-            original_markdown = f"""{frontmatter}
+
+def post_folder_name(entry):
+    """Return (folder_name, slug) for a feed entry: YYYY-MM-DD_slug."""
+    title = entry.get('title') or 'Untitled'
+    link = entry.get('link', '')
+    pub_date = entry.get('published', '')
+
+    # Parse date
+    try:
+        if pub_date:
+            parsed_date = datetime.strptime(pub_date, '%a, %d %b %Y %H:%M:%S %Z')
+            date_str = parsed_date.strftime('%Y-%m-%d')
+        else:
+            date_str = datetime.now().strftime('%Y-%m-%d')
+    except:
+        date_str = datetime.now().strftime('%Y-%m-%d')
+
+    # Extract slug from URL
+    slug = link.split('/')[-1] if link else sanitize_filename(title)
+    return f"{date_str}_{slug}", slug
+
+
+def post_input_unchanged(entry, output_dir, manifest):
+    """True if the entry's folder was saved from exactly this input (see post_fingerprint)."""
+    folder_name, _ = post_folder_name(entry)
+    return (manifest.input_unchanged(folder_name, post_fingerprint(entry))
+            and os.path.isdir(os.path.join(output_dir, folder_name)))
+
+
+def save_post(entry, output_dir, manifest, converted=None):
+    """
+    Convert and save one feed entry as a post folder.
+
+    converted is the entry's (markdown, image_urls) when it was converted
+    ahead of time (see convert_post_content). An entry whose input
+    fingerprint matches the manifest is skipped before any conversion.
+    Returns True if the post was written, False if unchanged. Raises on
+    errors, which fetch_posts reports per entry.
+    """
+    title = entry.get('title') or 'Untitled'
+    link = entry.get('link', '')
+    pub_date = entry.get('published', '')
+    author = entry.get('author') or 'Unknown'
+
+    folder_name, slug = post_folder_name(entry)
+    folder_path = os.path.join(output_dir, folder_name)
+
+    fingerprint = post_fingerprint(entry)
+    if manifest.input_unchanged(folder_name, fingerprint) and os.path.isdir(folder_path):
+        instrumentation.count('posts.unchanged')
+        print(f"  Skipping (unchanged): {folder_name}")
+        return False
+
+    # Markdown and image URLs from one pass over the content HTML
+    if converted is None:
+        converted = convert_post_content(entry.get('content') or entry.get('summary', ''))
+    content_md, image_urls = converted
+
+    # Build markdown content
+    frontmatter = build_post_frontmatter(title, pub_date, author, link)
+    metadata = build_post_metadata(title, pub_date, author, link)
+    original_markdown = f"""{frontmatter}
 
 {metadata}
 
 {content_md}
 """
 
-            # Check if update is needed
-            content_hash = hash_content(original_markdown)
-            should_update, reason = should_update_folder(folder_path, content_hash)
+    # Check if update is needed
+    content_hash = hash_content(original_markdown)
+    should_update, reason = should_update_folder(folder_path, content_hash, manifest, folder_name)
+    instrumentation.count(f'posts.{reason}')
 
-            if not should_update:
-                print(f"  Skipping (unchanged): {folder_name}")
-                continue
+    if not should_update:
+        manifest.record_input(folder_name, fingerprint)
+        print(f"  Skipping (unchanged): {folder_name}")
+        return False
+
+    # Create folder
+    Path(folder_path).mkdir(parents=True, exist_ok=True)
+
+    # Download images and build URL mapping (before the markdown files, which
+    # locate the existing images of folders saved without a sidecar)
+    url_to_filename = download_images_to_folder(image_urls, folder_path)
+
+    # Save original markdown (with remote URLs)
+    original_path = os.path.join(folder_path, 'original_post.md')
+    with instrumentation.stage('write', item=folder_name):
+        with open(original_path, 'w', encoding='utf-8') as f:
+            f.write(original_markdown)
 
-            # Create folder
-            Path(folder_path).mkdir(parents=True, exist_ok=True)
+    # Create formatted markdown with local image paths
+    formatted_markdown = replace_image_urls_with_local(original_markdown, url_to_filename)
+    formatted_path = os.path.join(folder_path, 'formatted_post.md')
+    with instrumentation.stage('write', item=folder_name):
+        with open(formatted_path, 'w', encoding='utf-8') as f:
+            f.write(formatted_markdown)
 
-            # Save original markdown (with remote URLs)
-            original_path = os.path.join(folder_path, 'original_post.md')
-            with open(original_path, 'w', encoding='utf-8') as f:
-                f.write(original_markdown)
+    manifest.record(folder_name, slug, content_hash, sorted(set(url_to_filename.values())), fingerprint)
 
-            # Download images and build URL mapping
-            url_to_filename = download_images_to_folder(image_urls, folder_path, url_variants)
+    if reason == "new":
+        print(f"  Saved: {folder_name} ({len(url_to_filename)} images)")
+    else:
+        print(f"  Updated: {folder_name} ({len(url_to_filename)} images)")
+    return True
 
-            # Create formatted markdown with local image paths
-            formatted_markdown = replace_image_urls_with_local(original_markdown, url_to_filename)
-            formatted_path = os.path.join(folder_path, 'formatted_post.md')
-            with open(formatted_path, 'w', encoding='utf-8') as f:
-                f.write(formatted_markdown)
 
-            if reason == "new":
-                print(f"  Saved: {folder_name} ({len(url_to_filename)} images)")
+def note_item_id(item):
+    """Numeric note id of a notes API item, or None for restacks and non-note items."""
+    # Skip restacks - only save original notes
+    context = item.get('context') or {}
+    if context.get('type') == 'comment_restack':
+        return None
+
+    note_id = (item.get('comment') or {}).get('id')
+    try:
+        return int(note_id)
+    except (TypeError, ValueError):
+        return None
+
+
+# 'folders' (default) or 'packed': notes as monthly JSONL shards with images
+# in the image store (see notes_archive.py). An existing packed archive is
+# always used.
+NOTES_STORAGE = os.environ.get('NOTES_STORAGE', 'folders')
+
+_packed_notes = {}
+_packed_notes_lock = threading.Lock()
+
+
+def get_packed_notes(output_dir):
+    """Return the packed notes archive for output_dir, or None in folder mode."""
+    from notes_archive import PackedNotes, has_note_folders, is_packed, packed_images_dir
+    key = os.path.abspath(output_dir)
+    with _packed_notes_lock:
+        if key not in _packed_notes:
+            if is_packed(output_dir):
+                _packed_notes[key] = PackedNotes(output_dir)
+            elif NOTES_STORAGE == 'packed' and has_note_folders(output_dir):
+                # Once a packed archive exists it is all that is read, so an
+                # existing folder archive is packed first (its folders are kept)
+                print(f"Packing the note folders in {output_dir} for NOTES_STORAGE=packed...")
+                count = pack_note_folders(output_dir)
+                print(f"Packed {count} notes into {os.path.join(output_dir, 'packed')}")
+                _packed_notes[key] = PackedNotes(output_dir)
+            elif NOTES_STORAGE == 'packed':
+                _packed_notes[key] = PackedNotes(output_dir, image_store_dir=packed_images_dir(output_dir))
             else:
-                print(f"  Updated: {folder_name} ({len(url_to_filename)} images)")
-            saved_count += 1
+                _packed_notes[key] = None
+        return _packed_notes[key]
+
+
+def pack_note_folders(notes_dir, remove_folders=False):
+    """Pack a folder-layout notes archive (see notes_archive.pack_folders); returns the number of notes."""
+    from notes_archive import pack_folders
+    return pack_folders(notes_dir, get_image_store, hash_content, infer_image_sidecar, remove_folders)
+
+
+_note_metrics = {}
+_note_metrics_lock = threading.Lock()
+
 
+def get_note_metrics(output_dir):
+    """Return the engagement metrics store of a notes directory."""
+    from note_metrics import NoteMetrics
+    key = os.path.abspath(output_dir)
+    with _note_metrics_lock:
+        if key not in _note_metrics:
+            _note_metrics[key] = NoteMetrics(output_dir)
+        return _note_metrics[key]
+
+
+def note_archived(output_dir, manifest_key):
+    """True if the note at manifest_key is in the archive (its folder or packed record)."""
+    packed = get_packed_notes(output_dir)
+    if packed:
+        return packed.get(manifest_key) is not None
+    return os.path.isdir(os.path.join(output_dir, manifest_key))
+
+
+HIGH_WATER_MARK_FILE = '.high-water-mark.json'
+
+
+def load_notes_high_water_mark(output_dir):
+    """
+    Newest note id already archived in output_dir.
+
+    Read from the persisted high-water mark, or bootstrapped from the newest
+    note folder on disk when there is none yet.
+    """
+    hwm_path = os.path.join(output_dir, HIGH_WATER_MARK_FILE)
+    if os.path.exists(hwm_path):
+        try:
+            with open(hwm_path, 'r', encoding='utf-8') as f:
+                return int(json.load(f)['note_id'])
         except Exception as e:
-            print(f"  Error processing post '{entry.get('title', 'Unknown')}': {e}")
+            print(f"Warning: Could not read notes high-water mark: {e}")
+
+    folders = [folder.name for folder in Path(output_dir).glob('*/*/*_note-*')]
+    packed = get_packed_notes(output_dir)
+    if packed:
+        folders.extend(packed.folders())
+    note_ids = []
+    for folder in folders:
+        try:
+            note_ids.append(int(folder.rsplit('_note-', 1)[1]))
+        except ValueError:
             continue
+    return max(note_ids, default=None)
 
-    print(f"Posts: Saved {saved_count} new posts to {output_dir}\n")
-    return saved_count
 
+def save_notes_high_water_mark(output_dir, note_id):
+    """Persist the newest archived note id."""
+    hwm_path = os.path.join(output_dir, HIGH_WATER_MARK_FILE)
+    with open(hwm_path, 'w', encoding='utf-8') as f:
+        json.dump({'note_id': note_id, 'updated_at': datetime.now().isoformat()}, f, indent=2)
+        f.write('\n')
 
-def fetch_notes(base_url, output_dir):
-    """Fetch short-form notes from Substack notes API and save as folders with markdown and images."""
 
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-    notes_url = urljoin(base_url, '/api/v1/notes')
+def convert_note_body(comment):
+    """Markdown for a note's body: body_json rendered, else the plain body."""
+    body = comment.get('body', '')
+    body_json = comment.get('body_json', {})
 
-    print(f"Fetching notes from {notes_url}...")
+    # Convert body_json to markdown (with fallback to plain body)
+    if body_json and isinstance(body_json, dict) and body_json.get('content'):
+        # Parse structured JSON format with formatting preserved
+        return parse_body_json_to_markdown(body_json)
+    elif body:
+        # Fallback to plain text body (legacy support)
+        return body
+    return 'No content'
 
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-            'Accept': 'application/json',
-        }
-        req = urllib.request.Request(notes_url, headers=headers)
 
-        with urllib.request.urlopen(req, timeout=30) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-        items = data.get('items', [])
+def note_date(comment):
+    """A note's publication time, or now if it is missing or unparseable."""
+    try:
+        return datetime.fromisoformat(comment['date'].replace('Z', '+00:00'))
+    except (KeyError, AttributeError, ValueError):
+        return datetime.now()
 
-        if not items:
-            print("No notes found")
-            return 0
 
-        print(f"Found {len(items)} notes")
-        saved_count = 0
+def note_manifest_key(comment):
+    """Folder of a note relative to the notes directory: YYYY/MM/DD_note-ID."""
+    date = note_date(comment)
+    return f"{date:%Y}/{date:%m}/{date:%d}_note-{comment.get('id', '')}"
 
-        for item in items:
-            try:
-                # Skip restacks - only save original notes
-                context = item.get('context', {})
-                if context.get('type') == 'comment_restack':
-                    continue
 
-                comment = item.get('comment', {})
+def note_input_unchanged(item, base_url, output_dir, manifest):
+    """True if the note's folder was saved from exactly this input (see note_fingerprint)."""
+    manifest_key = note_manifest_key(item.get('comment') or {})
+    return (manifest.input_unchanged(manifest_key, note_fingerprint(item, base_url))
+            and note_archived(output_dir, manifest_key))
 
-                note_id = comment.get('id', '')
 
-                # Skip items without a valid note_id (e.g., likes on other posts)
-                if not note_id:
-                    continue
+def save_note(item, base_url, output_dir, content_md=None):
+    """
+    Save one notes API item as a folder with markdown and images, or as a
+    packed record (see get_packed_notes).
 
-                name = comment.get('name', 'Unknown')
-                handle = comment.get('handle', '')
-                body = comment.get('body', '')
-                body_json = comment.get('body_json', {})
-                pub_date_str = comment.get('date', '')
-                photo_url = comment.get('photo_url', '')
-
-                # Engagement metrics
-                reaction_count = comment.get('reaction_count', 0)
-                restacks = comment.get('restacks', 0)
-                replies_count = comment.get('children_count', 0)
-
-                # Extract attachment images (separate from body content)
-                attachments = comment.get('attachments', [])
-                attachment_image_urls = []
-                for attachment in attachments:
-                    if attachment.get('type') == 'image':
-                        img_url = attachment.get('imageUrl', '')
-                        if img_url:
-                            attachment_image_urls.append(img_url)
-
-                # Reply context
-                post = item.get('post')
-                reply_to_post = None
-                reply_to_url = None
-                if post:
-                    reply_to_post = post.get('title', '')
-                    reply_to_url = post.get('canonical_url', '')
-
-                # Build note URL
-                if handle:
-                    note_url = f"https://substack.com/note/c-{note_id}"
-                else:
-                    note_url = urljoin(base_url, f'/notes/post/{note_id}')
+    content_md is the note's converted body when it was converted ahead of
+    time (see convert_note_body). A note whose input fingerprint matches the
+    manifest is skipped before any conversion. Returns True if the note was
+    saved or updated, False if it was skipped.
+    """
+    # Skip restacks and items without a valid note_id (e.g., likes on other posts)
+    if note_item_id(item) is None:
+        return False
 
-                # Substack notes don't have titles, just use note ID as identifier
-                title = f'Note {note_id}'
+    comment = item.get('comment', {})
+    note_id = comment.get('id', '')
+
+    # Create folder structure: notes/YYYY/MM/DD_note-ID
+    manifest = get_manifest(output_dir, 'original_note.md')
+    manifest_key = note_manifest_key(comment)
+    year, month, folder_name = manifest_key.split('/')
+    folder_path = os.path.join(output_dir, year, month, folder_name)
+
+    # Engagement changes on its own all the time; it is recorded apart from
+    # the note so that it never makes the note itself "updated"
+    if get_note_metrics(output_dir).record(manifest_key, note_id, comment.get('reaction_count', 0),
+                                           comment.get('restacks', 0), comment.get('children_count', 0)):
+        instrumentation.count('notes.metrics_changed')
+
+    fingerprint = note_fingerprint(item, base_url)
+    if manifest.input_unchanged(manifest_key, fingerprint) and note_archived(output_dir, manifest_key):
+        instrumentation.count('notes.unchanged')
+        print(f"  Skipping (unchanged): {manifest_key}")
+        return False
 
-                # Parse date
-                try:
-                    if pub_date_str:
-                        parsed_date = datetime.fromisoformat(pub_date_str.replace('Z', '+00:00'))
-                        year = parsed_date.strftime('%Y')
-                        month = parsed_date.strftime('%m')
-                        day = parsed_date.strftime('%d')
-                        formatted_date = parsed_date.strftime('%a, %d %b %Y %H:%M:%S GMT')
-                    else:
-                        now = datetime.now()
-                        year = now.strftime('%Y')
-                        month = now.strftime('%m')
-                        day = now.strftime('%d')
-                        formatted_date = now.strftime('%a, %d %b %Y %H:%M:%S GMT')
-                except:
-                    now = datetime.now()
-                    year = now.strftime('%Y')
-                    month = now.strftime('%m')
-                    day = now.strftime('%d')
-                    formatted_date = now.strftime('%a, %d %b %Y %H:%M:%S GMT')
-
-                # Convert body_json to markdown (with fallback to plain body)
-                if body_json and isinstance(body_json, dict) and body_json.get('content'):
-                    # Parse structured JSON format with formatting preserved
-                    content_md = parse_body_json_to_markdown(body_json)
-                elif body:
-                    # Fallback to plain text body (legacy support)
-                    content_md = body
-                else:
-                    content_md = 'No content'
-
-                # Append attachment images to markdown content
-                if attachment_image_urls:
-                    content_md += '\n\n'
-                    for idx, img_url in enumerate(attachment_image_urls):
-                        content_md += f'![Image]({img_url})'
-                        # Add newline between images, but not after the last one
-                        if idx < len(attachment_image_urls) - 1:
-                            content_md += '\n\n'
-
-                # Extract images from markdown and clean URLs (remove newlines from wrapped text)
-                markdown_image_urls = extract_images_from_markdown(content_md)
-                image_urls = list(set(clean_url(url) for url in markdown_image_urls))
-
-                # Add attachment images to the list
-                for att_url in attachment_image_urls:
-                    clean_att_url = clean_url(att_url)
-                    if clean_att_url not in image_urls:
-                        image_urls.append(clean_att_url)
-
-                # Create folder structure: notes/YYYY/MM/DD_note-ID
-                slug = f"note-{note_id}"
-                folder_name = f"{day}_{slug}"
-                year_month_dir = os.path.join(output_dir, year, month)
-                folder_path = os.path.join(year_month_dir, folder_name)
-
-                # Build markdown content
-                frontmatter = build_note_frontmatter(
-                    title, formatted_date, name, handle, note_url, note_id,
-                    photo_url, reaction_count, restacks, replies_count,
-                    reply_to_post, reply_to_url
-                )
-                original_markdown = f"""{frontmatter}
+    name = comment.get('name', 'Unknown')
+    handle = comment.get('handle', '')
+    photo_url = comment.get('photo_url', '')
+
+    # Extract attachment images (separate from body content)
+    attachments = comment.get('attachments', [])
+    attachment_image_urls = []
+    for attachment in attachments:
+        if attachment.get('type') == 'image':
+            img_url = attachment.get('imageUrl', '')
+            if img_url:
+                attachment_image_urls.append(img_url)
+
+    # Reply context
+    post = item.get('post')
+    reply_to_post = None
+    reply_to_url = None
+    if post:
+        reply_to_post = post.get('title', '')
+        reply_to_url = post.get('canonical_url', '')
+
+    # Build note URL
+    if handle:
+        note_url = f"https://substack.com/note/c-{note_id}"
+    else:
+        note_url = urljoin(base_url, f'/notes/post/{note_id}')
+
+    # Substack notes don't have titles, just use note ID as identifier
+    title = f'Note {note_id}'
+
+    formatted_date = note_date(comment).strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+    if content_md is None:
+        content_md = convert_note_body(comment)
+
+    # Append attachment images to markdown content
+    if attachment_image_urls:
+        content_md += '\n\n'
+        for idx, img_url in enumerate(attachment_image_urls):
+            content_md += f'![Image]({img_url})'
+            # Add newline between images, but not after the last one
+            if idx < len(attachment_image_urls) - 1:
+                content_md += '\n\n'
+
+    # Extract images from markdown and clean URLs (remove newlines from wrapped text)
+    markdown_image_urls = extract_images_from_markdown(content_md)
+    # Keep first-seen order so image numbering is stable between runs
+    image_urls = list(dict.fromkeys(clean_url(url) for url in markdown_image_urls))
+
+    # Add attachment images to the list
+    for att_url in attachment_image_urls:
+        clean_att_url = clean_url(att_url)
+        if clean_att_url not in image_urls:
+            image_urls.append(clean_att_url)
+
+    # Build markdown content
+    frontmatter = build_note_frontmatter(
+        title, formatted_date, name, handle, note_url, note_id,
+        photo_url, reply_to_post, reply_to_url
+    )
+    original_markdown = f"""{frontmatter}
 {content_md}
 """
 
-                # Check if update is needed
-                content_hash = hash_content(original_markdown)
-                should_update, reason = should_update_folder(folder_path, content_hash)
+    # Check if update is needed
+    content_hash = hash_content(original_markdown)
+    packed = get_packed_notes(output_dir)
+    if packed:
+        should_update, reason = packed.change(manifest_key, content_hash)
+    else:
+        should_update, reason = should_update_folder(folder_path, content_hash, manifest, manifest_key)
+    instrumentation.count(f'notes.{reason}')
+
+    if not should_update:
+        manifest.record_input(manifest_key, fingerprint)
+        print(f"  Skipping (unchanged): {manifest_key}")
+        return False
 
-                if not should_update:
-                    print(f"  Skipping (unchanged): {year}/{month}/{folder_name}")
-                    continue
+    if packed:
+        previous = packed.get(manifest_key)
+        url_to_filename, images = download_images_to_store(image_urls, previous['images'] if previous else {},
+                                                           get_image_store(packed.image_store_dir))
+        formatted_markdown = replace_image_urls_with_local(original_markdown, url_to_filename)
+        with instrumentation.stage('write', item=manifest_key):
+            packed.write({
+                'folder': manifest_key,
+                'id': str(note_id),
+                'content_hash': content_hash,
+                'original': original_markdown,
+                'formatted': formatted_markdown,
+                'images': images,
+            })
+    else:
+        url_to_filename = write_note_folder(folder_path, manifest_key, original_markdown, image_urls)
+
+    manifest.record(manifest_key, note_id, content_hash, sorted(set(url_to_filename.values())), fingerprint)
+
+    if reason == "new":
+        print(f"  Saved: {year}/{month}/{folder_name} ({len(url_to_filename)} images)")
+    else:
+        print(f"  Updated: {year}/{month}/{folder_name} ({len(url_to_filename)} images)")
+    return True
+
+
+def write_note_folder(folder_path, manifest_key, original_markdown, image_urls):
+    """Write a note's folder (markdown files and images); returns the URL-to-filename mapping."""
+    # Create year/month directories and note folder
+    Path(folder_path).mkdir(parents=True, exist_ok=True)
+
+    # Download images and build URL mapping. First, while the old markdown
+    # files are still there: notes saved without a sidecar (before engagement
+    # moved out of the frontmatter, every archived note is rewritten once)
+    # find their existing images through them.
+    url_to_filename = download_images_to_folder(image_urls, folder_path)
+
+    # Save original markdown (with remote URLs)
+    original_path = os.path.join(folder_path, 'original_note.md')
+    with instrumentation.stage('write', item=manifest_key):
+        with open(original_path, 'w', encoding='utf-8') as f:
+            f.write(original_markdown)
+
+    # Create formatted markdown with local image paths
+    formatted_markdown = replace_image_urls_with_local(original_markdown, url_to_filename)
+    formatted_path = os.path.join(folder_path, 'formatted_note.md')
+    with instrumentation.stage('write', item=manifest_key):
+        with open(formatted_path, 'w', encoding='utf-8') as f:
+            f.write(formatted_markdown)
+    return url_to_filename
 
-                # Create year/month directories and note folder
-                Path(folder_path).mkdir(parents=True, exist_ok=True)
 
-                # Save original markdown (with remote URLs)
-                original_path = os.path.join(folder_path, 'original_note.md')
-                with open(original_path, 'w', encoding='utf-8') as f:
-                    f.write(original_markdown)
+@instrumentation.timed('notes')
+def fetch_notes(base_url, output_dir):
+    """
+    Fetch short-form notes from Substack notes API and save as folders with markdown and images.
 
-                # Download images and build URL mapping
-                url_to_filename = download_images_to_folder(image_urls, folder_path)
+    Follows the API's nextCursor through older pages until a page reaches a
+    note at or below the persisted high-water mark (the newest note already
+    archived), so each run only pages through what is new.
+    """
 
-                # Create formatted markdown with local image paths
-                formatted_markdown = replace_image_urls_with_local(original_markdown, url_to_filename)
-                formatted_path = os.path.join(folder_path, 'formatted_note.md')
-                with open(formatted_path, 'w', encoding='utf-8') as f:
-                    f.write(formatted_markdown)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    notes_url = urljoin(base_url, '/api/v1/notes')
+    max_pages = int(os.environ.get('NOTES_MAX_PAGES', '20'))
 
-                if reason == "new":
-                    print(f"  Saved: {year}/{month}/{folder_name} ({len(url_to_filename)} images)")
-                else:
-                    print(f"  Updated: {year}/{month}/{folder_name} ({len(url_to_filename)} images)")
-                saved_count += 1
+    print(f"Fetching notes from {notes_url}...")
 
-            except Exception as e:
-                print(f"  Error processing note '{comment.get('id', 'Unknown')}': {e}")
-                continue
+    try:
+        validator_cache = get_validator_cache()
+        manifest = get_manifest(output_dir, 'original_note.md')
+        high_water_mark = load_notes_high_water_mark(output_dir)
+        newest_note_id = high_water_mark
+        saved_count = 0
+        had_errors = False
+        first_response_headers = None
+        cursor = None
+        page = 0
+
+        while True:
+            page += 1
+            page_url = notes_url if cursor is None else f"{notes_url}?{urlencode({'cursor': cursor})}"
+
+            # Only the first page is conditional; older pages are fetched when
+            # it changed. Notes (and their images) are saved while the page is
+            # read, so it must not hold one of its host's connection slots.
+            with instrumentation.stage('notes.page', item=page), conditional_open(
+                page_url, headers={'Accept': 'application/json'},
+                cache=validator_cache if page == 1 else None, hold_slot=False
+            ) as (status, response_headers, stream):
+                if status == 304:
+                    print("Notes not modified since last run")
+                    print(f"Notes: Saved 0 new notes to {output_dir}\n")
+                    return 0
+                if page == 1:
+                    first_response_headers = response_headers
+
+                # Items are parsed off the response one at a time and dropped
+                # once saved, so memory does not grow with the page size
+                page_items = StreamingJSONArray(stream, 'items')
+                item_count = 0
+
+                # Restacks and other non-note items are skipped by save_note, and so
+                # are notes whose input is unchanged; don't convert them
+                pairs = ((item, None if note_item_id(item) is None
+                          or note_input_unchanged(item, base_url, output_dir, manifest)
+                          else item.get('comment') or {})
+                         for item in page_items)
+
+                reached_known = False
+                for item, content_md, error in convert_items(convert_note_body, pairs, get_conversion_pool(),
+                                                             'convert.note'):
+                    item_count += 1
+                    note_id = note_item_id(item)
+                    if note_id is not None and high_water_mark is not None and note_id <= high_water_mark:
+                        reached_known = True
+
+                    try:
+                        if error:
+                            raise error
+                        if save_note(item, base_url, output_dir, content_md):
+                            saved_count += 1
+                        if note_id is not None and (newest_note_id is None or note_id > newest_note_id):
+                            newest_note_id = note_id
+                    except Exception as e:
+                        print(f"  Error processing note '{(item.get('comment') or {}).get('id', 'Unknown')}': {e}")
+                        had_errors = True
+                        continue
+
+            if page == 1:
+                if not item_count:
+                    print("No notes found")
+                    return 0
+                print(f"Found {item_count} notes")
+            else:
+                print(f"Found {item_count} more notes (page {page})")
+
+            cursor = page_items.members.get('nextCursor')
+            if reached_known or not cursor:
+                break
+            if page >= max_pages:
+                print(f"Stopping after {max_pages} pages (NOTES_MAX_PAGES)")
+                break
+
+        # Only advance the high-water mark and remember the validators once
+        # every note was processed, so failed notes are retried on the next run
+        if not had_errors:
+            if newest_note_id is not None and newest_note_id != high_water_mark:
+                save_notes_high_water_mark(output_dir, newest_note_id)
+            validator_cache.update(notes_url, first_response_headers)
+            validator_cache.save()
 
         print(f"Notes: Saved {saved_count} new notes to {output_dir}\n")
         return saved_count
@@ -737,30 +2707,485 @@ def fetch_notes(base_url, output_dir):
         return 0
 
 
-def main():
-    """Main function."""
-    BASE_URL = "https://www.cengizhan.com"
-    FEED_URL = f"{BASE_URL}/feed"
-    POSTS_DIR = "./posts"
-    NOTES_DIR = "./notes"
+class ThreadOutputBuffer:
+    """
+    sys.stdout replacement that holds back output from selected threads.
+
+    Lets the posts and notes pipelines run concurrently while the log reads
+    exactly as if they had run one after the other: one pipeline prints
+    live, the other's output is buffered and printed when it is done.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._buffers = {}
 
-    base_url = os.environ.get('SUBSTACK_BASE_URL', BASE_URL)
-    feed_url = os.environ.get('SUBSTACK_FEED_URL', FEED_URL)
-    posts_dir = os.environ.get('POSTS_DIR', POSTS_DIR)
-    notes_dir = os.environ.get('NOTES_DIR', NOTES_DIR)
+    def captured(self, func, *args):
+        """Call func(*args) with this thread's output buffered; returns (result, output)."""
+        buffer = self._buffers[threading.get_ident()] = []
+        try:
+            return func(*args), ''.join(buffer)
+        finally:
+            del self._buffers[threading.get_ident()]
+
+    def inherited(self, func):
+        """
+        Wrap func so its output goes where the calling thread's does.
+
+        For work the calling thread hands to other threads (image download
+        workers), which would otherwise print live in the middle of
+        another pipeline's output.
+        """
+        buffer = self._buffers.get(threading.get_ident())
+        if buffer is None:
+            return func
+
+        def call(*args):
+            ident = threading.get_ident()
+            self._buffers[ident] = buffer
+            try:
+                return func(*args)
+            finally:
+                del self._buffers[ident]
+        return call
 
-    print("=" * 60)
-    print("Substack Content Scraper")
-    print("=" * 60)
-    print()
+    def write(self, text):
+        buffer = self._buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
 
-    posts_saved = fetch_posts(feed_url, posts_dir)
-    notes_saved = fetch_notes(base_url, notes_dir)
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
 
+
+def in_thread_output(func):
+    """Wrap func to print where the calling thread prints (see ThreadOutputBuffer)."""
+    if isinstance(sys.stdout, ThreadOutputBuffer):
+        return sys.stdout.inherited(func)
+    return func
+
+
+def fetch_all(feed_url, posts_dir, base_url, notes_dir):
+    """
+    Run the posts and notes pipelines; returns (posts_saved, notes_saved).
+
+    They hit different endpoints and write to separate directories, so by
+    default they run concurrently and a run takes as long as the slower one.
+    Both share the HTTP connection pool (and its per-host request limit),
+    the image store, the validator cache and the conversion pool. Set
+    PIPELINES=sequential to run them one after the other.
+    """
+    if os.environ.get('PIPELINES', 'concurrent') == 'sequential':
+        return fetch_posts(feed_url, posts_dir), fetch_notes(base_url, notes_dir)
+
+    # Create the shared singletons up front rather than racing to in the threads
+    get_http_pool()
+    get_validator_cache()
+    get_image_store()
+    get_conversion_pool()
+
+    output = ThreadOutputBuffer(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            posts_future = executor.submit(instrumentation.profiled(fetch_posts), feed_url, posts_dir)
+            notes_future = executor.submit(output.captured, instrumentation.profiled(fetch_notes),
+                                           base_url, notes_dir)
+            posts_saved = posts_future.result()
+            notes_saved, notes_output = notes_future.result()
+    finally:
+        sys.stdout = output.stream
+
+    sys.stdout.write(notes_output)
+    return posts_saved, notes_saved
+
+
+def load_publications(path):
+    """
+    Read a publications config file (JSON) for fetch_publications.
+
+    {
+      "concurrency": 4,
+      "max_connections_per_host": 4,
+      "report": "report.json",
+      "publications": [
+        {"name": "cengizhan", "base_url": "https://www.cengizhan.com"},
+        {"base_url": "https://example.substack.com", "posts_dir": "example/posts", "notes_dir": null}
+      ]
+    }
+
+    concurrency is the number of pipelines running at once (default 4),
+    max_connections_per_host defaults to MAX_CONNECTIONS_PER_HOST and report
+    is an optional path for a JSON copy of the consolidated report. For each
+    publication, feed_url defaults to <base_url>/feed, name to the base
+    URL's host, and posts_dir/notes_dir to <name>/posts and <name>/notes;
+    null skips that pipeline. Raises ValueError for an invalid config.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    publications = []
+    output_dirs = set()
+    for pub in config.get('publications') or []:
+        if not pub.get('base_url'):
+            raise ValueError(f"publication without base_url in {path}: {pub}")
+        base_url = pub['base_url'].rstrip('/')
+        name = pub.get('name') or urlparse(base_url).netloc
+        publication = {
+            'name': name,
+            'base_url': base_url,
+            'feed_url': pub.get('feed_url') or f"{base_url}/feed",
+            'posts_dir': pub.get('posts_dir', os.path.join(name, 'posts')),
+            'notes_dir': pub.get('notes_dir', os.path.join(name, 'notes')),
+        }
+        for key in ('posts_dir', 'notes_dir'):
+            if publication[key]:
+                output_dir = os.path.abspath(publication[key])
+                if output_dir in output_dirs:
+                    raise ValueError(f"{publication[key]} is used by more than one pipeline in {path}")
+                output_dirs.add(output_dir)
+        publications.append(publication)
+    if not publications:
+        raise ValueError(f"no publications in {path}")
+
+    return {
+        'publications': publications,
+        'concurrency': max(1, int(config.get('concurrency', 4))),
+        'max_connections_per_host': int(config.get('max_connections_per_host', MAX_CONNECTIONS_PER_HOST)),
+        'report': config.get('report'),
+    }
+
+
+def run_pipeline(func, *args):
+    """Call a fetch_* pipeline; returns (saved_count, seconds, error)."""
+    start = time.perf_counter()
+    try:
+        return func(*args), time.perf_counter() - start, None
+    except Exception as e:
+        return 0, time.perf_counter() - start, str(e)
+
+
+def fetch_publications(publications, concurrency=4, max_connections_per_host=MAX_CONNECTIONS_PER_HOST):
+    """
+    Scrape several publications in one run; returns a report row per publication.
+
+    Every publication's posts and notes pipelines are queued on one
+    scheduler that runs at most `concurrency` of them at a time. They share
+    the HTTP connection pool, so the per-host limit holds across
+    publications (substackcdn.com serves all their images), as well as the
+    image store, the validator cache and the conversion pool. Each
+    pipeline's log is buffered and printed in config order.
+    """
+    # Before any request, so every host slot gets the configured limit
+    get_http_pool().max_per_host = max_connections_per_host
+    get_validator_cache()
+    get_image_store()
+    get_conversion_pool()
+
+    tasks = []
+    for pub in publications:
+        if pub['posts_dir']:
+            tasks.append((pub, 'posts', fetch_posts, pub['feed_url'], pub['posts_dir']))
+        if pub['notes_dir']:
+            tasks.append((pub, 'notes', fetch_notes, pub['base_url'], pub['notes_dir']))
+
+    report = {pub['name']: {'name': pub['name'], 'base_url': pub['base_url'], 'posts': None, 'notes': None,
+                            'seconds': 0.0, 'errors': []} for pub in publications}
+    output = ThreadOutputBuffer(sys.stdout)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(output.captured, instrumentation.profiled(run_pipeline), func, *args)
+                       for _, _, func, *args in tasks]
+            current = None
+            for (pub, kind, *_), future in zip(tasks, futures):
+                (saved, seconds, error), text = future.result()
+                if pub['name'] != current:
+                    current = pub['name']
+                    output.stream.write(f"## {pub['name']} ({pub['base_url']})\n\n")
+                output.stream.write(text)
+                if error:
+                    output.stream.write(f"Error in {kind} pipeline: {error}\n\n")
+                row = report[pub['name']]
+                row[kind] = saved
+                row['seconds'] = round(row['seconds'] + seconds, 3)
+                if error:
+                    row['errors'].append(f"{kind}: {error}")
+    finally:
+        sys.stdout = output.stream
+
+    return list(report.values())
+
+
+def print_publications_report(report, wall_time):
+    """Print the consolidated report of a fetch_publications run."""
+    width = max([len('Publication')] + [len(row['name']) for row in report])
     print("=" * 60)
-    print(f"Total: Saved {posts_saved} posts and {notes_saved} notes")
+    print(f"{'Publication':<{width}}  {'Posts':>6}  {'Notes':>6}  {'Time':>8}")
+    for row in report:
+        posts = '-' if row['posts'] is None else row['posts']
+        notes = '-' if row['notes'] is None else row['notes']
+        status = f"  ERROR: {'; '.join(row['errors'])}" if row['errors'] else ''
+        print(f"{row['name']:<{width}}  {posts:>6}  {notes:>6}  {row['seconds']:>7.1f}s{status}")
+    total_posts = sum(row['posts'] or 0 for row in report)
+    total_notes = sum(row['notes'] or 0 for row in report)
+    print("-" * 60)
+    print(f"{'Total':<{width}}  {total_posts:>6}  {total_notes:>6}  {wall_time:>7.1f}s")
+    print(f"Total: Saved {total_posts} posts and {total_notes} notes from {len(report)} publications")
     print("=" * 60)
 
 
+# Watch mode (WATCH=1): poll in one long-running process instead of a cron job
+WATCH_MIN_INTERVAL = float(os.environ.get('WATCH_MIN_INTERVAL', '60'))
+WATCH_MAX_INTERVAL = float(os.environ.get('WATCH_MAX_INTERVAL', '900'))
+WATCH_BACKOFF = float(os.environ.get('WATCH_BACKOFF', '2'))
+
+
+class AdaptiveInterval:
+    """
+    Polling interval for watch mode: back to the minimum after a cycle that
+    found new content, multiplied by backoff after each quiet cycle, up to
+    the maximum.
+    """
+
+    def __init__(self, minimum=WATCH_MIN_INTERVAL, maximum=WATCH_MAX_INTERVAL, backoff=WATCH_BACKOFF):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.backoff = backoff
+        self.current = minimum
+
+    def update(self, changed):
+        """Return the delay before the next cycle after one that did (or did not) find new content."""
+        if changed:
+            self.current = self.minimum
+        else:
+            self.current = min(self.maximum, self.current * self.backoff)
+        return self.current
+
+
+def watch(run_cycle, interval=None, max_cycles=0, on_change=None):
+    """
+    Call run_cycle() repeatedly in this process; returns the number of cycles.
+
+    The connection pool, validator cache, manifests, image store and
+    conversion pool stay warm between cycles, so a quiet cycle costs one
+    conditional request per endpoint. run_cycle returns the number of items
+    saved; the delay before the next cycle follows an AdaptiveInterval.
+    Every cycle is a separate instrumentation run, so RUN_SUMMARY (with
+    {run} for the cycle number) gets a summary per cycle. on_change is a
+    shell command run after each cycle that saved something, e.g. to commit
+    and push. SIGTERM or Ctrl-C stops after the current cycle (a second one
+    stops at once); max_cycles > 0 stops after that many.
+    """
+    interval = interval or AdaptiveInterval()
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        print(f"\nReceived {signal.Signals(signum).name}, stopping after this cycle")
+        stop.set()
+
+    previous_handlers = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+    cycle = 0
+    try:
+        while not stop.is_set():
+            cycle += 1
+            instrumentation.restart(cycle)
+            print(f"--- Cycle {cycle} at {datetime.now().isoformat(timespec='seconds')} ---")
+            start = time.perf_counter()
+            try:
+                saved = run_cycle()
+            except Exception as e:
+                print(f"Error in cycle {cycle}: {e}")
+                saved = 0
+            instrumentation.finish()
+
+            if saved and on_change:
+                result = subprocess.run(on_change, shell=True)
+                if result.returncode:
+                    print(f"WATCH_ON_CHANGE exited with status {result.returncode}")
+
+            delay = interval.update(saved > 0)
+            if max_cycles and cycle >= max_cycles:
+                break
+            print(f"Cycle {cycle}: saved {saved} items in {time.perf_counter() - start:.1f}s; "
+                  f"next poll in {delay:.0f}s\n")
+            sys.stdout.flush()
+            stop.wait(delay)
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+    return cycle
+
+
+def probe(feed_url, base_url, notes_dir):
+    """
+    Check the feed and the notes API without converting or saving anything.
+
+    Each endpoint is requested with the cached validators, so the probe also
+    tells whether a run would find anything: "not modified" means it would
+    stop after one request. The validator cache is not updated. Returns
+    True if both endpoints answered.
+    """
+    validator_cache = get_validator_cache()
+    ok = True
+
+    start = time.perf_counter()
+    try:
+        with conditional_open(feed_url, cache=validator_cache) as (status, response_headers, stream):
+            entries = 0 if status == 304 else sum(1 for _ in iter_feed_entries(stream))
+        detail = 'not modified since last run' if status == 304 else f'{entries} posts'
+        print(f"Feed:  HTTP {status}, {detail} ({time.perf_counter() - start:.2f}s) {feed_url}")
+    except Exception as e:
+        print(f"Feed:  FAILED: {e} {feed_url}")
+        ok = False
+
+    notes_url = urljoin(base_url, '/api/v1/notes')
+    start = time.perf_counter()
+    try:
+        status, _, body = conditional_get(notes_url, headers={'Accept': 'application/json'},
+                                          cache=validator_cache)
+        if status == 304:
+            detail = 'not modified since last run'
+        else:
+            note_ids = [note_item_id(item) for item in json.loads(body.decode('utf-8')).get('items', [])]
+            high_water_mark = load_notes_high_water_mark(notes_dir) if os.path.isdir(notes_dir) else None
+            new = sum(1 for note_id in note_ids
+                      if note_id is not None and (high_water_mark is None or note_id > high_water_mark))
+            detail = f'{len(note_ids)} items on the first page, {new} newer than the archive'
+        print(f"Notes: HTTP {status}, {detail} ({time.perf_counter() - start:.2f}s) {notes_url}")
+    except Exception as e:
+        print(f"Notes: FAILED: {e} {notes_url}")
+        ok = False
+
+    return ok
+
+
+COMMANDS = {
+    'all': 'posts and notes (the default; every publication in PUBLICATIONS_FILE if set)',
+    'posts': 'posts from the RSS feed only',
+    'notes': 'notes from the notes API only',
+    'probe': 'check the feed and notes API and whether anything changed, without saving',
+}
+
+
+def parse_args(argv=None):
+    """Command line options; the command defaults to `all`."""
+    import argparse
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0].startswith('-') and argv[0] not in ('-h', '--help')):
+        argv.insert(0, 'all')
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--base-url', default=os.environ.get('SUBSTACK_BASE_URL', 'https://www.cengizhan.com'),
+                         help='publication URL (SUBSTACK_BASE_URL)')
+    options.add_argument('--feed-url', default=os.environ.get('SUBSTACK_FEED_URL'),
+                         help='RSS feed URL (SUBSTACK_FEED_URL), default: <base-url>/feed')
+    options.add_argument('--posts-dir', default=os.environ.get('POSTS_DIR', './posts'), help='(POSTS_DIR)')
+    options.add_argument('--notes-dir', default=os.environ.get('NOTES_DIR', './notes'), help='(NOTES_DIR)')
+    options.add_argument('--publications', default=os.environ.get('PUBLICATIONS_FILE'),
+                         help='publications config file (PUBLICATIONS_FILE)')
+    options.add_argument('--watch', action='store_true', default=os.environ.get('WATCH', '') not in ('', '0'),
+                         help='keep polling on an adaptive interval (WATCH=1)')
+    options.add_argument('--timings', action='store_true', help='report import and startup time')
+
+    parser = argparse.ArgumentParser(description='Archive Substack posts and notes as markdown.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in COMMANDS.items():
+        subparsers.add_parser(name, parents=[options], help=help_text, description=help_text)
+    args = parser.parse_args(argv)
+    args.feed_url = args.feed_url or f"{args.base_url.rstrip('/')}/feed"
+    return args
+
+
+def main(argv=None):
+    """Run a command (see COMMANDS); `python -m scraper notes` starts fastest."""
+    args = parse_args(argv)
+
+    config = None
+    if args.publications and args.command != 'probe':
+        try:
+            config = load_publications(args.publications)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Error reading {args.publications}: {e}")
+        # posts/notes limit every publication to that pipeline
+        for pub in config['publications']:
+            if args.command == 'posts':
+                pub['notes_dir'] = None
+            elif args.command == 'notes':
+                pub['posts_dir'] = None
+
+    def run_once():
+        """One scrape of everything configured; returns the number of items saved."""
+        if config:
+            start = time.perf_counter()
+            report = fetch_publications(config['publications'], config['concurrency'],
+                                        config['max_connections_per_host'])
+            wall_time = time.perf_counter() - start
+            print_publications_report(report, wall_time)
+            if config['report']:
+                instrumentation.write_json(config['report'], {
+                    'finished_at': datetime.now().isoformat(timespec='seconds'),
+                    'wall_time': round(wall_time, 3),
+                    'publications': report,
+                }, indent=2)
+            return sum((row['posts'] or 0) + (row['notes'] or 0) for row in report)
+
+        if args.command == 'posts':
+            posts_saved, notes_saved = fetch_posts(args.feed_url, args.posts_dir), 0
+        elif args.command == 'notes':
+            posts_saved, notes_saved = 0, fetch_notes(args.base_url, args.notes_dir)
+        else:
+            posts_saved, notes_saved = fetch_all(args.feed_url, args.posts_dir, args.base_url, args.notes_dir)
+
+        print("=" * 60)
+        print(f"Total: Saved {posts_saved} posts and {notes_saved} notes")
+        print("=" * 60)
+        return posts_saved + notes_saved
+
+    if not args.watch:
+        # Start recording (profiler, tracemalloc) before any work, if configured;
+        # in watch mode each cycle is recorded separately
+        instrumentation.get_recorder()
+
+    if args.timings:
+        modules_at_start = set(sys.modules)
+        # Startup is CPU-bound (interpreter, imports, argument parsing), so the
+        # process's CPU time so far is its startup time, imports included
+        print(f"Startup: ready to run `{args.command}` after {time.process_time() * 1000:.1f}ms "
+              f"(CPU time since the interpreter started)")
+
+    if args.command == 'probe':
+        ok = probe(args.feed_url, args.base_url, args.notes_dir)
+    else:
+        print("=" * 60)
+        print("Substack Content Scraper")
+        print("=" * 60)
+        print()
+
+        if args.watch:
+            print(f"Watching: polling every {WATCH_MIN_INTERVAL:.0f}-{WATCH_MAX_INTERVAL:.0f}s\n")
+            watch(run_once, max_cycles=int(os.environ.get('WATCH_MAX_CYCLES', '0')),
+                  on_change=os.environ.get('WATCH_ON_CHANGE') or None)
+        else:
+            run_once()
+        ok = True
+
+    if args.timings:
+        loaded = sorted({name.split('.')[0] for name in set(sys.modules) - modules_at_start
+                         if not name.startswith('_')})
+        print(f"Imported while running: {', '.join(loaded) or 'nothing'}")
+
+    if not ok:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     main()
@@ -16,6 +16,10 @@ from pathlib import Path
 from datetime import datetime
 import tweepy
 
+# notes_archive.py lives in substack-scraper/, next to this package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from notes_archive import PackedNotes, is_packed  # noqa: E402
+
 
 def parse_frontmatter(content):
     """Extract frontmatter from markdown content."""
@@ -104,8 +108,13 @@ def format_for_twitter(content):
     return content.strip()
 
 
-def post_to_twitter(twitter_client, content, url, premium_mode=False, note_folder=None):
-    """Post note to Twitter using tweepy. Returns tweet_id on success, None on failure."""
+def post_to_twitter(twitter_client, content, url, premium_mode=False, note_folder=None, image_files=None):
+    """
+    Post note to Twitter using tweepy. Returns tweet_id on success, None on failure.
+
+    In premium mode the note's images are attached: image_files when given
+    (packed notes), else the image files in note_folder.
+    """
     if not twitter_client:
         print("⚠️  Twitter credentials not set, skipping post")
         return None
@@ -114,18 +123,20 @@ def post_to_twitter(twitter_client, content, url, premium_mode=False, note_folde
         media_ids = []
 
         # Handle images in premium mode
-        if premium_mode and note_folder:
+        if premium_mode and (note_folder or image_files):
             print("🖼️  Checking for images to include...")
-            # Look for image files in the note folder
-            image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-            image_files = []
+            if image_files is None:
+                # Look for image files in the note folder
+                image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+                image_files = []
 
-            for ext in image_extensions:
-                image_files.extend(list(note_folder.glob(f'*{ext}')))
-                image_files.extend(list(note_folder.glob(f'*{ext.upper()}')))
+                for ext in image_extensions:
+                    image_files.extend(list(note_folder.glob(f'*{ext}')))
+                    image_files.extend(list(note_folder.glob(f'*{ext.upper()}')))
+                image_files = sorted(image_files)
 
             # Twitter allows up to 4 images per tweet
-            image_files = sorted(image_files)[:4]
+            image_files = image_files[:4]
 
             if image_files:
                 print(f"📸 Found {len(image_files)} image(s) to upload")
@@ -201,6 +212,44 @@ def post_to_twitter(twitter_client, content, url, premium_mode=False, note_folde
         return None
 
 
+def iter_notes(notes_dir):
+    """
+    Yield (rel_path, content, note_folder, image_files, published) for every
+    note, from note folders or from a packed archive (see notes_archive.py).
+    Packed notes have no folder; their images are the image store blobs.
+    """
+    if is_packed(notes_dir):
+        archive = PackedNotes(notes_dir)
+        published = archive.published()
+        for record in archive.records():
+            image_files = [Path(archive.image_path(image['blob']))
+                           for _, image in sorted(record['images'].items())]
+            yield record['folder'], record['original'], None, image_files, record['folder'] in published
+        return
+
+    # Recursively find all original_note.md files
+    for note_file in sorted(notes_dir.rglob('*/original_note.md')):
+        note_folder = note_file.parent
+        with open(note_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        yield (note_folder.relative_to(notes_dir), content, note_folder, None,
+               (note_folder / '.published').exists())
+
+
+def mark_published(notes_dir, rel_path, tweet_id, tweet_url):
+    """Record a note as published: its .published marker, or in the packed archive."""
+    published_at = f"{datetime.utcnow().isoformat()}Z"
+    if is_packed(notes_dir):
+        PackedNotes(notes_dir).mark_published(str(rel_path), published_at=published_at,
+                                              tweet_id=str(tweet_id), tweet_url=tweet_url)
+        return
+
+    with open(notes_dir / rel_path / '.published', 'w') as f:
+        f.write(f"published_at: {published_at}\n")
+        f.write(f"tweet_id: {tweet_id}\n")
+        f.write(f"tweet_url: {tweet_url}\n")
+
+
 def main():
     """Main function to publish notes to Twitter."""
     # Get script directory and project root
@@ -259,24 +308,13 @@ def main():
 
     published_count = 0
 
-    # Recursively find all original_note.md files
-    note_files = sorted(notes_dir.rglob('*/original_note.md'))
-
-    for note_file in note_files:
-        note_folder = note_file.parent
-
+    for rel_path, content, note_folder, image_files, published in iter_notes(notes_dir):
         # Check if already published
-        published_marker = note_folder / '.published'
-        if published_marker.exists():
-            # Show relative path from notes_dir
-            rel_path = note_folder.relative_to(notes_dir)
+        if published:
             print(f"⏭️  Skipping {rel_path} (already published)")
             continue
 
         try:
-            with open(note_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-
             # Parse frontmatter and content
             frontmatter = parse_frontmatter(content)
             main_content = extract_content(content)
@@ -284,23 +322,19 @@ def main():
             note_id = frontmatter.get('note_id', '')
             note_url = frontmatter.get('url', '')
 
-            # Show relative path from notes_dir
-            rel_path = note_folder.relative_to(notes_dir)
             print(f"\n📝 Publishing note: {rel_path}")
             print(f"   Note ID: {note_id}")
             print(f"   URL: {note_url}")
             print(f"   Content length: {len(main_content)} chars")
 
             # Post to Twitter
-            tweet_id = post_to_twitter(twitter_client, main_content, note_url, twitter_premium, note_folder)
+            tweet_id = post_to_twitter(twitter_client, main_content, note_url, twitter_premium, note_folder,
+                                       image_files)
 
             if tweet_id:
                 # Mark as published with tweet metadata
                 tweet_url = f"https://twitter.com/i/web/status/{tweet_id}"
-                with open(published_marker, 'w') as f:
-                    f.write(f"published_at: {datetime.utcnow().isoformat()}Z\n")
-                    f.write(f"tweet_id: {tweet_id}\n")
-                    f.write(f"tweet_url: {tweet_url}\n")
+                mark_published(notes_dir, rel_path, tweet_id, tweet_url)
 
                 published_count += 1
                 print(f"✓ Marked as published")
@@ -311,7 +345,6 @@ def main():
                 print(f"✗ Failed to publish, will retry next run")
 
         except Exception as e:
-            rel_path = note_folder.relative_to(notes_dir)
             print(f"✗ Error processing {rel_path}: {e}")
             continue
 
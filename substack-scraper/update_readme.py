@@ -6,9 +6,13 @@ Reads posts from substack-scraper/posts/ and updates the Latest Blog Posts secti
 
 import os
 import re
+import json
 from datetime import datetime
 from pathlib import Path
 
+from note_metrics import NoteMetrics
+from notes_archive import PackedNotes, is_packed
+
 
 def parse_frontmatter(content):
     """Extract frontmatter from markdown content."""
@@ -71,6 +75,26 @@ def extract_first_paragraph(content):
     return "Read the full post for more details."
 
 
+def list_archived_files(archive_dir, original_name):
+    """
+    List the original_*.md files in an archive directory.
+
+    Uses the scraper's .manifest.jsonl when present instead of walking the tree.
+    """
+    manifest_path = Path(archive_dir) / '.manifest.jsonl'
+    if not manifest_path.exists():
+        return list(Path(archive_dir).rglob(f'*/{original_name}'))
+
+    folders = set()
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                folders.add(json.loads(line)['folder'])
+            except (ValueError, KeyError):
+                continue
+    return [Path(archive_dir) / folder / original_name for folder in folders]
+
+
 def get_latest_posts(posts_dir, count=3):
     """Get the latest N posts from the posts directory."""
     posts = []
@@ -80,12 +104,10 @@ def get_latest_posts(posts_dir, count=3):
         return []
 
     # Iterate through all post folders
-    for folder in sorted(Path(posts_dir).iterdir(), reverse=True):
-        if not folder.is_dir():
-            continue
+    for post_file in sorted(list_archived_files(posts_dir, 'original_post.md'), reverse=True):
+        folder = post_file.parent
 
         # Read original_post.md
-        post_file = folder / 'original_post.md'
         if not post_file.exists():
             continue
 
@@ -118,25 +140,35 @@ def get_latest_posts(posts_dir, count=3):
     return posts[:count]
 
 
+def iter_note_contents(notes_dir):
+    """Yield (folder relative to notes_dir, original_note.md content) for every note."""
+    if is_packed(notes_dir):
+        for record in PackedNotes(notes_dir).records():
+            yield record['folder'], record['original']
+        return
+
+    # Find all original_note.md files
+    for note_file in sorted(list_archived_files(notes_dir, 'original_note.md'), reverse=True):
+        if not note_file.exists():
+            continue
+        with open(note_file, 'r', encoding='utf-8') as f:
+            yield note_file.parent.relative_to(Path(notes_dir)), f.read()
+
+
 def get_latest_notes(notes_dir, count=3):
-    """Get the latest N notes from the notes directory."""
+    """Get the latest N notes from the notes directory (folders or packed archive)."""
     notes = []
 
     if not os.path.exists(notes_dir):
         print(f"Notes directory not found: {notes_dir}")
         return []
 
-    # Recursively find all original_note.md files
-    note_files = sorted(Path(notes_dir).rglob('*/original_note.md'), reverse=True)
-
-    for note_file in note_files:
-        note_folder = note_file.parent
-
+    metrics = NoteMetrics(notes_dir)
+    for rel_path, content in iter_note_contents(notes_dir):
         try:
-            with open(note_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-
             frontmatter = parse_frontmatter(content)
+            # Engagement is in the metrics store; notes saved before it have it in the frontmatter
+            engagement = metrics.latest(Path(rel_path).as_posix()) or frontmatter
 
             # Parse date
             date_str = frontmatter.get('date', '')
@@ -154,12 +186,10 @@ def get_latest_notes(notes_dir, count=3):
                 'date': parsed_date,
                 'date_str': parsed_date.strftime('%B %d, %Y'),
                 'content': note_content,
-                'reactions': frontmatter.get('reactions', '0'),
-                'restacks': frontmatter.get('restacks', '0')
+                'reactions': engagement.get('reactions', '0'),
+                'restacks': engagement.get('restacks', '0')
             })
         except Exception as e:
-            # Show relative path from notes_dir
-            rel_path = note_folder.relative_to(Path(notes_dir))
             print(f"Error processing {rel_path}: {e}")
             continue
 